@@ -21,4 +21,13 @@ class MessageAdmin(admin.ModelAdmin):
 
 @admin.register(models.RoommateQuiz)
 class RoommateQuizAdmin(admin.ModelAdmin):
-  list_display = ["profile"]
\ No newline at end of file
+  list_display = ["profile"]
+
+@admin.register(models.Swipe)
+class SwipeAdmin(admin.ModelAdmin):
+  list_display = ["swiper", "swiped", "direction"]
+
+
+@admin.register(models.DeckEntry)
+class DeckEntryAdmin(admin.ModelAdmin):
+  list_display = ["viewer", "candidate", "score"]
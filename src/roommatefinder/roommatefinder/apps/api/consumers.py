@@ -1,23 +1,43 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import json
 import base64
-from asgiref.sync import async_to_sync
 
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.db.models import Q, Exists, OuterRef
 
 from roommatefinder.apps.api import models
-from roommatefinder.apps.api.serializers import extra_serializers
+from roommatefinder.apps.api.pagination import MessageKeysetPagination
+from roommatefinder.apps.api.serializers import extra_serializers, fast_serializers, swipe_serializers
+from roommatefinder.apps.api.utils import cards, metrics
+from roommatefinder.apps.api.utils.messages import message_buffer, send_message
+from roommatefinder.apps.api.utils.search import search_profiles
+from roommatefinder.apps.api.utils.swipes import record_swipes
 
 
-class APIConsumer(WebsocketConsumer):
+def typing_key(sender_id, recipient_id) -> str:
+  """ The shared cache key throttling the typing events of a sender to a recipient. """
+  return f"typing:{sender_id}:{recipient_id}"
+
+
+class APIConsumer(AsyncWebsocketConsumer):
   """
   WebSocket Consumer for handling WebSocket connections.
 
   This consumer manages WebSocket connections for authenticated users. It allows 
   users to search, message other users, and send friend requests and accept them.
 
+  The consumer is async, a socket only holds a thread while its handler does
+  database work. Handlers that touch the database are sync methods run in the
+  database thread pool, they queue their group sends with `queue_group`, and
+  the queued messages are sent from the event loop once the handler returns.
+  Responses to the socket's own requests are queued with `queue_self` and sent
+  on the socket directly, only messages for other users or the user's other
+  sockets go through the channel layer.
+
   Methods:
     connect():
       Handles WebSocket connection requests. Checks user authentication and
@@ -29,8 +49,22 @@ class APIConsumer(WebsocketConsumer):
 
   Attributes:
     _id (str): The unique identifier of the user, set during the connection process.
+    ROUTES (dict): The sync handler of each `source` that does database work.
+    _typing (dict): The typing expiry state of each recipient, see `receive_message_type`.
   """
-  def connect(self):
+  ROUTES = {
+    'search': 'receive_search',
+    'friend.list': 'receive_friend_list',
+    'message.list': 'receive_message_list',
+    'message.send': 'receive_message_send',
+    'request.connect': 'receive_request_connect',
+    'request.accept': 'receive_request_accept',
+    'request.list': 'receive_request_list',
+    'swipe': 'receive_swipe',
+    'thumbnail': 'receive_thumbnail',
+  }
+
+  async def connect(self):
     """
     Handles the WebSocket connection request.
 
@@ -45,33 +79,44 @@ class APIConsumer(WebsocketConsumer):
     user = self.scope['user']
     # Close connection attempt if user isn't authenticated
     if not user.is_authenticated:
-      self.close()
+      await self.close()
       return
     # Use the users UUID .id attr for connections
     self._id = str(user.id)
-    async_to_sync(self.channel_layer.group_add)(
+    # Typing expiry state, by recipient
+    self._typing = {}
+    await self.channel_layer.group_add(
 			self._id, self.channel_name
 		)
-    self.accept()
+    await self.accept()
 
 
-  def disconnect(self, close_code):
+  async def disconnect(self, close_code):
     """
     Handles the WebSocket disconnection request.
 
     This method is triggered when a WebSocket disconnection request is made. It performs
     the following actions:
+    - Tells the recipients the user was typing to that the user stopped.
     - Removes the user from the group identified by their user ID.
 
     Args:
       close_code (int): The code representing the reason for disconnection.
     """
-    async_to_sync(self.channel_layer.group_discard)(
-			self._id, self.channel_name
-		)
+    # Recipients still shown as typing are told it stopped
+    for recipient_id, typing in list(getattr(self, '_typing', {}).items()):
+      typing['expiry'].cancel()
+      del self._typing[recipient_id]
+      await cache.adelete(typing_key(self._id, recipient_id))
+      await self.send_group(recipient_id, 'message.type.stop', {'id': recipient_id})
+    # Unauthenticated sockets are closed before joining a group
+    if hasattr(self, '_id'):
+      await self.channel_layer.group_discard(
+        self._id, self.channel_name
+      )
 
 
-  def receive(self, text_data):
+  async def receive(self, text_data):
     """
     Handles incoming messages from the WebSocket.
 
@@ -89,10 +134,11 @@ class APIConsumer(WebsocketConsumer):
         - 'friend.list': Retrieves the friend list by calling `receive_friend_list`.
         - 'message.list': Retrieves the message list by calling `receive_message_list`.
         - 'message.send': Handles sending messages by calling `receive_message_send`.
-        - 'message.type': Updates typing status by calling `receive_message_type`.
+        - 'message.type': Updates typing status, throttled, by calling `receive_message_type`.
         - 'request.connect': Handles friend connection requests by calling `receive_request_connect`.
         - 'request.accept': Accepts friend requests by calling `receive_request_accept`.
         - 'request.list': Retrieves the list of friend requests by calling `receive_request_list`.
+        - 'swipe': Records left and right swipes by calling `receive_swipe`.
         ### Possibly deprecated in first version
         - 'thumbnail': Processes thumbnail uploads by calling `receive_thumbnail`.
 
@@ -103,41 +149,21 @@ class APIConsumer(WebsocketConsumer):
     try:
       # Receive message from websocket
       data = json.loads(text_data)
-      data_source = data.get('source')
-
-      # Route the message based on the 'source' field
-      if data_source == 'search':
-        self.receive_search(data)
-
-      elif data_source == 'friend.list':
-        self.receive_friend_list(data)
-      
-      elif data_source == 'message.list':
-        self.receive_message_list(data)
-
-      elif data_source == 'message.send':
-        self.receive_message_send(data)
-
-      elif data_source == 'message.type':
-        self.receive_message_type(data)
-
-      elif data_source == 'request.connect':
-        self.receive_request_connect(data)
+    except json.JSONDecodeError:
+      await self.send(text_data=json.dumps({'error': 'Invalid JSON data'}))
+      return
+    data_source = data.get('source')
 
-      elif data_source == 'request.accept':
-        self.receive_request_accept(data)
+    # Route the message based on the 'source' field
+    if data_source == 'message.type':
+      # No database work, sent straight from the event loop
+      await self.receive_message_type(data)
 
-      elif data_source == 'request.list':
-        self.receive_request_list(data)
+    elif data_source in self.ROUTES:
+      await self.run_in_db(getattr(self, self.ROUTES[data_source]), data)
 
-      elif data_source == 'thumbnail':
-        self.receive_thumbnail(data)
-      
-      else:
-        self.send(text_data=json.dumps({'error': 'Unknown source'}))
-
-    except json.JSONDecodeError:
-      self.send(text_data=json.dumps({'error': 'Invalid JSON data'}))
+    else:
+      await self.send(text_data=json.dumps({'error': 'Unknown source'}))
 
 
   def receive_message_list(self, data: dict) -> None:
@@ -151,60 +177,65 @@ class APIConsumer(WebsocketConsumer):
     Parameters:
       data (dict): A dictionary containing:
         - 'connectionId': The ID of the connection for which to retrieve messages.
-        - 'page': The current page number for pagination.
+        - 'cursor': The `next` cursor of the previous page, empty for the newest messages.
+          Older clients send it as 'page', which is read the same way.
 
     Notes:
       - If the specified connection does not exist, a log message is printed, and no data is sent.
-      - Messages are retrieved with pagination. The page size is fixed at 15 messages per page.
+      - Messages are paginated with `MessageKeysetPagination`, 15 messages per page,
+        so a deep page costs the same as the first one and the conversation isn't counted.
+      - An invalid cursor is answered with an error to this socket only.
+      - Messages of the conversation still buffered in write-behind mode are written first.
+      - Reading a conversation clears the requester's unread count on the connection.
       - The recipient of the messages is determined based on the connection details.
-      - The response includes serialized messages, the recipient's information, and the pagination status.
+      - The response includes serialized messages, the recipient's information, and the cursor of the next page.
     """
     user = self.scope['user']
     connectionId = data.get('connectionId')
-    # Retrieve the page number from the incoming data, defaulting to 0
-    page = data.get('page', 0)
-    # The number of messages per page
-    page_size = 15
+    # The cursor of the page, page numbers of older clients start at the newest messages
+    cursor = data.get('cursor', data.get('page'))
+    if not isinstance(cursor, str):
+      cursor = None
 
     try:
       connection = models.Connection.objects.get(id=connectionId)
     except models.Connection.DoesNotExist:
       print({"detail": "Couldn't find connection."})
       return
-    
-    # Retrieve and paginate messages for the connection
-    messages = models.Message.objects.filter(
-      connection=connection
-    ).order_by('-created')[page * page_size:(page + 1) * page_size]
-
-    # Serialize the messages
-    serialized_messages = extra_serializers.MessageSerializer(
-      messages,
-      context={'user': user}, 
-      many=True
-    )
+
+    # Messages of the conversation still buffered by this process are written first, messages
+    # buffered by other workers show up after their next flush, see `MessageBuffer`
+    if message_buffer.pending_for(connection.id):
+      message_buffer.flush()
+
+    # Retrieve a page of messages for the connection, with the rows of the fast `MessageSerializer`
+    serializer = fast_serializers.FastMessageSerializer(context={'user': user})
+    try:
+      rows, next_cursor = MessageKeysetPagination().paginate(
+        connection.messages.all(), cursor, columns=serializer.plan['columns']
+      )
+    except ValueError as error:
+      self.queue_reply({'error': str(error)})
+      return
+    serialized_messages = serializer.serialize_rows(rows)
+    # Reading the conversation clears my unread count
+    models.Connection.objects.mark_read(connection, user)
     # Determine the recipient of the messages
-    recipient = connection.sender
-    if connection.sender == user:
-      recipient = connection.receiver
+    recipient_id = connection.sender_id
+    if connection.sender_id == user.id:
+      recipient_id = connection.receiver_id
 
-    # Serialize the recipient's information
-    serialized_friend = extra_serializers.UserSerializer(recipient)
+    # The recipient's information, from its cached card
+    serialized_friend = cards.get_card('user', recipient_id)
 
-    # Count the total number of messages for the connection
-    messages_count = models.Message.objects.filter(
-      connection=connection
-    ).count()
-    # Determine if there is a next page of messages
-    next_page = page + 1 if messages_count > (page + 1 ) * page_size else None
     # Response data
     data = {
-      'messages': serialized_messages.data,
-      'next': next_page,
-      'friend': serialized_friend.data
+      'messages': serialized_messages,
+      'next': next_cursor,
+      'friend': serialized_friend
     }
     # Send back to the requestor
-    self.send_group(str(user.id), 'message.list', data)
+    self.queue_self('message.list', data)
 
 
   def receive_message_send(self, data):
@@ -217,11 +248,9 @@ class APIConsumer(WebsocketConsumer):
       print({"detail": "couldn't find connection"})
       return
 
-    message = models.Message.objects.create(
-      connection=connection,
-      user=user,
-      text=message_text
-    )
+    # Written now, or buffered and written behind with `MESSAGE_WRITE_BEHIND`,
+    # the conversation summary of the friend list is updated with it
+    message = send_message(connection, user, message_text)
 
     # get recipient friend
     recipient = connection.sender
@@ -233,59 +262,82 @@ class APIConsumer(WebsocketConsumer):
       message,
       context={'user': user}
     )
-    serialized_friend = extra_serializers.UserSerializer(recipient)
     data = {
       'message': serialized_message.data,
-      'friend': serialized_friend.data
+      'friend': cards.get_card('user', recipient.id)
     }
-    self.send_group(str(user.id), 'message.send', data)
+    self.queue_group(str(user.id), 'message.send', data)
 
     # send new message to receiver
     serialized_message = extra_serializers.MessageSerializer(
       message,
       context={'user': recipient}
     )
-    serialized_friend = extra_serializers.UserSerializer(user)
     data = {
       'message': serialized_message.data,
-      'friend': serialized_friend.data
+      'friend': cards.get_card('user', user.id)
     }
-    self.send_group(str(recipient.id), 'message.send', data)
+    self.queue_group(str(recipient.id), 'message.send', data)
 
 
-  def receive_message_type(self, data: dict) -> None:
+  async def receive_message_type(self, data: dict) -> None:
     """
     Handles incoming WebSocket messages indicating that a user is typing.
 
     This method processes the `message.type` event, which is sent when a user is 
-    typing a message. It extracts the recipient's ID from the incoming data and sends a 
-    notification to the group corresponding to the recipient's ID.
+    typing a message. Typing events are coalesced per sender and recipient: the
+    first one is sent to the recipient's group right away, later ones only once
+    `TYPING_INTERVAL_SECONDS` passed since the last one sent. The throttle is a
+    key in the shared cache, added with that timeout, so it holds across the
+    sender's sockets and the workers serving them. After `TYPING_EXPIRY_SECONDS`
+    without typing events on a socket, `message.type.stop` is sent and the
+    throttle is cleared.
 
     Parameters:
       data (dict): A dictionary containing the incoming message data. It should 
       include an `'id'` key representing the recipient's user ID.
 
     Notes:
-      - The `self.scope['user']` is used to identify the current user, but it is not directly used in this method.
-      - The `data` dictionary is transformed to only include the `'id'` key before sending the message to the recipient.
-      - The `send_group` method is responsible for sending the notification to the appropriate group.
+      - Runs on the event loop, the expiry timers are kept on the consumer, one per socket.
+      - The `typing.*` counters of `utils/metrics.py` count the received, sent, suppressed and expired events.
     """
-    # user = self.scope['user']
-    recipient_id = data.get('id')
-    data = {'id': str(recipient_id)}
-    self.send_group(str(recipient_id), 'message.type', data)
+    recipient_id = str(data.get('id'))
+    metrics.incr('typing.received')
+    now = asyncio.get_running_loop().time()
+    typing = self._typing.get(recipient_id)
+    if typing is None:
+      typing = self._typing[recipient_id] = {'seen': now}
+      typing['expiry'] = asyncio.create_task(self.expire_typing(recipient_id))
+    typing['seen'] = now
+    # Only added if no socket of the sender forwarded typing to the recipient within the interval
+    if not await cache.aadd(typing_key(self._id, recipient_id), True, timeout=settings.TYPING_INTERVAL_SECONDS):
+      metrics.incr('typing.suppressed')
+      return
+    metrics.incr('typing.sent')
+    await self.send_group(recipient_id, 'message.type', {'id': recipient_id})
+
+
+  async def expire_typing(self, recipient_id: str) -> None:
+    """ Send `message.type.stop` once the user stopped typing to a recipient for `TYPING_EXPIRY_SECONDS`. """
+    loop = asyncio.get_running_loop()
+    while True:
+      delay = self._typing[recipient_id]['seen'] + settings.TYPING_EXPIRY_SECONDS - loop.time()
+      if delay <= 0:
+        break
+      await asyncio.sleep(delay)
+    del self._typing[recipient_id]
+    await cache.adelete(typing_key(self._id, recipient_id))
+    metrics.incr('typing.expired')
+    await self.send_group(recipient_id, 'message.type.stop', {'id': recipient_id})
 
 
   def receive_friend_list(self, data: dict):
     user = self.scope['user']
-    # Get connections for user
-    connections = models.Connection.objects.filter(
-      Q(sender=user) | Q(receiver=user),
-      accepted=True,
-    )
+    # Get connections for user, the latest conversation first
+    connections = models.Connection.objects.conversations(user)
     serialized = extra_serializers.FriendSerializer(connections, context={'user': user}, many=True)
     # Send data back to user
-    self.send_group(str(user.id), 'friend.list', serialized.data)
+    self.queue_self('friend.list', serialized.data)
 
 
   def receive_request_accept(self, data):
@@ -305,9 +357,9 @@ class APIConsumer(WebsocketConsumer):
 
     serialized = extra_serializers.RequestSerializer(connection)
     # send accepted request to sender
-    self.send_group(str(connection.sender.id), 'request.accept', serialized.data)
+    self.queue_group(str(connection.sender.id), 'request.accept', serialized.data)
     # send accepted request to receiver
-    self.send_group(str(connection.receiver.id), 'request.accept', serialized.data)
+    self.queue_group(str(connection.receiver.id), 'request.accept', serialized.data)
 
   
   def receive_request_list(self, data):
@@ -319,7 +371,7 @@ class APIConsumer(WebsocketConsumer):
     )
     serialized = extra_serializers.RequestSerializer(connections, many=True)
     # send request list back to user
-    return self.send_group(str(user.id), 'request.list', serialized.data)
+    return self.queue_self('request.list', serialized.data)
 
 
   def receive_request_connect(self, data):
@@ -351,49 +403,49 @@ class APIConsumer(WebsocketConsumer):
         sender=self.scope['user'],
         receiver=receiver,
       )
+    # a connection request is a right swipe
+    record_swipes(self.scope['user'], [{'id': receiver.id, 'direction': 'R'}])
     # serialized connection
     serialized = extra_serializers.RequestSerializer(connection)
     # send results back to sender
-    self.send_group(str(connection.sender.id), 'request.connect', serialized.data)
+    self.queue_group(str(connection.sender.id), 'request.connect', serialized.data)
     # send results back to receiver
-    self.send_group(str(connection.receiver.id), 'request.connect', serialized.data)
+    self.queue_group(str(connection.receiver.id), 'request.connect', serialized.data)
+
+
+  def receive_swipe(self, data: dict) -> None:
+    """
+    Handles incoming WebSocket messages recording swipes.
+
+    Swipes are buffered and written in batches, see `utils/swipes.py`. Nothing is
+    sent back, right swipes that should send a connection request still go 
+    through `request.connect`.
+
+    Parameters:
+      data (dict): A dictionary containing either:
+        - 'id' and 'direction' ("L" or "R") of a single swipe.
+        - 'swipes': A list of swipes with an 'id' and a 'direction'.
+    """
+    swipes = data.get('swipes', [data])
+    serializer = swipe_serializers.CreateSwipeSerializer(data=swipes, many=True)
+    if not serializer.is_valid():
+      self.queue_reply({'error': serializer.errors})
+      return
+    record_swipes(self.scope['user'], serializer.validated_data)
 
 
   def receive_search(self, data):
     query = data.get('query')
-    # get profiles from query search term
-    profiles = models.Profile.objects.filter(
-      Q(name__istartswith=query) |
-      Q(identifier__istartswith=query)
-    ).exclude(
-      id=self._id
-    ).annotate(
-      pending_them=Exists(
-				models.Connection.objects.filter(
-					sender=self.scope['user'],
-					receiver=OuterRef('id'),
-					accepted=False
-				)
-			),
-			pending_me=Exists(
-				models.Connection.objects.filter(
-					sender=OuterRef('id'),
-					receiver=self.scope['user'],
-					accepted=False
-				)
-			),
-			connected=Exists(
-				models.Connection.objects.filter(
-					Q(sender=self.scope['user'], receiver=OuterRef('id')) |
-					Q(receiver=self.scope['user'], sender=OuterRef('id')),
-					accepted=True
-				)
-			),
-    )
-    # serialized results
-    serialized = extra_serializers.SearchSerializer(profiles, many=True)
+    # get profiles from query search term, bounded, indexed and cached, with the searcher's status
+    results = search_profiles(self.scope['user'], query)
+    statuses = dict(results)
+    # assemble the results from the cached cards, the status is per searcher
+    serialized = [
+      {**card, 'status': statuses[card['id']]}
+      for card in cards.get_cards('user', statuses)
+    ]
      # send results back to user
-    self.send_group(self._id, 'search', serialized.data) 
+    self.queue_self('search', serialized)
 
 
   def receive_thumbnail(self, data):
@@ -404,26 +456,68 @@ class APIConsumer(WebsocketConsumer):
     # update thumbnail field
     filename = data.get('filename')
     user.thumbnail.save(filename, image, save=True)
-    # serialize user
-    serialized = extra_serializers.UserSerializer(user)
+    # saving dropped the cached card, this renders the new one
+    serialized = cards.get_card('user', user.id)
     # send updated user data including new thumbnail 
-    self.send_group(self._id, 'thumbnail', serialized.data)
+    self.queue_self('thumbnail', serialized)
 
   
   #--------------------------------------------
 	#   Catch/all broadcast to client helpers
 	#--------------------------------------------
-  def send_group(self, group, source, data):
+  async def run_in_db(self, handler, data):
+    """
+    Run a sync handler in the database thread pool, then send what it queued.
+
+    The pool isn't thread sensitive, so handlers of different sockets run
+    concurrently, each thread with its own database connection.
+    """
+    self._outbox = []
+    await database_sync_to_async(handler, thread_sensitive=False)(data)
+    outbox, self._outbox = self._outbox, []
+    for group, source, payload in outbox:
+      if group is not None:
+        await self.send_group(group, source, payload)
+      elif source is not None:
+        await self.send_self(source, payload)
+      else:
+        await self.send(text_data=json.dumps(payload))
+
+  def queue_group(self, group, source, data):
+    """ Queue a group send from a sync handler, sent once the handler returns. """
+    self._outbox.append((group, source, data))
+
+  def queue_self(self, source, data):
+    """ Queue a response to the request of this socket from a sync handler, see `send_self`. """
+    self._outbox.append((None, source, data))
+
+  def queue_reply(self, data):
+    """ Queue a message to this socket only from a sync handler. """
+    self._outbox.append((None, None, data))
+
+  async def send_self(self, source, data):
+    """
+    Send a response to this socket directly, in the format of `broadcast_group`.
+
+    Responses to a socket's own requests skip the round trip through the
+    channel layer that a send to the user's group would take, and aren't
+    delivered to the user's other sockets, which didn't ask for them.
+    """
+    metrics.incr('send.local')
+    await self.send(text_data=json.dumps({'source': source, 'data': data}))
+
+  async def send_group(self, group, source, data):
+    metrics.incr('send.group')
     response = {
       'type': 'broadcast_group',
       'source': source,
       'data': data
     }
-    async_to_sync(self.channel_layer.group_send)(
+    await self.channel_layer.group_send(
       group, response
     )
 
-  def broadcast_group(self, data):
+  async def broadcast_group(self, data):
     '''
     data:
       - type: 'broadcast_group'
@@ -436,4 +530,4 @@ class APIConsumer(WebsocketConsumer):
       - source: where it originated from
       - data: what ever you want to send as a dict
     '''
-    self.send(text_data=json.dumps(data))
\ No newline at end of file
+    await self.send(text_data=json.dumps(data))
\ No newline at end of file
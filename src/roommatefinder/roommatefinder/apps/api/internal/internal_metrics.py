@@ -0,0 +1,13 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from ..utils.metrics import counters
+
+
+@api_view(["get"])
+@permission_classes([IsAdminUser])
+def get_metrics(request):
+  """ Get the counters of the process that serves the request, see `utils/metrics.py`. """
+  return Response(counters.snapshot(), status=status.HTTP_200_OK)
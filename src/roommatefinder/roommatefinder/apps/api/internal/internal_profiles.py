@@ -1,27 +1,28 @@
-import string
-import random
-
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from django.core.exceptions import ObjectDoesNotExist
-from django.contrib.auth.hashers import make_password
 
 from .. import models
-from ..serializers import profile_serializers
+from ..serializers import fast_serializers, profile_serializers
+from ..utils import streaming
+from ..utils.generate import generate_population
 
 
 @api_view(["get"])
 @permission_classes([IsAdminUser])
 def list_profiles(request):
-  """ List all profiles. """
+  """ List all profiles, as a newline-delimited JSON stream with `?stream=true`. """
   profiles = models.Profile.objects.all()
+  if streaming.wants_stream(request):
+    return streaming.stream_ndjson(fast_serializers.FastProfileSerializer(), profiles.order_by("id"))
   serializer = profile_serializers.ProfileSerializer(profiles, many=True)
+  data = serializer.data
   return Response(
     {
-      "count": len(serializer.data), 
-      "results": serializer.data
+      "count": len(data), 
+      "results": data
     }, 
     status=status.HTTP_200_OK,
   )
@@ -29,33 +30,34 @@ def list_profiles(request):
 @api_view(["post"])
 @permission_classes([IsAdminUser])
 def fake_create_profiles(request):
-  """Create a 5 fake profiles. """
-  N = 7
-  PASSWORD = make_password("123")
-  SEX = "M"
-  AGE = 19
+  """
+  Create a synthetic population, 5 profiles by default.
 
-  for i in range(5):
-    profile = {
-      "identifier": "".join(random.choices(string.ascii_uppercase + string.digits, k=N)),
-      "password": PASSWORD,
-      "name": "".join(random.choices(string.ascii_uppercase + string.digits, k=N)),
-      "sex": SEX,
-      "age": AGE,
-      "dorm_building": str(random.randint(1, 10)),
-    }  
-    models.Profile.objects.create(
-      identifier=profile["identifier"],
-      password=profile["password"],
-      name=profile["name"],
-      sex=profile["sex"],
-      age=profile["age"],
-      dorm_building=profile["dorm_building"],
-      has_account=True,
-      otp_verified=True
-    )
+  Takes the `count`, `seed`, `processes`, `connections` and `messages` options
+  of `generate_population`. Large populations are better created with the
+  `generate_population` management command, outside of a request.
+  """
+  options = {}
+  try:
+    count = int(request.data.get("count", 5))
+    for name in ("seed", "processes", "connections", "messages"):
+      if request.data.get(name) is not None:
+        options[name] = int(request.data[name])
+  except (TypeError, ValueError):
+    return Response({"detail": "Options must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+  # Stay in the request's process unless asked otherwise
+  options.setdefault("processes", 1)
 
-  return Response({"detail": "great success"}, status=status.HTTP_201_CREATED)
+  result = generate_population(count, **options)
+  return Response(
+    {
+      "detail": "great success",
+      "profiles": len(result["profiles"]),
+      "connections": result["connections"],
+      "messages": result["messages"],
+    },
+    status=status.HTTP_201_CREATED
+  )
 
 
 @api_view(["post"])
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from roommatefinder.apps.api.utils.bulk import BATCH_SIZE, export_data
+
+
+class Command(BaseCommand):
+  """
+  Export profiles, roommate quizzes and the connection graph for analytics.
+
+  Tables are written as parquet when pyarrow is installed, as gzipped csv
+  otherwise, and can be imported back with `import_data`.
+
+  Usage:
+    $ python manage.py export_data exports/
+    $ python manage.py export_data exports/ --format csv
+  """
+  help = "Export profiles, roommate quizzes and connections to parquet or gzipped csv files."
+
+  def add_arguments(self, parser):
+    parser.add_argument("directory", help="The directory to write the files to.")
+    parser.add_argument("--format", choices=["parquet", "csv"], default=None, help="Parquet when pyarrow is installed by default.")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE, help="Rows read and written at a time.")
+
+  def handle(self, *args, **options):
+    started = time.perf_counter()
+    exported = export_data(options["directory"], format=options["format"], chunk_size=options["chunk_size"])
+    for table in exported.values():
+      self.stdout.write(f"{table['path']}: {table['rows']} rows")
+    self.stdout.write(self.style.SUCCESS(f"Exported in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from roommatefinder.apps.api.utils.bulk import BATCH_SIZE, IMPORTS, refresh_imported
+
+
+class Command(BaseCommand):
+  """
+  Bulk import profiles, roommate quizzes or connections from a file.
+
+  Meant to onboard a campus cohort at once instead of one `POST /profiles/`
+  per student. Files are csv, gzipped csv or parquet, see `utils/bulk.py` for
+  the columns. Import profiles before their quizzes and connections.
+
+  Rows are written without signals, so the cached cards and swipe decks of
+  the imported profiles are refreshed once the import is done, see
+  `refresh_imported`. With `--no-refresh` they are left stale until
+  `precompute_decks` runs and the cards expire.
+
+  Usage:
+    $ python manage.py import_data profiles cohort.csv
+    $ python manage.py import_data quizzes quizzes.parquet --batch-size 10000
+    $ python manage.py import_data connections connections.csv --no-refresh
+  """
+  help = "Bulk import profiles, roommate quizzes or connections from a csv or parquet file."
+
+  def add_arguments(self, parser):
+    parser.add_argument("table", choices=list(IMPORTS), help="The table to import into.")
+    parser.add_argument("path", help="A .csv, .csv.gz or .parquet file.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows validated and written per transaction.")
+    parser.add_argument(
+      "--no-refresh", action="store_true", help="Leave the cards and swipe decks of the imported profiles stale."
+    )
+
+  def handle(self, *args, **options):
+    started = time.perf_counter()
+    try:
+      report = IMPORTS[options["table"]](options["path"], batch_size=options["batch_size"])
+    except FileNotFoundError as error:
+      raise CommandError(error)
+
+    for number, message in report["errors"]:
+      self.stderr.write(f"row {number}: {message}")
+    if report["error_count"] > len(report["errors"]):
+      self.stderr.write(f"... {report['error_count'] - len(report['errors'])} more invalid rows")
+    self.stdout.write(self.style.SUCCESS(
+      f"Imported {report['created']} {options['table']}, skipped {report['skipped']},"
+      f" {report['error_count']} invalid rows in {time.perf_counter() - started:.1f}s"
+    ))
+
+    if options["no_refresh"]:
+      return
+    started = time.perf_counter()
+    refreshed = refresh_imported(report, batch_size=options["batch_size"])
+    self.stdout.write(self.style.SUCCESS(
+      f"Refreshed the cards of {refreshed['cards']} profiles, built {refreshed['decks']} decks"
+      f" and removed {refreshed['pairs']} connected pairs from decks in {time.perf_counter() - started:.1f}s"
+    ))
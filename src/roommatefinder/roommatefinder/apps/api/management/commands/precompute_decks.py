@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from roommatefinder.apps.api.utils.precompute import precompute_decks
+
+
+class Command(BaseCommand):
+  """
+  Precompute the ranked swipe deck of every profile in the eligible pool.
+
+  Meant to run nightly, and on demand after a new cohort is imported, so users
+  open the app to a ready deck. Decks are read with `SWIPE_RANKING_MODE=deck`
+  and kept up to date between runs by the deck signals.
+
+  Usage:
+    $ python manage.py precompute_decks
+    $ python manage.py precompute_decks --processes 8 --top 500
+  """
+  help = "Precompute the ranked swipe deck of every profile across a process pool."
+
+  def add_arguments(self, parser):
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, every core by default.")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Viewers ranked and written per task.")
+    parser.add_argument("--top", type=int, default=None, help="Only keep the best candidates of each deck.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows written per insert.")
+
+  def handle(self, *args, **options):
+    started = time.perf_counter()
+    result = precompute_decks(
+      processes=options["processes"],
+      chunk_size=options["chunk_size"],
+      top=options["top"],
+      batch_size=options["batch_size"],
+    )
+    self.stdout.write(self.style.SUCCESS(
+      f"Wrote {result['entries']} deck entries for {result['viewers']} profiles"
+      f" in {time.perf_counter() - started:.1f}s"
+    ))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from roommatefinder.apps.api.utils import benchmarks
+
+
+class Command(BaseCommand):
+  """
+  Benchmark ranking, the swipe deck, serialization and the websocket handlers.
+
+  Every size is seeded into a throwaway test database, so the configured
+  database is never written to. Results are compared against a stored baseline
+  and the command fails when a benchmark takes more queries or more peak memory
+  than it, or when there is no baseline unless `--no-baseline` is given. Times
+  are only compared with `--time-tolerance`, relative to a reference workload
+  timed in the same run, so baselines from other machines still apply.
+
+  Usage:
+    $ python manage.py run_benchmarks --sizes 1000 10000 100000
+    $ python manage.py run_benchmarks --save-baseline
+    $ python manage.py run_benchmarks --no-baseline --only rank_profiles_sql
+    $ python manage.py run_benchmarks --time-tolerance 0.5
+  """
+  help = "Benchmark ranking, serialization and the websocket handlers against a stored baseline."
+
+  def add_arguments(self, parser):
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--only", nargs="+", default=[], help="Names of the benchmarks to run.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+      "--baseline",
+      default=os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json"),
+    )
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--no-baseline", action="store_true", help="Only print the results, without comparing them.")
+    parser.add_argument(
+      "--time-tolerance",
+      type=float,
+      default=None,
+      help="Also fail when a time relative to the reference workload grows by more than this share.",
+    )
+    parser.add_argument("--memory-tolerance", type=float, default=0.2)
+
+  def handle(self, *args, **options):
+    compare = not options["save_baseline"] and not options["no_baseline"]
+    # Fail before seeding rather than after minutes of benchmarks
+    if compare and not os.path.exists(options["baseline"]):
+      raise CommandError(
+        f"No baseline at {options['baseline']}, run with --save-baseline to create it"
+        " or with --no-baseline to skip the comparison."
+      )
+
+    results = {}
+    for size in options["sizes"]:
+      self.stdout.write(f"Seeding {size} profiles ...")
+      old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+      try:
+        results[str(size)] = benchmarks.run_suite(size, repeat=options["repeat"], only=options["only"])
+      finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+      for name, measured in results[str(size)].items():
+        self.stdout.write(
+          f"  {name:<45} {measured['seconds'] * 1000:>10.1f} ms {measured['relative']:>8.3f} x"
+          f" {measured['queries']:>5} queries {measured['peak_memory'] / 1024:>10.0f} KiB"
+        )
+
+    baseline = {}
+    if os.path.exists(options["baseline"]):
+      with open(options["baseline"]) as f:
+        baseline = json.load(f)
+
+    if options["save_baseline"]:
+      for size, measured in results.items():
+        baseline.setdefault(size, {}).update(measured)
+      os.makedirs(os.path.dirname(options["baseline"]), exist_ok=True)
+      with open(options["baseline"], "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+      self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {options['baseline']}"))
+      return
+
+    if not compare:
+      return
+
+    regressions = benchmarks.find_regressions(
+      results,
+      baseline,
+      time_tolerance=options["time_tolerance"],
+      memory_tolerance=options["memory_tolerance"],
+    )
+    if regressions:
+      raise CommandError("Benchmarks regressed:\n  " + "\n  ".join(regressions))
+    self.stdout.write(self.style.SUCCESS("No regressions."))
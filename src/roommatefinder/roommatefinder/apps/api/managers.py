@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.db.models.functions import Coalesce
-from django.db.models import Case, When, IntegerField, Value, Q
+from django.db.models.functions import Coalesce, Substr
+from django.db.models import (
+  Case, When, IntegerField, CharField, Value, Q, F, ExpressionWrapper, Manager, Exists, OuterRef, Subquery, Count
+)
 
 from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils import swipes
+from roommatefinder.apps.api.utils.ranking import LazyRanking, VectorizedRanking
 
 
 class CustomUserManager(BaseUserManager):
@@ -21,9 +27,36 @@ class CustomUserManager(BaseUserManager):
     
     create_superuser(identifier, password, **extra_fields):
       Creates and saves a superuser profile with the specified identifier and password.
+
+    eligible_pool():
+      Gets the active, unpaused profiles with an account, which can show up on swipe decks.
+
+    iter_pool_partitions(user_profile):
+      Scans the swipe candidates of a user one (dorm building, sex) partition at a time.
     
+    annotate_relationship(profiles, user_profile):
+      Annotates the relationship with the current user and the connection counts of each profile.
+
     rank_profiles(user_profile):
       Ranks profiles based on dorm, common interests, shared major, and state.
+
+    rank_profiles_sql(user_profile):
+      Same ranking as `rank_profiles`, computed and paginated in the database.
+
+    rank_profiles_deck(user_profile):
+      Same ranking as `rank_profiles`, read from the user's precomputed deck.
+
+    rank_profiles_numpy(user_profile):
+      Same ranking as `rank_profiles`, computed with NumPy over interest bitmasks.
+
+    rank_profiles_lazy(user_profile):
+      Same ranking as `rank_profiles`, streamed through a bounded top-k heap when sliced.
+
+    exclude_swiped(profiles, user_profile):
+      Leaves out the profiles a user already swiped on, written or still buffered.
+
+    swipe_deck(user_profile):
+      Ranks profiles with the ranking mode set in `SWIPE_RANKING_MODE`.
   """
   def create_user(self, identifier: str, password: str, **extra_fields):
     """
@@ -77,38 +110,90 @@ class CustomUserManager(BaseUserManager):
     return self.create_user(identifier, password, **extra_fields)
   
 
-  def rank_profiles(self, user_profile):
+  def eligible_pool(self):
     """
-    Rank profiles based on dorm, common interests, shared major, and state.
+    Get the profiles that can show up on anyone's swipe deck.
+
+    Profiles with an account set up, that are active and not paused. The filter
+    matches the condition of the partial `profile_eligible_pool_idx` index.
+
+    Returns:
+      QuerySet: The eligible profiles.
+    """
+    return self.get_queryset().filter(has_account=True, is_active=True, pause_profile=False)
+  
+
+  def pool_partitions(self, user_profile=None):
+    """
+    Get the (dorm building, sex) partitions of the eligible pool.
 
     Parameters:
-      user_profile (Profile): The profile of the current user to compare against.
+      user_profile (Profile): When given, the partitions of the user's dorm come first.
 
     Returns:
-      QuerySet: Profiles ordered by similarity score.
+      list: `(dorm_building, sex)` tuples.
     """
-    # Convert the user's interests to a set for easier comparison
-    user_interests = set(user_profile.interests)
-    # Base queryset, exclude current user
-    profiles = self.get_queryset().exclude(id=user_profile.id)
-    # Only get accounts with an account set up
-    profiles = profiles.filter(has_account=True)
-    # Get connections involving the user
-    connections = models.Connection.objects.filter(
-        Q(sender=user_profile.id) | Q(receiver=user_profile.id),
-        accepted=True
+    partitions = self.eligible_pool().values_list("dorm_building", "sex").distinct().order_by()
+    dorm_building = getattr(user_profile, "dorm_building", None)
+    return sorted(partitions, key=lambda partition: (partition[0] != dorm_building, str(partition)))
+  
+
+  def iter_pool_partitions(self, user_profile):
+    """
+    Scan the swipe candidates of a user one pool partition at a time.
+
+    Each partition is a `(dorm_building, sex)` slice of the eligible pool, so
+    every query is served by the partial pool index and stays proportional
+    to the cohort it covers.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user.
+
+    Yields:
+      tuple: The `(dorm_building, sex)` partition and its candidates as a QuerySet.
+    """
+    candidates = self.swipe_candidates(user_profile)
+    for dorm_building, sex in self.pool_partitions(user_profile):
+      yield (dorm_building, sex), candidates.filter(dorm_building=dorm_building, sex=sex)
+  
+
+  def swipe_candidates(self, user_profile):
+    """
+    Get the profiles a user is allowed to see on their swipe deck.
+
+    Excludes the user themself, profiles outside the eligible pool and
+    profiles the user already has an accepted connection with.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user.
+
+    Returns:
+      QuerySet: The unranked candidate profiles.
+    """
+    # Only profiles in the eligible pool, exclude current user
+    profiles = self.eligible_pool().exclude(id=user_profile.id)
+    # Exclude connections involving the user, in both directions
+    connections = models.Connection.objects.filter(accepted=True)
+    profiles = profiles.exclude(
+      id__in=connections.filter(sender=user_profile.id).values("receiver")
+    ).exclude(
+      id__in=connections.filter(receiver=user_profile.id).values("sender")
     )
-    # Remove connections from the results
-    excluded_ids = connections.values_list('sender', 'receiver')
-    excluded_ids = set(id for sublist in excluded_ids for id in sublist)
-    
-    # Exclude current user and their connections
-    if not excluded_ids:
-      excluded_ids = {user_profile.id}
-    profiles = profiles.exclude(id__in=excluded_ids)
+    return profiles
+  
 
-    # Annotate similarity scores
-    profiles = profiles.annotate(
+  def annotate_similarity(self, profiles, user_profile):
+    """
+    Annotate the dorm, major and state similarity terms onto a queryset.
+
+    Parameters:
+      profiles (QuerySet): The profiles to annotate.
+      user_profile (Profile): The profile of the current user to compare against.
+
+    Returns:
+      QuerySet: Profiles annotated with `dorm_match`, `major_match` and `state_promotion`.
+    """
+    return profiles.annotate(
       # Dorm Building Match
       dorm_match=Coalesce(Case(
         When(dorm_building=user_profile.dorm_building, then=Value(1)),
@@ -128,6 +213,68 @@ class CustomUserManager(BaseUserManager):
         output_field=IntegerField()
       )
     )
+  
+
+  def annotate_relationship(self, profiles, user_profile):
+    """
+    Annotate the relationship with the current user and the connection counts onto a queryset.
+
+    Each term is a subquery on the indexed connection foreign keys, so a profile
+    costs the same whatever its number of connections.
+
+    Parameters:
+      profiles (QuerySet): The profiles to annotate.
+      user_profile (Profile): The profile of the current user.
+
+    Returns:
+      QuerySet: Profiles annotated with `relationship` (the statuses of the search results),
+      `sent_connections_count` and `received_connections_count`.
+    """
+    connections = models.Connection.objects.all()
+
+    def count(field):
+      counted = connections.filter(**{field: OuterRef("id")}).order_by().values(field)
+      return Coalesce(Subquery(counted.annotate(count=Count("id")).values("count")), 0)
+
+    return profiles.annotate(
+      relationship=Case(
+        When(
+          Exists(connections.filter(sender=user_profile, receiver=OuterRef("id"), accepted=False)),
+          then=Value("pending-them")
+        ),
+        When(
+          Exists(connections.filter(sender=OuterRef("id"), receiver=user_profile, accepted=False)),
+          then=Value("pending-me")
+        ),
+        When(
+          Exists(connections.filter(
+            Q(sender=user_profile, receiver=OuterRef("id")) | Q(sender=OuterRef("id"), receiver=user_profile),
+            accepted=True
+          )),
+          then=Value("connected")
+        ),
+        default=Value("no-connection"),
+        output_field=CharField()
+      ),
+      sent_connections_count=count("sender"),
+      received_connections_count=count("receiver"),
+    )
+  
+
+  def rank_profiles(self, user_profile):
+    """
+    Rank profiles based on dorm, common interests, shared major, and state.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user to compare against.
+
+    Returns:
+      list: Profiles ordered by similarity score.
+    """
+    # Convert the user's interests to a set for easier comparison
+    user_interests = set(user_profile.interests)
+    # Annotate similarity scores
+    profiles = self.annotate_similarity(self.swipe_candidates(user_profile), user_profile)
     # Execute the query to get all profiles
     profiles_list = list(profiles)
      # Calculate the common interests
@@ -143,4 +290,409 @@ class CustomUserManager(BaseUserManager):
       reverse=True
     )
 
-    return sorted_profiles
\ No newline at end of file
+    return sorted_profiles
+  
+
+  def rank_profiles_sql(self, user_profile):
+    """
+    Rank profiles like `rank_profiles`, but compute every term in the database.
+
+    Interests are stored as a comma separated string, so the overlap is the sum
+    of one `CASE` per interest of the current user (at most 5). Nothing is
+    fetched until the queryset is sliced, so paginating it only loads one page
+    of rows with `LIMIT`/`OFFSET`.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user to compare against.
+
+    Returns:
+      QuerySet: Profiles ordered by similarity score, then by id.
+    """
+    profiles = self.annotate_similarity(self.swipe_candidates(user_profile), user_profile)
+    # One term per interest of the current user
+    common_interests = Value(0)
+    for interest in set(user_profile.interests):
+      common_interests = common_interests + Case(
+        When(
+          Q(interests=interest) |
+          Q(interests__startswith=f"{interest},") |
+          Q(interests__endswith=f",{interest}") |
+          Q(interests__contains=f",{interest},"),
+          then=Value(1)
+        ),
+        default=Value(0),
+        output_field=IntegerField()
+      )
+    profiles = profiles.annotate(
+      common_interests=ExpressionWrapper(common_interests, output_field=IntegerField())
+    )
+    # Same criteria as `rank_profiles`, id keeps pages stable between requests
+    ordering = ["-dorm_match", "-common_interests", "-major_match", "-state_promotion", "id"]
+    if not user_profile.interests:
+      # The overlap is the literal 0, PostgreSQL reads it as a column position once it is not selected
+      ordering.remove("-common_interests")
+    return profiles.order_by(*ordering)
+  
+
+  def rank_profiles_deck(self, user_profile):
+    """
+    Read the ranking of a user from their precomputed deck.
+
+    The deck is built on first use and then kept up to date by `DeckEntryManager`,
+    so reading a page is a range scan over the viewer's deck entries.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user.
+
+    Returns:
+      QuerySet: Profiles ordered by their deck score, then by id.
+    """
+    if user_profile.deck_built is None:
+      models.DeckEntry.objects.rebuild_deck(user_profile)
+    return self.get_queryset().filter(
+      deck_appearances__viewer=user_profile
+    ).annotate(
+      deck_score=F("deck_appearances__score")
+    ).order_by("-deck_score", "id")
+  
+
+  def rank_profiles_numpy(self, user_profile, exclude=()):
+    """
+    Rank profiles like `rank_profiles`, with a vectorized pass over columnar arrays.
+
+    Only the ranking fields and interest bitmasks are loaded, profiles are only
+    built for the slice that is requested.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user to compare against.
+      exclude (iterable): Ids of profiles to leave out.
+
+    Returns:
+      VectorizedRanking: A sliceable sequence of profiles ordered by similarity score, then by id.
+    """
+    return VectorizedRanking(user_profile, self.swipe_candidates(user_profile), exclude=exclude)
+  
+
+  def rank_profiles_lazy(self, user_profile, exclude=()):
+    """
+    Rank profiles like `rank_profiles`, keeping only the requested top of the ranking.
+
+    Nothing is queried until the ranking is counted or sliced. A slice streams
+    the candidates in chunks through a heap bounded by the end of the slice, so
+    a page costs O(offset + page size) memory whatever the size of the pool.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user to compare against.
+      exclude (iterable): Ids of profiles to leave out.
+
+    Returns:
+      LazyRanking: A sliceable sequence of profiles ordered by similarity score, then by id.
+    """
+    candidates = self.swipe_candidates(user_profile)
+    if exclude:
+      candidates = candidates.exclude(id__in=exclude)
+    return LazyRanking(user_profile, candidates)
+  
+
+  def exclude_swiped(self, profiles, user_profile):
+    """
+    Leave out the profiles a user already swiped on.
+
+    Written swipes are excluded with an anti-join on the swipes table, which
+    the `unique_swipe` index serves, and the few swipes that may still sit in
+    a worker's buffer come from the cached overlay, see `utils/swipes.py`.
+
+    Parameters:
+      profiles (QuerySet): The profiles to filter.
+      user_profile (Profile): The profile of the current user.
+
+    Returns:
+      QuerySet: The profiles the user hasn't swiped on.
+    """
+    profiles = profiles.exclude(
+      Exists(models.Swipe.objects.filter(swiper=user_profile.id, swiped=OuterRef("pk")))
+    )
+    pending = swipes.pending_ids(user_profile.id)
+    if pending:
+      profiles = profiles.exclude(id__in=pending)
+    return profiles
+
+
+  def swipe_deck(self, user_profile):
+    """
+    Rank profiles for the swipe deck with the configured `SWIPE_RANKING_MODE`.
+
+    Profiles the user already swiped on are left out with `exclude_swiped`,
+    after the user's buffered swipes are written.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user to compare against.
+
+    Returns:
+      QuerySet | list: Ranked profiles, ready to be paginated.
+    """
+    swipes.swipe_buffer.flush(user_profile.id)
+    if settings.SWIPE_RANKING_MODE == "sql":
+      return self.exclude_swiped(self.rank_profiles_sql(user_profile), user_profile)
+    if settings.SWIPE_RANKING_MODE == "deck":
+      return self.exclude_swiped(self.rank_profiles_deck(user_profile), user_profile)
+    if settings.SWIPE_RANKING_MODE == "numpy":
+      return VectorizedRanking(user_profile, self.exclude_swiped(self.swipe_candidates(user_profile), user_profile))
+    if settings.SWIPE_RANKING_MODE == "lazy":
+      return LazyRanking(user_profile, self.exclude_swiped(self.swipe_candidates(user_profile), user_profile))
+    unswiped = self.exclude_swiped(self.swipe_candidates(user_profile), user_profile)
+    unswiped = {str(id) for id in unswiped.values_list("id", flat=True)}
+    return [profile for profile in self.rank_profiles(user_profile) if str(profile.id) in unswiped]
+
+
+# Fields of a profile that the swipe ranking depends on
+DECK_FIELDS = ("id", "dorm_building", "major", "state", "interests")
+
+
+def deck_score(viewer: dict, candidate: dict) -> int:
+  """
+  Compute the deck score of a candidate for a viewer.
+
+  The score packs the `rank_profiles` sort key (dorm match, common interests,
+  major match, state promotion) into one integer, so ordering by it descending
+  gives the same order as `rank_profiles`.
+
+  Parameters:
+    viewer (dict): The `DECK_FIELDS` values of the viewer.
+    candidate (dict): The `DECK_FIELDS` values of the candidate.
+
+  Returns:
+    int: The packed score.
+  """
+  dorm_match = int(viewer["dorm_building"] == candidate["dorm_building"])
+  common_interests = len(set(viewer["interests"] or []) & set(candidate["interests"] or []))
+  major_match = int(viewer["major"] == candidate["major"])
+  state_promotion = int(viewer["state"] != candidate["state"])
+  return dorm_match * 10000 + common_interests * 100 + major_match * 10 + state_promotion
+
+
+class DeckEntryManager(Manager):
+  """
+  Manager for the precomputed swipe decks.
+
+  A deck entry holds the score of one candidate for one viewer. The score is
+  symmetric, so when a profile changes, its own deck and its entries in every
+  other deck are rewritten from the same scores. Nothing else is touched.
+  `Profile.deck_built` records that a viewer's deck was built, an empty deck
+  isn't built again.
+
+  Methods:
+    rebuild_deck(profile):
+      Rewrites every deck entry that involves the profile.
+
+    rescore_profile(profile, previous):
+      Rewrites the deck entries whose score changed with the profile's ranking fields.
+
+    remove_profile(profile):
+      Removes the profile's deck and its entries in every other deck.
+
+    remove_pair(first, second):
+      Removes two connected profiles from each other's decks.
+  """
+  def rebuild_deck(self, profile, batch_size: int = 1000):
+    """
+    Rewrite the deck of a profile and its entries in every other deck.
+
+    Parameters:
+      profile (Profile): The profile that changed.
+      batch_size (int): The number of rows written per insert.
+    """
+    Profile = self.model._meta.get_field("viewer").related_model
+    viewer = {field: getattr(profile, field) for field in DECK_FIELDS}
+
+    entries = []
+    # One pool partition at a time, each scan uses the partial pool index
+    for _, candidates in Profile.objects.iter_pool_partitions(profile):
+      for candidate in candidates.values(*DECK_FIELDS).iterator(chunk_size=batch_size):
+        score = deck_score(viewer, candidate)
+        entries.append(self.model(viewer_id=profile.id, candidate_id=candidate["id"], score=score))
+        entries.append(self.model(viewer_id=candidate["id"], candidate_id=profile.id, score=score))
+        if len(entries) >= batch_size:
+          self._upsert(entries, batch_size)
+          entries = []
+    self._upsert(entries, batch_size)
+    # Drop entries of profiles that are no longer candidates
+    candidates = Profile.objects.swipe_candidates(profile).values("id")
+    self.filter(viewer=profile).exclude(candidate__in=candidates).delete()
+    self.filter(candidate=profile).exclude(viewer__in=candidates).delete()
+    profile.deck_built = timezone.now()
+    Profile.objects.filter(id=profile.id).update(deck_built=profile.deck_built)
+
+
+  def rescore_profile(self, profile, previous: dict, batch_size: int = 1000):
+    """
+    Rewrite the deck entries of a profile whose scores changed with its ranking fields.
+
+    The profile stays in the eligible pool, so its candidates are the same.
+    Each pair is scored with the old and new values and only the pairs whose
+    score changed are written, in the profile's deck and in the candidate's.
+
+    Parameters:
+      profile (Profile): The profile that changed, still eligible.
+      previous (dict): The `DECK_FIELDS` values of the profile before the change.
+      batch_size (int): The number of rows written per insert.
+
+    Returns:
+      int: The number of pairs rescored.
+    """
+    Profile = self.model._meta.get_field("viewer").related_model
+    viewer = {field: getattr(profile, field) for field in DECK_FIELDS}
+
+    entries, rescored = [], 0
+    for _, candidates in Profile.objects.iter_pool_partitions(profile):
+      for candidate in candidates.values(*DECK_FIELDS).iterator(chunk_size=batch_size):
+        score = deck_score(viewer, candidate)
+        if score == deck_score(previous, candidate):
+          continue
+        rescored += 1
+        # A deck that was never built is built in full on first read
+        if profile.deck_built is not None:
+          entries.append(self.model(viewer_id=profile.id, candidate_id=candidate["id"], score=score))
+        entries.append(self.model(viewer_id=candidate["id"], candidate_id=profile.id, score=score))
+        if len(entries) >= batch_size:
+          self._upsert(entries, batch_size)
+          entries = []
+    self._upsert(entries, batch_size)
+    return rescored
+
+
+  def remove_profile(self, profile):
+    """
+    Remove a profile's deck and its entries in every other deck.
+
+    Parameters:
+      profile (Profile): The profile that is no longer swipeable.
+    """
+    self.filter(Q(viewer=profile) | Q(candidate=profile)).delete()
+
+
+  def remove_pair(self, first, second):
+    """
+    Remove two profiles from each other's decks.
+
+    Parameters:
+      first (Profile): One side of the accepted connection.
+      second (Profile): The other side of the accepted connection.
+    """
+    self.filter(
+      Q(viewer=first, candidate=second) | Q(viewer=second, candidate=first)
+    ).delete()
+
+
+  def _upsert(self, entries, batch_size):
+    if entries:
+      self.bulk_create(
+        entries,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["viewer", "candidate"],
+        update_fields=["score"],
+      )
+
+
+class ConnectionManager(Manager):
+  """
+  Manager for connections and the summary of their conversation.
+
+  Each connection carries the snippet and time of its latest message and an
+  unread count per side, written with the message, so conversation lists are
+  read from the connections alone.
+
+  Methods:
+    conversations(user_profile):
+      Gets the accepted connections of a user, the latest conversation first.
+
+    record_messages(messages):
+      Updates the summary of connections with messages that were just sent.
+
+    mark_read(connection, user_profile):
+      Clears the unread count of one side of a connection.
+
+    summarize(connections):
+      Recomputes the latest message of connections from their messages.
+  """
+  def conversations(self, user_profile):
+    """
+    Get the accepted connections of a user, the latest conversation first.
+
+    Parameters:
+      user_profile (Profile): The user.
+
+    Returns:
+      QuerySet: The connections, new connections without messages last.
+    """
+    return self.filter(
+      Q(sender=user_profile) | Q(receiver=user_profile),
+      accepted=True,
+    ).order_by(F("latest_created").desc(nulls_last=True), "-modified")
+
+
+  def record_messages(self, messages):
+    """
+    Update the summary of connections with messages that were just sent, one query per connection.
+
+    The unread count of the side that didn't send a message is incremented
+    in the database, so concurrent messages aren't lost. The latest message
+    only replaces a newer one's preview if it was sent later, so messages
+    written late by a retried flush don't take over the preview.
+
+    Parameters:
+      messages (list): The saved messages, in the order they were sent.
+    """
+    summaries = {}
+    for message in messages:
+      connection = message.connection
+      summary = summaries.setdefault(connection.id, {"sender_unread": 0, "receiver_unread": 0})
+      summary["latest"] = message
+      summary["receiver_unread" if message.user_id == connection.sender_id else "sender_unread"] += 1
+    for connection_id, summary in summaries.items():
+      latest = summary.pop("latest")
+      newer = Q(latest_created__isnull=True) | Q(latest_created__lte=latest.created)
+      self.filter(id=connection_id).update(
+        latest_text=Case(
+          When(newer, then=Value(latest.text[:self.model.PREVIEW_LENGTH])), default=F("latest_text")
+        ),
+        latest_created=Case(When(newer, then=Value(latest.created)), default=F("latest_created")),
+        **{side: F(side) + count for side, count in summary.items() if count},
+      )
+
+
+  def mark_read(self, connection, user_profile):
+    """
+    Clear the unread count of a user's side of a connection, without a query when it is already clear.
+
+    Parameters:
+      connection (Connection): The connection, as loaded.
+      user_profile (Profile): The user who read the conversation.
+    """
+    unread = "sender_unread" if user_profile.id == connection.sender_id else "receiver_unread"
+    if getattr(connection, unread):
+      self.filter(id=connection.id).update(**{unread: 0})
+      setattr(connection, unread, 0)
+
+
+  def summarize(self, connections=None):
+    """
+    Recompute the latest message of connections from their messages, for messages written in bulk.
+
+    Parameters:
+      connections (QuerySet): The connections to update, all of them by default.
+
+    Returns:
+      int: The number of connections updated.
+    """
+    Message = self.model._meta.get_field("messages").related_model
+    latest = Message.objects.filter(connection=OuterRef("pk")).order_by("-created", "-id")
+    connections = self.all() if connections is None else connections
+    return connections.update(
+      latest_text=Coalesce(
+        Subquery(latest.annotate(snippet=Substr("text", 1, self.model.PREVIEW_LENGTH)).values("snippet")[:1]),
+        Value(""),
+      ),
+      latest_created=Subquery(latest.values("created")[:1]),
+    )
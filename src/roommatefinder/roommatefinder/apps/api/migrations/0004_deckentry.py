@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_roommatequiz_bed_time_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeckEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deck_appearances', to=settings.AUTH_USER_MODEL)),
+                ('viewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deck_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['viewer', '-score', 'candidate'], name='deck_entry_viewer_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='deckentry',
+            constraint=models.UniqueConstraint(fields=('viewer', 'candidate'), name='unique_deck_entry'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+from roommatefinder.settings._base import POPULAR_CHOICES
+
+
+def fill_interests_mask(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    bits = {code: 1 << bit for bit, (code, _) in enumerate(POPULAR_CHOICES)}
+    profiles = []
+    for profile in Profile.objects.only('id', 'interests').iterator(chunk_size=1000):
+        profile.interests_mask = 0
+        for interest in profile.interests or []:
+            profile.interests_mask |= bits.get(interest, 0)
+        profiles.append(profile)
+        if len(profiles) >= 1000:
+            Profile.objects.bulk_update(profiles, ['interests_mask'])
+            profiles = []
+    Profile.objects.bulk_update(profiles, ['interests_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_deckentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='interests_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_interests_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_profile_interests_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Swipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='creation date and time')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modification date and time')),
+                ('direction', models.CharField(choices=[('L', 'Left'), ('R', 'Right')], max_length=1)),
+                ('swiped', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swiped_by', to=settings.AUTH_USER_MODEL)),
+                ('swiper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swipes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='swipe',
+            constraint=models.UniqueConstraint(fields=('swiper', 'swiped'), name='unique_swipe'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_swipe'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('has_account', True), ('is_active', True), ('pause_profile', False)), fields=['dorm_building', 'sex'], name='profile_eligible_pool_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['has_account', 'is_active', 'pause_profile', 'dorm_building', 'sex'], name='profile_pool_status_idx'),
+        ),
+    ]
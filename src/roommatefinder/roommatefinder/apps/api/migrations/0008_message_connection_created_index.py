@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_profile_eligible_pool_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['connection', 'created', 'id'], name='message_connection_created_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:09
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+
+def fill_latest_message(apps, schema_editor):
+    Connection = apps.get_model('api', 'Connection')
+    Message = apps.get_model('api', 'Message')
+    latest = Message.objects.filter(connection=OuterRef('pk')).order_by('-created', '-id')
+    Connection.objects.filter(Exists(latest)).update(
+        latest_text=Coalesce(
+            Subquery(latest.annotate(snippet=Substr('text', 1, 100)).values('snippet')[:1]),
+            Value(''),
+        ),
+        latest_created=Subquery(latest.values('created')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_message_connection_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connection',
+            name='latest_created',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='connection',
+            name='latest_text',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='connection',
+            name='receiver_unread',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='connection',
+            name='sender_unread',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_latest_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_connection_summary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='creation date and time'),
+        ),
+    ]
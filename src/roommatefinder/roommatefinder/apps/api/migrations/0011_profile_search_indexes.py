@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:14
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_message_created_at_send'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='profile_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('identifier'), name='text_pattern_ops'), name='profile_identifier_upper_idx'),
+        ),
+    ]
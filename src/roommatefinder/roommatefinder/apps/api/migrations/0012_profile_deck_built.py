@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:23
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+
+def mark_built_decks(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    DeckEntry = apps.get_model('api', 'DeckEntry')
+    Profile.objects.filter(
+        Exists(DeckEntry.objects.filter(viewer=OuterRef('pk')))
+    ).update(deck_built=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_profile_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='deck_built',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(mark_built_decks, migrations.RunPython.noop),
+    ]
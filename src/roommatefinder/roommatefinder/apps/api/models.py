@@ -2,13 +2,18 @@
 import uuid
 
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.contrib.postgres.indexes import OpClass
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from multiselectfield import MultiSelectField
 from model_utils import Choices
 
 from roommatefinder.apps.core.models import CreationModificationDateBase
-from roommatefinder.apps.api.managers import CustomUserManager
+from roommatefinder.apps.api.managers import ConnectionManager, CustomUserManager, DeckEntryManager
+from roommatefinder.apps.api.utils.model_utils import interests_to_mask
 from roommatefinder.settings._base import POPULAR_CHOICES, DORM_CHOICES
 
 
@@ -37,6 +42,8 @@ class Profile(AbstractBaseUser, PermissionsMixin, CreationModificationDateBase):
   description = models.TextField(max_length=500, null=True, blank=True)
   dorm_building = models.CharField(choices=DORM_CHOICES, max_length=2, null=True)
   interests = MultiSelectField(choices=POPULAR_CHOICES, max_choices=5, max_length=1000)
+  # interests packed into a bitmask for the vectorized ranking, kept in sync on save
+  interests_mask = models.BigIntegerField(default=0, editable=False)
   graduation_year = models.PositiveIntegerField(null=True, blank=True)
 
   otp = models.CharField(max_length=6, null=True, blank=True)
@@ -49,6 +56,8 @@ class Profile(AbstractBaseUser, PermissionsMixin, CreationModificationDateBase):
   is_active = models.BooleanField(default=True)
   has_account = models.BooleanField(default=False)
   pause_profile = models.BooleanField(default=False)
+  # when the precomputed swipe deck of the profile was built, None until it is, see `DeckEntryManager`
+  deck_built = models.DateTimeField(null=True, blank=True, editable=False)
   
   sex = models.CharField(
     choices=SEX_CHOICES,
@@ -73,6 +82,37 @@ class Profile(AbstractBaseUser, PermissionsMixin, CreationModificationDateBase):
   # custom profile creation + swiping algorithm 
   objects = CustomUserManager()
 
+  class Meta:
+    indexes = [
+      # the eligible pool, see `CustomUserManager.eligible_pool`, one partition per dorm and sex
+      models.Index(
+        fields=['dorm_building', 'sex'],
+        name='profile_eligible_pool_idx',
+        condition=models.Q(has_account=True, is_active=True, pause_profile=False),
+      ),
+      models.Index(
+        fields=['has_account', 'is_active', 'pause_profile', 'dorm_building', 'sex'],
+        name='profile_pool_status_idx',
+      ),
+      # case insensitive prefix search, see `utils/search.py`, `istartswith` compares `UPPER()` with `LIKE`
+      models.Index(OpClass(Upper('name'), name='text_pattern_ops'), name='profile_name_upper_idx'),
+      models.Index(OpClass(Upper('identifier'), name='text_pattern_ops'), name='profile_identifier_upper_idx'),
+    ]
+
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    instance = super().from_db(db, field_names, values)
+    # the values as loaded, the deck signals compare against them instead of querying again
+    instance._loaded_values = dict(zip(field_names, values))
+    return instance
+
+  def save(self, *args, **kwargs):
+    self.interests_mask = interests_to_mask(self.interests)
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "interests" in update_fields:
+      kwargs["update_fields"] = {*update_fields, "interests_mask"}
+    super().save(*args, **kwargs)
+
   def delete(self):
     super().delete()
 
@@ -140,6 +180,14 @@ class Connection(CreationModificationDateBase):
     on_delete=models.CASCADE
   )
   accepted = models.BooleanField(default=False)
+  # summary of the conversation, written with each message, see `ConnectionManager`
+  PREVIEW_LENGTH = 100
+  latest_text = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='')
+  latest_created = models.DateTimeField(null=True, blank=True)
+  sender_unread = models.PositiveIntegerField(default=0)
+  receiver_unread = models.PositiveIntegerField(default=0)
+
+  objects = ConnectionManager()
   
   def __str__(self):
 	  return str(self.sender.id) + ' -> ' + str(self.receiver.id)
@@ -157,6 +205,67 @@ class Message(CreationModificationDateBase):
 		on_delete=models.CASCADE
 	)
   text = models.TextField()
+  # set when the message is sent rather than when it is saved, write-behind messages are saved later
+  created = models.DateTimeField(_("creation date and time"), default=timezone.now, editable=False)
+
+  class Meta:
+    indexes = [
+      # the keyset pages of a conversation, see `MessageKeysetPagination`
+      models.Index(fields=['connection', 'created', 'id'], name='message_connection_created_idx'),
+    ]
+
+  def __str__(self):
+    return str(self.user.id) + ': ' + self.text
+
+
+class Swipe(CreationModificationDateBase):
+  """ A left or right swipe of one profile on another, written in batches by `utils/swipes.py`. """
+  DIRECTION_CHOICES = Choices(("L", "Left"), ("R", "Right"))
+
+  swiper = models.ForeignKey(
+    Profile,
+    related_name='swipes',
+    on_delete=models.CASCADE
+  )
+  swiped = models.ForeignKey(
+    Profile,
+    related_name='swiped_by',
+    on_delete=models.CASCADE
+  )
+  direction = models.CharField(choices=DIRECTION_CHOICES, max_length=1)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['swiper', 'swiped'], name='unique_swipe'),
+    ]
+
+  def __str__(self):
+    return str(self.swiper_id) + ' ' + self.direction + ' ' + str(self.swiped_id)
+
+
+class DeckEntry(models.Model):
+  """ A candidate on a viewer's precomputed swipe deck, see `DeckEntryManager`. """
+  viewer = models.ForeignKey(
+    Profile,
+    related_name='deck_entries',
+    on_delete=models.CASCADE
+  )
+  candidate = models.ForeignKey(
+    Profile,
+    related_name='deck_appearances',
+    on_delete=models.CASCADE
+  )
+  score = models.PositiveIntegerField(default=0)
+
+  objects = DeckEntryManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['viewer', 'candidate'], name='unique_deck_entry'),
+    ]
+    indexes = [
+      models.Index(fields=['viewer', '-score', 'candidate'], name='deck_entry_viewer_score_idx'),
+    ]
 
   def __str__(self):
-    return str(self.user.id) + ': ' + self.text
\ No newline at end of file
+    return str(self.viewer_id) + ' -> ' + str(self.candidate_id) + ': ' + str(self.score)
@@ -1,6 +1,172 @@
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class StandardResultsSetPagination(PageNumberPagination):
   page_size = 8
   page_size_query_param = 'page_size'
-  max_page_size = 10
\ No newline at end of file
+  max_page_size = 10
+
+
+class DeckSnapshotPagination(StandardResultsSetPagination):
+  """
+  Cursor pagination over a short-lived snapshot of a ranked swipe deck.
+
+  The first request ranks the deck once and caches the ids of its top
+  `SWIPE_DECK_SNAPSHOT_SIZE` profiles for `SWIPE_DECK_SNAPSHOT_TTL` seconds.
+  The `next` link carries an opaque, signed cursor into that snapshot, so
+  later pages are read from the cache without ranking again and without
+  duplicates or skipped cards when other profiles change in between.
+
+  Requests with a `page` query parameter keep the page number pagination of
+  `StandardResultsSetPagination`.
+  """
+  cursor_query_param = 'cursor'
+  cursor_salt = 'deck-snapshot'
+  snapshot = None
+
+  def paginate_deck(self, rank, request, view=None, load=None):
+    """
+    Paginate a swipe deck.
+
+    Parameters:
+      rank (callable): Returns the ranked profiles, only called when a new snapshot is needed.
+      request (Request): The incoming HTTP request.
+      view (APIView): The view paginating the deck.
+      load (callable): Loads the page from its profile ids, profiles are loaded with `in_bulk` by default.
+
+    Returns:
+      list: The profiles of the requested page.
+    """
+    if self.page_query_param in request.query_params:
+      page = self.paginate_queryset(rank(), request, view=view)
+      return load([profile.id for profile in page]) if load is not None else page
+
+    self.request = request
+    self.page_size = self.get_page_size(request)
+    encoded = request.query_params.get(self.cursor_query_param)
+    if encoded:
+      snapshot_id, self.offset = self.decode_cursor(encoded)
+      self.snapshot_id = snapshot_id
+      self.snapshot = cache.get(self.snapshot_key(snapshot_id))
+      if self.snapshot is None or self.snapshot['viewer'] != str(request.user.id):
+        raise NotFound('Deck cursor expired, request a new deck.')
+    else:
+      self.offset = 0
+      self.snapshot_id = uuid.uuid4().hex
+      self.snapshot = {
+        'viewer': str(request.user.id),
+        'ids': self.ranked_ids(rank(), settings.SWIPE_DECK_SNAPSHOT_SIZE),
+      }
+      cache.set(
+        self.snapshot_key(self.snapshot_id),
+        self.snapshot,
+        timeout=settings.SWIPE_DECK_SNAPSHOT_TTL
+      )
+
+    ids = self.snapshot['ids'][self.offset:self.offset + self.page_size]
+    if load is not None:
+      return load(ids)
+    model = view.queryset.model
+    profiles = model.objects.in_bulk(ids)
+    # Keep the snapshot order, skip profiles deleted since the snapshot
+    ordered = (profiles.get(model._meta.pk.to_python(id)) for id in ids)
+    return [profile for profile in ordered if profile is not None]
+
+  def ranked_ids(self, ranked, limit):
+    """ Get the ids of the top `limit` ranked profiles as strings. """
+    if isinstance(ranked, QuerySet):
+      ids = ranked.values_list('id', flat=True)[:limit]
+    else:
+      ids = [profile.id for profile in ranked[:limit]]
+    return [str(id) for id in ids]
+
+  def snapshot_key(self, snapshot_id):
+    return f'deck-snapshot:{snapshot_id}'
+
+  def encode_cursor(self, offset):
+    return signing.dumps([self.snapshot_id, offset], salt=self.cursor_salt, compress=True)
+
+  def decode_cursor(self, encoded):
+    try:
+      snapshot_id, offset = signing.loads(encoded, salt=self.cursor_salt)
+      assert int(offset) >= 0
+    except Exception:
+      raise NotFound('Invalid cursor.')
+    return snapshot_id, int(offset)
+
+  def get_cursor_link(self, offset):
+    url = self.request.build_absolute_uri()
+    return replace_query_param(url, self.cursor_query_param, self.encode_cursor(offset))
+
+  def get_paginated_response(self, data):
+    if self.snapshot is None:
+      return super().get_paginated_response(data)
+
+    count = len(self.snapshot['ids'])
+    next_offset = self.offset + self.page_size
+    return Response(OrderedDict([
+      ('count', count),
+      ('next', self.get_cursor_link(next_offset) if next_offset < count else None),
+      ('previous', self.get_cursor_link(max(self.offset - self.page_size, 0)) if self.offset > 0 else None),
+      ('results', data),
+    ]))
+
+
+class MessageKeysetPagination:
+  """
+  Keyset pagination of a conversation, newest messages first.
+
+  Pages are ordered on `(created, id)` and the cursor of the next page is the
+  signed key of the last message of the page, so every page is one range scan
+  of the `(connection, created)` index, however deep the scroll. One extra row
+  is fetched to know if there is a next page, the conversation isn't counted.
+  """
+  page_size = 15
+  cursor_salt = 'message-list'
+
+  def paginate(self, messages, cursor=None, columns=()) -> tuple:
+    """
+    Get a page of messages.
+
+    Parameters:
+      messages (QuerySet): The messages of a conversation.
+      cursor (str): The cursor of the page, the first page when empty.
+      columns (iterable): The columns of the rows, `id` and `created` are always included.
+
+    Returns:
+      tuple: The `.values()` rows of the page and the cursor of the next page, None on the last page.
+
+    Raises:
+      ValueError: If the cursor is invalid.
+    """
+    messages = messages.order_by('-created', '-id')
+    if cursor:
+      created, id = self.decode_cursor(cursor)
+      messages = messages.filter(Q(created__lt=created) | Q(created=created, id__lt=id))
+    rows = list(messages.values(*dict.fromkeys(('id', 'created', *columns)))[:self.page_size + 1])
+    if len(rows) <= self.page_size:
+      return rows, None
+    rows = rows[:self.page_size]
+    return rows, self.encode_cursor(rows[-1])
+
+  def encode_cursor(self, row):
+    return signing.dumps([row['created'].isoformat(), row['id']], salt=self.cursor_salt)
+
+  def decode_cursor(self, encoded):
+    try:
+      created, id = signing.loads(encoded, salt=self.cursor_salt)
+      created = parse_datetime(created)
+      assert created is not None
+    except Exception:
+      raise ValueError('Invalid cursor.')
+    return created, int(id)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from rest_framework import serializers
 from roommatefinder.apps.api import models
+from roommatefinder.apps.api.serializers.prefetch import PrefetchListSerializer, PrefetchPlanMixin
 
 
 class ConnectionSerializer(serializers.ModelSerializer):
@@ -25,6 +26,17 @@ class UserSerializer(serializers.ModelSerializer):
     ]
 
 
+def connection_status(pending_them, pending_me, connected):
+	""" The status of a connection, seen from the user searching. """
+	if pending_them:
+		return 'pending-them'	
+	elif pending_me:
+		return 'pending-me'	
+	elif connected:
+		return 'connected'
+	return 'no-connection'
+
+
 class SearchSerializer(UserSerializer):
 	"""
 	Serializer class for Search items 
@@ -40,19 +52,15 @@ class SearchSerializer(UserSerializer):
     ]
 
 	def get_status(self, obj):
-		if obj.pending_them:
-			return 'pending-them'	
-		elif obj.pending_me:
-			return 'pending-me'	
-		elif obj.connected:
-			return 'connected'
-		return 'no-connection'
+		return connection_status(obj.pending_them, obj.pending_me, obj.connected)
     
 
-class RequestSerializer(serializers.ModelSerializer):
+class RequestSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
 	"""
 	Serializer class for the Request model
 	"""
+	select_related = ('sender', 'receiver')
+
 	sender = UserSerializer()
 	receiver = UserSerializer()
 	class Meta:
@@ -63,15 +71,22 @@ class RequestSerializer(serializers.ModelSerializer):
 			'receiver',
 			'created',
 		]
+		list_serializer_class = PrefetchListSerializer
 
 
-class FriendSerializer(serializers.ModelSerializer):
+class FriendSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
 	"""
 	Serializer class for an accepted connection
+
+	The preview, time and unread count are read from the summary kept on the
+	connection, see `ConnectionManager`, so a list of connections is one query.
 	"""
+	select_related = ('sender', 'receiver')
+
 	friend = serializers.SerializerMethodField()
 	preview = serializers.SerializerMethodField()
 	updated = serializers.SerializerMethodField()
+	unread = serializers.SerializerMethodField()
 	class Meta:
 		model = models.Connection
 		fields = [
@@ -79,32 +94,34 @@ class FriendSerializer(serializers.ModelSerializer):
 			'friend',
 			'preview',
 			'updated',
+			'unread',
 		]
+		list_serializer_class = PrefetchListSerializer
 
 	def get_friend(self, obj):
 		# if i'm the sender
-		if self.context['user'] == obj.sender:
+		if self.context['user'].id == obj.sender_id:
 			return UserSerializer(obj.receiver).data
 		# if i'm the receiver
-		elif self.context['user'] == obj.receiver:
+		elif self.context['user'].id == obj.receiver_id:
 			return UserSerializer(obj.sender).data
 		else:
 			# @! create more specific error
 			print('Error: No user found in friendserializer')
 
 	def get_preview(self, obj):
-		default = 'New connection'
-		if not hasattr(obj, 'latest_text'):
-			return default
-		return obj.latest_text or default
+		return obj.latest_text or 'New connection'
 
 	def get_updated(self, obj):
-		if not hasattr(obj, 'latest_created'):
-			date = obj.modified
-		else:
-			date = obj.latest_created or obj.modified
+		date = obj.latest_created or obj.modified
 		return date.isoformat()
 
+	def get_unread(self, obj):
+		# the count of my side of the conversation
+		if self.context['user'].id == obj.sender_id:
+			return obj.sender_unread
+		return obj.receiver_unread
+
 
 class MessageSerializer(serializers.ModelSerializer):
 	"""
@@ -121,4 +138,5 @@ class MessageSerializer(serializers.ModelSerializer):
 		]
 
 	def get_is_me(self, obj):
-		return self.context['user'] == obj.user
\ No newline at end of file
+		# Compare ids, the message's user doesn't need to be fetched
+		return self.context['user'].id == obj.user_id
\ No newline at end of file
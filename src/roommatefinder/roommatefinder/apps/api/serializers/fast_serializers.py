@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import FileField as ModelFileField
+from rest_framework import fields, relations, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from roommatefinder.apps.api.serializers import (
+  extra_serializers,
+  matching_serializers,
+  photo_serializers,
+  profile_serializers,
+)
+
+try:
+  import orjson
+except ImportError: # pragma: no cover
+  orjson = None
+
+
+def _default(obj):
+  return encoders.JSONEncoder().default(obj)
+
+
+def dumps(data) -> bytes:
+  """
+  Encode data as compact JSON, the same JSON `JSONRenderer` produces.
+
+  Uses orjson when it is installed, the standard library otherwise.
+  """
+  if orjson is not None:
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+  return json.dumps(
+    data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(",", ":")
+  ).encode("utf-8")
+
+
+def loads(data):
+  """ Decode JSON encoded by `dumps`. """
+  if orjson is not None:
+    return orjson.loads(data)
+  return json.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+  """ `JSONRenderer` with the fast encoder of `dumps`. """
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if data is None:
+      return b""
+    return dumps(data)
+
+
+class Nested:
+  """
+  A nested field of a fast serializer, read with one query for every row.
+
+  Parameters:
+    serializer_class (Type[FastSerializer]): The fast serializer of the related rows.
+    fk (str): The foreign key of the related model pointing to the parent row.
+    many (bool): A list of related rows, or a single one (None when missing).
+  """
+  def __init__(self, serializer_class, fk: str, many: bool = True):
+    self.serializer_class = serializer_class
+    self.fk = fk
+    self.many = many
+
+  def fetch(self, ids, request=None, context=None) -> dict:
+    """ Serialize the related rows of the given parent ids, by parent id. """
+    serializer = self.serializer_class(request=request, context=context)
+    model = serializer.plan["model"]
+    fk = model._meta.get_field(self.fk).attname
+    # Ordered by primary key, so the lists come out the same on every read
+    queryset = model._default_manager.filter(**{f"{self.fk}__in": ids}).order_by("pk")
+    rows = list(queryset.values(*{*serializer.plan["columns"], fk}))
+    related = {}
+    for row, data in zip(rows, serializer.serialize_rows(rows)):
+      if self.many:
+        related.setdefault(row[fk], []).append(data)
+      else:
+        related[row[fk]] = data
+    return related
+
+  def default(self):
+    return [] if self.many else None
+
+
+class FastSerializer:
+  """
+  Read-only counterpart of a DRF serializer, built from `.values()` rows.
+
+  The fields of `serializer_class` are inspected once per class and compiled
+  into one accessor per field (a column and a converter), so serializing a row
+  is a loop over plain dicts, without model instances or field introspection.
+  The output is the same JSON as the DRF serializer's.
+
+  Attributes:
+    serializer_class (Type[Serializer]): The DRF serializer to reproduce.
+    nested (dict): `Nested` fields, by field name, for nested serializers and method fields.
+    columns (tuple): Extra columns the `get_<field>` methods read from the row.
+  """
+  serializer_class = None
+  nested = {}
+  columns = ()
+
+  def __init__(self, request=None, context=None):
+    self.request = request
+    self.context = context or {}
+    self.plan = self.compile()
+
+  @classmethod
+  def compile(cls) -> dict:
+    """ Compile the fields of `serializer_class`, once per class. """
+    if "_plan" in cls.__dict__:
+      return cls._plan
+    model = cls.serializer_class.Meta.model
+    columns, accessors = {model._meta.pk.attname, *cls.columns}, []
+    for name, field in cls.serializer_class().fields.items():
+      if name in cls.nested:
+        accessors.append((name, "nested", cls.nested[name], None))
+      elif hasattr(cls, f"get_{name}"):
+        accessors.append((name, "method", getattr(cls, f"get_{name}"), None))
+      elif isinstance(field, (serializers.BaseSerializer, fields.SerializerMethodField)):
+        raise ImproperlyConfigured(f"{cls.__name__}.{name} needs a `nested` entry or a `get_{name}` method.")
+      elif isinstance(field, relations.ManyRelatedField):
+        accessors.append((name, "many", model._meta.get_field(field.source), None))
+      elif field.source.startswith("get_") and field.source.endswith("_display"):
+        model_field = model._meta.get_field(field.source[len("get_"):-len("_display")])
+        choices = dict(model_field.flatchoices)
+        columns.add(model_field.attname)
+        accessors.append((name, "column", model_field.attname, lambda value, choices=choices: choices.get(value, value)))
+      else:
+        model_field = model._meta.get_field(field.source)
+        columns.add(model_field.attname)
+        if isinstance(model_field, ModelFileField):
+          accessors.append((name, "file", model_field.attname, model_field.storage))
+        else:
+          accessors.append((name, "column", model_field.attname, cls.converter(field, model_field)))
+    cls._plan = {"model": model, "pk": model._meta.pk, "columns": tuple(columns), "accessors": accessors}
+    return cls._plan
+
+  @staticmethod
+  def converter(field, model_field):
+    """ The converter of a column, None when the database value is already the output. """
+    if isinstance(field, relations.RelatedField):
+      model_field = model_field.target_field
+      field = fields.UUIDField() if model_field.get_internal_type() == "UUIDField" else None
+    if isinstance(field, fields.UUIDField):
+      return str
+    if isinstance(field, (fields.DateTimeField, fields.DateField, fields.TimeField, fields.DecimalField, fields.DurationField)):
+      return field.to_representation
+    return None
+
+  def file_url(self, name, storage):
+    if not name:
+      return None
+    url = storage.url(name)
+    if self.request is not None:
+      return self.request.build_absolute_uri(url)
+    return url
+
+  def fetch_many(self, model_field, ids) -> dict:
+    """ The related primary keys of a many-to-many field, by row id, in the order they were added. """
+    through = model_field.remote_field.through
+    source, target = model_field.m2m_field_name(), model_field.m2m_reverse_field_name()
+    pairs = (
+      through._default_manager.filter(**{f"{source}__in": ids})
+      .order_by("pk")
+      .values_list(f"{source}_id", f"{target}_id")
+    )
+    related = {}
+    for id, related_id in pairs:
+      related.setdefault(id, []).append(related_id)
+    return related
+
+  def serialize_rows(self, rows) -> list:
+    """
+    Serialize `.values()` rows that have every column of the plan.
+
+    Parameters:
+      rows (list): The rows, as dicts.
+
+    Returns:
+      list: The serialized rows.
+    """
+    pk = self.plan["pk"].attname
+    ids = [row[pk] for row in rows]
+    related = {}
+    for name, kind, target, _ in self.plan["accessors"]:
+      if kind == "nested":
+        related[name] = target.fetch(ids, request=self.request, context=self.context) if ids else {}
+      elif kind == "many":
+        related[name] = self.fetch_many(target, ids) if ids else {}
+
+    results = []
+    for row in rows:
+      data = {}
+      for name, kind, target, convert in self.plan["accessors"]:
+        if kind == "column":
+          value = row[target]
+          data[name] = convert(value) if convert is not None and value is not None else value
+        elif kind == "file":
+          data[name] = self.file_url(row[target], convert)
+        elif kind == "nested":
+          data[name] = related[name].get(row[pk], target.default())
+        elif kind == "many":
+          data[name] = related[name].get(row[pk], [])
+        else:
+          data[name] = target(self, row)
+      results.append(data)
+    return results
+
+  def serialize_queryset(self, queryset) -> list:
+    """ Serialize every row of a queryset, in its order. """
+    return self.serialize_rows(list(queryset.values(*self.plan["columns"])))
+
+  def iter_queryset(self, queryset, chunk_size: int = 1000):
+    """
+    Serialize a queryset chunk by chunk, without loading it whole.
+
+    Rows are streamed from the database with `.iterator()`, nested fields take
+    one query per chunk.
+
+    Parameters:
+      queryset (QuerySet): The rows to serialize.
+      chunk_size (int): The number of rows serialized at a time.
+
+    Yields:
+      list: The serialized rows of each chunk, in the order of the queryset.
+    """
+    chunk = []
+    for row in queryset.values(*self.plan["columns"]).iterator(chunk_size=chunk_size):
+      chunk.append(row)
+      if len(chunk) == chunk_size:
+        yield self.serialize_rows(chunk)
+        chunk = []
+    if chunk:
+      yield self.serialize_rows(chunk)
+
+  def serialize_ids(self, ids) -> list:
+    """ Serialize the rows with the given primary keys, in the order of `ids`, skipping missing rows. """
+    pk = self.plan["pk"]
+    ids = [pk.to_python(id) for id in ids]
+    queryset = self.plan["model"]._default_manager.filter(pk__in=ids)
+    rows = {row[pk.attname]: row for row in queryset.values(*self.plan["columns"])}
+    return self.serialize_rows([rows[id] for id in ids if id in rows])
+
+
+class FastPhotoSerializer(FastSerializer):
+  serializer_class = photo_serializers.PhotoSerializer
+
+
+class FastRoommateQuizSerializer(FastSerializer):
+  serializer_class = matching_serializers.RoommateQuizSerializer
+
+
+class FastBaseProfileSerializer(FastSerializer):
+  """ Fast `BaseProfileSerializer`, read-only profile details. """
+  serializer_class = profile_serializers.BaseProfileSerializer
+  nested = {
+    "photos": Nested(FastPhotoSerializer, fk="profile"),
+    "roommate_quiz": Nested(FastRoommateQuizSerializer, fk="profile", many=False),
+  }
+
+
+class FastSwipeProfileSerializer(FastBaseProfileSerializer):
+  """ Fast `SwipeProfileSerializer`, profile cards of the swipe deck. """
+  serializer_class = profile_serializers.SwipeProfileSerializer
+
+
+class FastProfileSerializer(FastSerializer):
+  """ Fast `ProfileSerializer`. """
+  serializer_class = profile_serializers.ProfileSerializer
+  nested = {"photos": Nested(FastPhotoSerializer, fk="profile")}
+
+
+class FastUserSerializer(FastSerializer):
+  """ Fast `UserSerializer`, the profile summary of the websocket events. """
+  serializer_class = extra_serializers.UserSerializer
+
+
+class FastMessageSerializer(FastSerializer):
+  """ Fast `MessageSerializer`, needs the `user` reading the messages in the context. """
+  serializer_class = extra_serializers.MessageSerializer
+  columns = ("user_id",)
+
+  def get_is_me(self, row):
+    return self.context["user"].id == row["user_id"]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from django.db.models import QuerySet, prefetch_related_objects
+from rest_framework import serializers
+
+
+class PrefetchListSerializer(serializers.ListSerializer):
+  """
+  List serializer that applies the prefetch plan of its child serializer.
+
+  Querysets that aren't evaluated yet get the plan added to their query, lists
+  of instances are prefetched in place, so a page of N instances is serialized
+  with a constant number of queries.
+  """
+  def to_representation(self, data):
+    if isinstance(data, QuerySet) and data._result_cache is None:
+      data = self.child.setup_queryset(data)
+    elif isinstance(data, (list, tuple, QuerySet)):
+      self.child.prefetch(data)
+    return super().to_representation(data)
+
+
+class PrefetchPlanMixin:
+  """
+  Declares the related objects a serializer reads.
+
+  Attributes:
+    select_related (tuple): Forward foreign keys and one-to-one relations, joined into the query.
+    prefetch_related (tuple): Reverse and many-to-many relations, fetched with one query each.
+
+  Set `list_serializer_class = PrefetchListSerializer` in the serializer's
+  Meta to apply the plan whenever it is used with `many=True`.
+  """
+  select_related = ()
+  prefetch_related = ()
+
+  @classmethod
+  def setup_queryset(cls, queryset: QuerySet) -> QuerySet:
+    """ Add the prefetch plan to a queryset. """
+    if cls.select_related:
+      queryset = queryset.select_related(*cls.select_related)
+    if cls.prefetch_related:
+      queryset = queryset.prefetch_related(*cls.prefetch_related)
+    return queryset
+
+  @classmethod
+  def prefetch(cls, instances):
+    """ Fetch the related objects of already loaded instances, in place. """
+    instances = [instance for instance in instances if instance is not None]
+    if instances:
+      prefetch_related_objects(instances, *cls.select_related, *cls.prefetch_related)
+    return instances
@@ -3,80 +3,87 @@ from rest_framework import serializers, fields
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from roommatefinder.apps.api.serializers import photo_serializers, matching_serializers
+from roommatefinder.apps.api.serializers.prefetch import PrefetchListSerializer, PrefetchPlanMixin
 from roommatefinder.apps.api import models
 from roommatefinder.apps.api.utils import model_utils
 from roommatefinder.settings._base import POPULAR_CHOICES, DORM_CHOICES
 
 
-class BaseProfileSerializer(serializers.ModelSerializer):
+class BaseProfileSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
   """
   Base Profile Serializer class, access to all data points.
   """
-  token = serializers.SerializerMethodField(read_only=True)
-  refresh_token = serializers.SerializerMethodField(read_only=True)
+  select_related = ("roommatequiz",)
+  prefetch_related = ("photo_set", "groups", "user_permissions", "blocked_profiles")
+
   photos = photo_serializers.PhotoSerializer(source="photo_set", many=True, read_only=True)
   roommate_quiz = serializers.SerializerMethodField(read_only=True)
   
   class Meta:
     model = models.Profile
-    exclude = ('password', )
-
-  def get_token(self, profile):
-    """
-    Refresh the token everytime the user is called
-    """
-    token = RefreshToken.for_user(profile)
-    return str(token.access_token)
-
-  def get_refresh_token(self, profile):
-    token = RefreshToken.for_user(profile)
-    return str(token)
+    exclude = ('password', 'interests_mask')
+    list_serializer_class = PrefetchListSerializer
 
   def get_roommate_quiz(self, obj):
+    # Read through the relation, so the quiz comes from the prefetch plan
     try:
-      roommate_quiz = models.RoommateQuiz.objects.get(profile=obj)
-      return matching_serializers.RoommateQuizSerializer(roommate_quiz).data
+      roommate_quiz = obj.roommatequiz
     except models.RoommateQuiz.DoesNotExist:
-      return None  
+      return None
+    return matching_serializers.RoommateQuizSerializer(roommate_quiz).data
+
+
+class AuthProfileSerializer(BaseProfileSerializer):
+  """
+  Profile of the user being authenticated, with a token pair.
+
+  Only for the responses that sign a user in, one pair is minted per response
+  instead of one per serialized profile.
+  """
+  token = serializers.SerializerMethodField(read_only=True)
+  refresh_token = serializers.SerializerMethodField(read_only=True)
+
+  def get_refresh(self, profile) -> RefreshToken:
+    """ Mint the token pair of a profile once, both fields read the same pair. """
+    if not hasattr(self, "_refresh"):
+      self._refresh = {}
+    if profile.pk not in self._refresh:
+      self._refresh[profile.pk] = RefreshToken.for_user(profile)
+    return self._refresh[profile.pk]
+
+  def get_token(self, profile):
+    return str(self.get_refresh(profile).access_token)
+
+  def get_refresh_token(self, profile):
+    return str(self.get_refresh(profile))
     
 
 class SwipeProfileSerializer(BaseProfileSerializer):
   """
   Serializer for a profile on the swipe deck.
   """
-  token = None
-  refresh_token = None
+  prefetch_related = ("photo_set", "groups", "blocked_profiles")
   
   class Meta(BaseProfileSerializer.Meta):
-    exclude = ('password', 'otp', 'otp_expiry', 'max_otp_try', 'otp_max_out', 'otp_verified', 'user_permissions')
+    exclude = ('password', 'interests_mask', 'otp', 'otp_expiry', 'max_otp_try', 'otp_max_out', 'otp_verified', 'user_permissions')
 
 
-class ProfileSerializer(serializers.ModelSerializer):
-  token = serializers.SerializerMethodField(read_only=True)
-  refresh_token = serializers.SerializerMethodField(read_only=True)
+class ProfileSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
+  prefetch_related = ("photo_set",)
+
   photos = photo_serializers.PhotoSerializer(source="photo_set", many=True, read_only=True)
   sex = serializers.CharField(source="get_sex_display", required=True, allow_null=False)
 
   class Meta:
     model = models.Profile
-    fields = ['id', 'token', 'refresh_token', 'sex',
+    fields = ['id', 'sex',
               'photos', 'is_superuser', 'created', 'modified',
               'identifier', 'name', 'age',
               'major', 'city', 'state', 'description',
               'dorm_building', 'interests', 'has_account',
               'thumbnail', 'graduation_year', 
               'pause_profile', 'otp_verified']
-  
-  def get_token(self, profile):
-    """
-    Refresh the token everytime the user is called
-    """
-    token = RefreshToken.for_user(profile)
-    return str(token.access_token)
-
-  def get_refresh_token(self, profile):
-    token = RefreshToken.for_user(profile)
-    return str(token)  
+    list_serializer_class = PrefetchListSerializer
     
 
 class CreateProfileSerializer(serializers.Serializer):
@@ -2,10 +2,20 @@
 from rest_framework import serializers
 
 from roommatefinder.apps.api import models
-from roommatefinder.apps.api.serializers import photo_serializers, extra_serializers
+from roommatefinder.apps.api.serializers import photo_serializers
+from roommatefinder.apps.api.serializers.prefetch import PrefetchListSerializer, PrefetchPlanMixin
 
 
-class SwipeProfileSerializer(serializers.ModelSerializer):
+class SwipeProfileSerializer(PrefetchPlanMixin, serializers.ModelSerializer):
+  """
+  Serializer for a profile on the swipe deck, with its relationship to the viewer.
+
+  The relationship and the connection counts are read from the annotations of
+  `Profile.objects.annotate_relationship`. The swipe endpoints serve cached
+  cards instead, with the same fields added per viewer by `cards.add_relationships`.
+  """
+  prefetch_related = ("photo_set",)
+
   sex = serializers.CharField(
     source="get_sex_display", 
     required=True, 
@@ -13,8 +23,9 @@ class SwipeProfileSerializer(serializers.ModelSerializer):
   )
 
   photos = photo_serializers.PhotoSerializer(source="photo_set", many=True, read_only=True)
-  sent_connections = extra_serializers.ConnectionSerializer(many=True)
-  received_connections = extra_serializers.ConnectionSerializer(many=True)
+  relationship = serializers.CharField(read_only=True)
+  sent_connections_count = serializers.IntegerField(read_only=True)
+  received_connections_count = serializers.IntegerField(read_only=True)
 
   class Meta:
     model = models.Profile
@@ -33,6 +44,13 @@ class SwipeProfileSerializer(serializers.ModelSerializer):
       "thumbnail", 
       "graduation_year", 
       "photos",
-      "sent_connections", 
-      "received_connections"
-    ]
\ No newline at end of file
+      "relationship",
+      "sent_connections_count",
+      "received_connections_count"
+    ]
+    list_serializer_class = PrefetchListSerializer
+
+
+class CreateSwipeSerializer(serializers.Serializer):
+  id = serializers.UUIDField(required=True, allow_null=False)
+  direction = serializers.ChoiceField(choices=models.Swipe.DIRECTION_CHOICES, required=True, allow_null=False)
\ No newline at end of file
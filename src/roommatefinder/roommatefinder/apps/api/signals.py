@@ -4,13 +4,17 @@ import datetime
 
 from rest_framework import status
 from rest_framework.response import Response
+from django.conf import settings
 from django.core.mail import send_mail
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
 
 from . import models
+from .managers import DECK_FIELDS
+from .utils.cards import invalidate_cards
+from .utils.compatibility import quiz_index, encode_quiz
 
 VERBOSE = False
 
@@ -69,4 +73,112 @@ def send_otp(sender, instance, **kwargs):
       if VERBOSE:
         print('not full match')
 
-    return Response("Successfully generated OTP", status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response("Successfully generated OTP", status=status.HTTP_200_OK)
+
+
+# Ranking fields and the fields that decide if a profile is in the eligible pool
+DECK_TRACKED_FIELDS = (*DECK_FIELDS, "has_account", "is_active", "pause_profile")
+
+
+def _deck_values(values):
+  """ Normalize the ranking fields of a profile so they can be compared. """
+  values = dict(values)
+  values["interests"] = sorted(values["interests"] or [])
+  return values
+
+
+def _eligible(values):
+  """ Whether a profile with these values is in the eligible pool. """
+  return bool(values["has_account"] and values["is_active"] and not values["pause_profile"])
+
+
+@receiver(pre_save, sender=models.Profile)
+def stash_deck_fields(sender, instance, **kwargs):
+  """ Remember the ranking fields of a profile before it is saved. """
+  # Nested saves (send_otp saves again) keep the values of the outermost save
+  if settings.SWIPE_RANKING_MODE != "deck" or hasattr(instance, "_deck_fields"):
+    return
+  if instance._state.adding:
+    instance._deck_fields = None
+    return
+  # The values the profile was loaded or last saved with, queried only for profiles built by hand
+  loaded = getattr(instance, "_loaded_values", {})
+  if all(field in loaded for field in DECK_TRACKED_FIELDS):
+    previous = {field: loaded[field] for field in DECK_TRACKED_FIELDS}
+  else:
+    previous = models.Profile.objects.filter(id=instance.id).values(*DECK_TRACKED_FIELDS).first()
+  instance._deck_fields = previous and _deck_values(previous)
+
+
+@receiver(post_save, sender=models.Profile)
+def update_deck(sender, instance, **kwargs):
+  """ Update the swipe decks when a ranking field of a profile changes. """
+  values = {field: getattr(instance, field) for field in DECK_TRACKED_FIELDS}
+  # The next save of this instance compares against what was just saved
+  instance._loaded_values = {**getattr(instance, "_loaded_values", {}), **values}
+  if not hasattr(instance, "_deck_fields"):
+    return
+  previous = instance.__dict__.pop("_deck_fields")
+  current = _deck_values(values)
+  if previous == current:
+    return
+
+  if _eligible(current):
+    if previous and _eligible(previous):
+      # Same candidates, only the scores that changed are written
+      models.DeckEntry.objects.rescore_profile(instance, previous)
+    else:
+      models.DeckEntry.objects.rebuild_deck(instance)
+  elif previous and _eligible(previous):
+    models.DeckEntry.objects.remove_profile(instance)
+
+
+@receiver(post_save, sender=models.Connection)
+def remove_connection_from_decks(sender, instance, **kwargs):
+  """ Take connected profiles off each other's swipe decks. """
+  if settings.SWIPE_RANKING_MODE == "deck" and instance.accepted:
+    models.DeckEntry.objects.remove_pair(instance.sender_id, instance.receiver_id)
+
+
+@receiver(post_save, sender=models.RoommateQuiz)
+def index_quiz(sender, instance, **kwargs):
+  """ Keep the quiz compatibility index up to date, once it's loaded. """
+  if quiz_index.loaded:
+    quiz_index.upsert(instance.profile_id, encode_quiz(instance))
+
+
+@receiver(post_delete, sender=models.RoommateQuiz)
+def unindex_quiz(sender, instance, **kwargs):
+  """ Remove a deleted quiz from the compatibility index. """
+  quiz_index.remove(instance.profile_id)
+
+
+@receiver(post_save, sender=models.Profile)
+@receiver(post_delete, sender=models.Profile)
+def invalidate_profile_cards(sender, instance, **kwargs):
+  """ Drop the cached cards of a saved or deleted profile. """
+  invalidate_cards(instance.pk)
+
+
+@receiver(post_save, sender=models.Photo)
+@receiver(post_delete, sender=models.Photo)
+@receiver(post_save, sender=models.RoommateQuiz)
+@receiver(post_delete, sender=models.RoommateQuiz)
+def invalidate_related_cards(sender, instance, **kwargs):
+  """ Drop the cached cards of the profile a photo or quiz belongs to. """
+  invalidate_cards(instance.profile_id)
+
+
+@receiver(m2m_changed, sender=models.Profile.blocked_profiles.through)
+@receiver(m2m_changed, sender=models.Profile.groups.through)
+def invalidate_m2m_cards(sender, instance, action, reverse, pk_set, **kwargs):
+  """ Drop the cached cards of profiles whose blocked profiles or groups changed. """
+  if not reverse:
+    if action.startswith("post_"):
+      invalidate_cards(instance.pk)
+  elif action in ("post_add", "post_remove"):
+    invalidate_cards(*pk_set)
+  elif action == "pre_clear":
+    # Cleared from the other side, the profiles are only known before the clear
+    field = "groups" if sender is models.Profile.groups.through else "blocked_profiles"
+    invalidate_cards(*models.Profile.objects.filter(**{field: instance.pk}).values_list("id", flat=True))
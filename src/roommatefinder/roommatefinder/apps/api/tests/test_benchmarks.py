@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from roommatefinder.apps.api.utils import benchmarks
+
+
+class TestBenchmarks(TestCase):
+  """
+  Test case for the benchmark suite.
+  """
+  def test_run_suite(self):
+    """
+    Test that every benchmark runs and is measured.
+    """
+    results = benchmarks.run_suite(30, repeat=1)
+    self.assertIn("swipe_profiles", results)
+    self.assertIn("consumer.receive_message_list", results)
+    for measured in results.values():
+      self.assertGreater(measured["queries"] + measured["peak_memory"], 0)
+      self.assertGreater(measured["relative"], 0)
+
+  def test_find_regressions(self):
+    """
+    Test that query counts may not grow, memory may grow by its tolerance and times are opt-in and relative.
+    """
+    baseline = {"1000": {"rank": {"seconds": 1.0, "relative": 2.0, "queries": 2, "peak_memory": 100}}}
+    within = {1000: {"rank": {"seconds": 9.0, "relative": 2.8, "queries": 2, "peak_memory": 110}}}
+    self.assertEqual(benchmarks.find_regressions(within, baseline), [])
+    self.assertEqual(benchmarks.find_regressions(within, baseline, time_tolerance=0.5), [])
+    regressed = {1000: {"rank": {"seconds": 1.0, "relative": 4.0, "queries": 3, "peak_memory": 130}}}
+    self.assertEqual(len(benchmarks.find_regressions(regressed, baseline)), 2)
+    self.assertEqual(len(benchmarks.find_regressions(regressed, baseline, time_tolerance=0.5)), 3)
+    # Sizes missing from the baseline aren't compared
+    self.assertEqual(benchmarks.find_regressions({10: regressed[1000]}, baseline), [])
+
+  def test_missing_baseline(self):
+    """
+    Test that a missing baseline fails before seeding, unless the comparison is skipped.
+    """
+    with self.assertRaisesMessage(CommandError, "--no-baseline"):
+      call_command("run_benchmarks", baseline="/nonexistent/baseline.json", sizes=[10], stdout=StringIO())
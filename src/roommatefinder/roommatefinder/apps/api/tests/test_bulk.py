@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import csv
+import tempfile
+from pathlib import Path
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils import bulk, cards
+from roommatefinder.apps.api.utils.generate import generate_population
+from roommatefinder.apps.api.utils.model_utils import interests_to_mask
+
+
+class TestBulk(TestCase):
+  """
+  Test case for the bulk import and export of profiles, quizzes and connections.
+  """
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.directory = Path(directory.name)
+
+  def write_csv(self, name, rows):
+    path = self.directory / name
+    with open(path, "w", newline="") as file:
+      writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+      writer.writeheader()
+      writer.writerows(rows)
+    return path
+
+  def test_import_profiles(self):
+    """
+    Test that valid rows are imported in batches, invalid rows reported and existing identifiers skipped.
+    """
+    models.Profile.objects.create(identifier="taken@utah.edu", otp_verified=True)
+    mail.outbox.clear()
+    path = self.write_csv("cohort.csv", [
+      {"identifier": "a@utah.edu", "sex": "F", "age": "18", "interests": "1,4", "dorm_building": "3", "has_account": "true"},
+      {"identifier": "b@utah.edu", "sex": "X", "age": "18", "interests": "", "dorm_building": "", "has_account": ""},
+      {"identifier": "taken@utah.edu", "sex": "M", "age": "19", "interests": "", "dorm_building": "", "has_account": ""},
+      {"identifier": "c@utah.edu", "sex": "M", "age": "old", "interests": "", "dorm_building": "", "has_account": ""},
+      {"identifier": "a@utah.edu", "sex": "F", "age": "18", "interests": "", "dorm_building": "", "has_account": ""},
+      {"identifier": "d@utah.edu", "sex": "M", "age": "", "interests": "", "dorm_building": "", "has_account": ""},
+    ])
+    report = bulk.import_profiles(path, batch_size=2)
+    self.assertEqual((report["created"], report["skipped"], report["error_count"]), (2, 2, 2))
+    self.assertEqual([number for number, _ in report["errors"]], [2, 4])
+    self.assertIn("sex", report["errors"][0][1])
+
+    profile = models.Profile.objects.get(identifier="a@utah.edu")
+    self.assertEqual(profile.interests, ["1", "4"])
+    self.assertEqual(profile.interests_mask, interests_to_mask(["1", "4"]))
+    self.assertTrue(profile.has_account)
+    self.assertFalse(profile.has_usable_password())
+    self.assertFalse(models.Profile.objects.get(identifier="d@utah.edu").has_account)
+    self.assertEqual(len(mail.outbox), 0)
+
+  def test_round_trip(self):
+    """
+    Test that an export imports back into an empty database.
+    """
+    generate_population(40, seed=4, processes=1, chunk_size=20, connections=4, messages=0)
+    exported = bulk.export_data(self.directory, format="csv", chunk_size=15)
+    self.assertEqual(exported["profiles"]["rows"], 40)
+    self.assertTrue(exported["profiles"]["path"].endswith("profiles.csv.gz"))
+    before = {
+      "profiles": set(models.Profile.objects.values_list("identifier", "sex", "interests_mask", "dorm_building")),
+      "quizzes": set(models.RoommateQuiz.objects.values_list("profile__identifier", "bed_time", "hot_cold")),
+      "connections": set(
+        models.Connection.objects.values_list("sender__identifier", "receiver__identifier", "accepted")
+      ),
+    }
+
+    models.Profile.objects.all().delete()
+    for table in ("profiles", "quizzes", "connections"):
+      report = bulk.IMPORTS[table](exported[table]["path"], batch_size=15)
+      self.assertEqual(report["error_count"], 0, report["errors"])
+      self.assertEqual(report["created"], exported[table]["rows"])
+
+    self.assertEqual(before, {
+      "profiles": set(models.Profile.objects.values_list("identifier", "sex", "interests_mask", "dorm_building")),
+      "quizzes": set(models.RoommateQuiz.objects.values_list("profile__identifier", "bed_time", "hot_cold")),
+      "connections": set(
+        models.Connection.objects.values_list("sender__identifier", "receiver__identifier", "accepted")
+      ),
+    })
+
+  def test_import_again(self):
+    """
+    Test that importing the same quizzes and connections twice updates quizzes and skips known pairs.
+    """
+    for identifier in ("a", "b"):
+      models.Profile.objects.create(identifier=identifier, otp_verified=True)
+    quizzes = self.write_csv("quizzes.csv", [{"identifier": "a", "bed_time": "10-12", "hot_cold": "4"}])
+    connections = self.write_csv("connections.csv", [
+      {"sender": "a", "receiver": "b", "accepted": "true"},
+      {"sender": "b", "receiver": "a", "accepted": "false"},
+      {"sender": "a", "receiver": "a", "accepted": "false"},
+      {"sender": "a", "receiver": "missing", "accepted": "false"},
+    ])
+    bulk.import_quizzes(quizzes)
+    quizzes = self.write_csv("quizzes.csv", [{"identifier": "a", "bed_time": "After 2", "hot_cold": "30"}])
+    report = bulk.import_quizzes(quizzes)
+    self.assertEqual(report["error_count"], 1)
+    self.assertEqual(models.RoommateQuiz.objects.get(profile__identifier="a").bed_time, "10-12")
+
+    report = bulk.import_connections(connections)
+    self.assertEqual((report["created"], report["skipped"], report["error_count"]), (1, 2, 1))
+    self.assertEqual(bulk.import_connections(connections)["created"], 0)
+    self.assertTrue(models.Connection.objects.get().accepted)
+
+  @override_settings(SWIPE_RANKING_MODE="deck")
+  def test_refresh_imported(self):
+    """
+    Test that the decks and cards skipped by the import signals are refreshed afterwards.
+    """
+    viewer = models.Profile.objects.create(identifier="viewer", otp_verified=True, has_account=True)
+    models.Profile.objects.rank_profiles_deck(viewer)
+    profiles = self.write_csv("cohort.csv", [
+      {"identifier": "a", "sex": "F", "has_account": "true"},
+      {"identifier": "b", "sex": "M", "has_account": "true"},
+      {"identifier": "c", "sex": "M", "has_account": ""},
+    ])
+    report = bulk.import_profiles(profiles)
+    self.assertEqual(bulk.refresh_imported(report), {"cards": 3, "decks": 2, "pairs": 0})
+    self.assertEqual(sorted(p.identifier for p in models.Profile.objects.rank_profiles_deck(viewer)), ["a", "b"])
+    a = models.Profile.objects.get(identifier="a")
+    self.assertIsNotNone(a.deck_built)
+    self.assertEqual(sorted(p.identifier for p in models.Profile.objects.rank_profiles_deck(a)), ["b", "viewer"])
+
+    cards.get_cards("swipe", [a.id])
+    quizzes = self.write_csv("quizzes.csv", [{"identifier": "a", "bed_time": "10-12"}])
+    self.assertEqual(bulk.refresh_imported(bulk.import_quizzes(quizzes))["cards"], 1)
+    self.assertIsNone(cache.get(cards.card_key("swipe", a.id)))
+
+    connections = self.write_csv("connections.csv", [
+      {"sender": "a", "receiver": "viewer", "accepted": "true"},
+      {"sender": "b", "receiver": "viewer", "accepted": "false"},
+    ])
+    self.assertEqual(bulk.refresh_imported(bulk.import_connections(connections))["pairs"], 1)
+    self.assertEqual([p.identifier for p in models.Profile.objects.rank_profiles_deck(viewer)], ["b"])
+    self.assertEqual([p.identifier for p in models.Profile.objects.rank_profiles_deck(a)], ["b"])
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from roommatefinder.apps.api import models, views
+from roommatefinder.apps.api.serializers import extra_serializers, fast_serializers
+from roommatefinder.apps.api.utils import cards
+from roommatefinder.apps.api.utils.benchmarks import BenchmarkConsumer
+
+
+class TestCards(TestCase):
+  """
+  Test case for the cached profile cards and their invalidation.
+  """
+  def setUp(self):
+    cache.clear()
+    self.profile = models.Profile.objects.create(identifier="card", name="Card", otp_verified=True, has_account=True)
+    self.other = models.Profile.objects.create(identifier="other", name="Other", otp_verified=True, has_account=True)
+
+  def assertCached(self, kind, profile_id, cached=True):
+    self.assertEqual(cache.get(cards.card_key(kind, profile_id)) is not None, cached)
+
+  def test_cards_are_cached(self):
+    """
+    Test that a card is serialized once, then read from the cache without queries.
+    """
+    expected = fast_serializers.FastSwipeProfileSerializer().serialize_ids([self.profile.id])
+    self.assertEqual(cards.get_cards("swipe", [self.profile.id]), expected)
+    self.assertCached("swipe", self.profile.id)
+    with self.assertNumQueries(0):
+      self.assertEqual(cards.get_cards("swipe", [self.profile.id]), expected)
+
+  def test_order_and_missing(self):
+    """
+    Test that cards keep the order of the ids and skip missing profiles, cached or not.
+    """
+    cards.get_cards("user", [self.other.id])
+    missing = "00000000-0000-0000-0000-000000000000"
+    data = cards.get_cards("user", [self.other.id, missing, self.profile.id])
+    self.assertEqual([card["id"] for card in data], [str(self.other.id), str(self.profile.id)])
+    self.assertIsNone(cards.get_card("user", missing))
+
+  def test_invalidation(self):
+    """
+    Test that saving or deleting a profile, its photos, quiz or blocked profiles drops its cards.
+    """
+    photo = models.Photo.objects.create(profile=self.profile)
+    changes = [
+      self.profile.save,
+      lambda: models.Photo.objects.create(profile=self.profile),
+      photo.delete,
+      lambda: models.RoommateQuiz.objects.create(profile=self.profile),
+      lambda: self.profile.blocked_profiles.add(self.other),
+      lambda: self.other.blocked_by.remove(self.profile),
+    ]
+    for change in changes:
+      cards.get_cards("swipe", [self.profile.id])
+      cards.get_cards("user", [self.profile.id])
+      change()
+      self.assertCached("swipe", self.profile.id, cached=False)
+      self.assertCached("user", self.profile.id, cached=False)
+
+  def test_card_is_rendered_again(self):
+    """
+    Test that the card after a change is the new one.
+    """
+    self.assertEqual(cards.get_card("user", self.profile.id)["name"], "Card")
+    self.profile.name = "Renamed"
+    self.profile.save()
+    self.assertEqual(cards.get_card("user", self.profile.id)["name"], "Renamed")
+
+  def test_swipe_profile(self):
+    """
+    Test that the swipe profile view returns the cached card, with its relationship with the user.
+    """
+    models.Connection.objects.create(sender=self.other, receiver=self.profile, accepted=False)
+    view = views.profile_views.ProfileViewSet.as_view({"get": "swipe_profile"})
+    request = APIRequestFactory().get("/")
+    force_authenticate(request, user=self.other)
+    response = view(request, pk=str(self.profile.id))
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data, {
+      **cards.get_card("swipe", self.profile.id),
+      "relationship": "pending-them",
+      "sent_connections_count": 0,
+      "received_connections_count": 1,
+    })
+    self.assertEqual(view(request, pk="not-an-id").status_code, 404)
+    self.assertEqual(view(request, pk="00000000-0000-0000-0000-000000000000").status_code, 404)
+
+  def test_relationships_are_per_viewer(self):
+    """
+    Test that the shared cards get each viewer's relationship with one query.
+    """
+    models.Connection.objects.create(sender=self.other, receiver=self.profile, accepted=True)
+    third = models.Profile.objects.create(identifier="third", otp_verified=True, has_account=True)
+    ids = [self.profile.id, self.other.id]
+    profile_cards = cards.get_cards("swipe", ids)
+    with self.assertNumQueries(1):
+      data = cards.add_relationships(profile_cards, third)
+    self.assertEqual([card["relationship"] for card in data], ["no-connection", "no-connection"])
+    data = cards.add_relationships(profile_cards, self.profile)
+    self.assertEqual(
+      [(card["relationship"], card["sent_connections_count"], card["received_connections_count"]) for card in data],
+      [("no-connection", 0, 1), ("connected", 1, 0)]
+    )
+    self.assertNotIn("relationship", cards.get_card("swipe", self.other.id))
+
+  def test_search(self):
+    """
+    Test that search results are the cached cards with the searcher's connection status.
+    """
+    models.Connection.objects.create(sender=self.other, receiver=self.profile, accepted=False)
+    consumer = BenchmarkConsumer(self.profile)
+    consumer.receive_search({"query": "oth"})
+    results = json.loads(consumer.sent[0])["data"]
+    expected = {**extra_serializers.UserSerializer(self.other).data, "status": "pending-me"}
+    self.assertEqual(results, [expected])
@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
-from django.test import TestCase
+import json
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from channels.db import database_sync_to_async
 from channels.testing import WebsocketCommunicator
 from roommatefinder.apps.api import models
 from roommatefinder.apps.api import consumers
+from roommatefinder.apps.api.utils import cards, metrics
+from roommatefinder.apps.api.utils.benchmarks import BenchmarkConsumer
 
 
-class TestAPIConsumer(TestCase):
+class TestAPIConsumer(TransactionTestCase):
   """
   Test case for the WebSocket API consumer.
 
-  This test class uses Django's TestCase to test the WebSocket consumer's functionality. 
+  This test class uses Django's TransactionTestCase to test the WebSocket consumer's functionality. 
+  Channels closes the database connections around each handler, which ends the transaction a TestCase holds.
   """
   def setUp(self):
     self.user = models.Profile.objects.create(identifier="sender", otp_verified=True)
@@ -34,4 +42,225 @@ class TestAPIConsumer(TestCase):
     communicator.scope['user'] = self.user
     # Send a connect request and check the response
     connected, _ = await communicator.connect()
-    self.assertTrue(connected)
\ No newline at end of file
+    self.assertTrue(connected)
+
+  async def connect(self, user):
+    communicator = WebsocketCommunicator(consumers.APIConsumer.as_asgi(), 'chat/')
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    self.assertTrue(connected)
+    return communicator
+
+  async def test_message_type(self):
+    """
+    Tests that typing notifications reach the recipient's socket at most once per interval, then expire.
+    """
+    recipient = await models.Profile.objects.acreate(identifier="recipient", otp_verified=True)
+    metrics.counters.reset()
+    with self.settings(TYPING_INTERVAL_SECONDS=60, TYPING_EXPIRY_SECONDS=0.2):
+      sender = await self.connect(self.user)
+      receiver = await self.connect(recipient)
+      for _ in range(5):
+        await sender.send_json_to({'source': 'message.type', 'id': str(recipient.id)})
+      self.assertEqual(
+        await receiver.receive_json_from(), {'source': 'message.type', 'data': {'id': str(recipient.id)}}
+      )
+      self.assertEqual(
+        await receiver.receive_json_from(timeout=2), {'source': 'message.type.stop', 'data': {'id': str(recipient.id)}}
+      )
+      self.assertTrue(await receiver.receive_nothing())
+      self.assertTrue(await sender.receive_nothing())
+      await sender.disconnect()
+      await receiver.disconnect()
+    self.assertEqual(metrics.counters.snapshot()['counters'], {
+      'send.group': 2, 'typing.expired': 1, 'typing.received': 5, 'typing.sent': 1, 'typing.suppressed': 4,
+    })
+
+  async def test_typing_sockets(self):
+    """
+    Tests that the typing throttle is shared by the sender's sockets, through the cache.
+    """
+    recipient = await models.Profile.objects.acreate(identifier="recipient", otp_verified=True)
+    metrics.counters.reset()
+    with self.settings(TYPING_INTERVAL_SECONDS=60):
+      senders = [await self.connect(self.user), await self.connect(self.user)]
+      receiver = await self.connect(recipient)
+      for sender in senders:
+        await sender.send_json_to({'source': 'message.type', 'id': str(recipient.id)})
+      self.assertEqual((await receiver.receive_json_from())['source'], 'message.type')
+      self.assertTrue(await receiver.receive_nothing())
+      self.assertEqual(metrics.counters.get('typing.sent'), 1)
+      self.assertEqual(metrics.counters.get('typing.suppressed'), 1)
+      # Stopping clears the throttle, typing again is forwarded right away
+      for sender in senders:
+        await sender.disconnect()
+        self.assertEqual((await receiver.receive_json_from())['source'], 'message.type.stop')
+      sender = await self.connect(self.user)
+      await sender.send_json_to({'source': 'message.type', 'id': str(recipient.id)})
+      self.assertEqual((await receiver.receive_json_from())['source'], 'message.type')
+      await sender.disconnect()
+      await receiver.disconnect()
+
+  async def test_typing_disconnect(self):
+    """
+    Tests that disconnecting while typing tells the recipient the user stopped.
+    """
+    recipient = await models.Profile.objects.acreate(identifier="recipient", otp_verified=True)
+    sender = await self.connect(self.user)
+    receiver = await self.connect(recipient)
+    await sender.send_json_to({'source': 'message.type', 'id': str(recipient.id)})
+    self.assertEqual((await receiver.receive_json_from())['source'], 'message.type')
+    await sender.disconnect()
+    self.assertEqual((await receiver.receive_json_from())['source'], 'message.type.stop')
+    await receiver.disconnect()
+
+  async def test_send_self(self):
+    """
+    Tests that responses go to the requesting socket only, without the channel layer.
+    """
+    other = await self.connect(self.user)
+    communicator = await self.connect(self.user)
+    metrics.counters.reset()
+    # Run the handler in the test's thread, which sees the test's transaction
+    with mock.patch.object(consumers, 'database_sync_to_async', lambda handler, **kwargs: database_sync_to_async(handler)):
+      await communicator.send_json_to({'source': 'friend.list'})
+      self.assertEqual(await communicator.receive_json_from(), {'source': 'friend.list', 'data': []})
+    self.assertTrue(await other.receive_nothing())
+    self.assertEqual(metrics.counters.get('send.local'), 1)
+    self.assertEqual(metrics.counters.get('send.group'), 0)
+    await communicator.disconnect()
+    await other.disconnect()
+
+  async def test_invalid_messages(self):
+    """
+    Tests that invalid JSON and unknown sources are answered with an error.
+    """
+    communicator = await self.connect(self.user)
+    await communicator.send_to(text_data='not json')
+    self.assertEqual(await communicator.receive_json_from(), {'error': 'Invalid JSON data'})
+    await communicator.send_json_to({'source': 'nothing'})
+    self.assertEqual(await communicator.receive_json_from(), {'error': 'Unknown source'})
+    await communicator.disconnect()
+
+
+class TestMessageList(TestCase):
+  """
+  Test case for the keyset pagination of `message.list`.
+  """
+  def setUp(self):
+    self.user = models.Profile.objects.create(identifier="reader", otp_verified=True, has_account=True)
+    self.friend = models.Profile.objects.create(identifier="friend", otp_verified=True, has_account=True)
+    self.connection = models.Connection.objects.create(sender=self.user, receiver=self.friend, accepted=True)
+    models.Message.objects.bulk_create([
+      models.Message(connection=self.connection, user=self.user if i % 2 else self.friend, text=f"message {i}")
+      for i in range(40)
+    ])
+    # Messages sent in the same instant are ordered on their id
+    same = models.Message.objects.order_by("id").values_list("id", flat=True)[10:20]
+    models.Message.objects.filter(id__in=list(same)).update(created=timezone.now())
+
+  def list_messages(self, **data):
+    consumer = BenchmarkConsumer(self.user)
+    consumer.receive_message_list({"connectionId": self.connection.id, **data})
+    return consumer
+
+  def test_pages(self):
+    """
+    Test that following the cursors reads every message once, newest first, with the same queries per page.
+    """
+    expected = list(models.Message.objects.order_by("-created", "-id").values_list("id", flat=True))
+    # The friend's card is cached, a page is the connection and one range of messages
+    cards.get_card("user", self.friend.id)
+    seen, cursor, pages = [], None, 0
+    while True:
+      with self.assertNumQueries(2):
+        consumer = self.list_messages(cursor=cursor)
+      response = json.loads(consumer.sent[0])
+      self.assertEqual(response["source"], "message.list")
+      self.assertEqual(response["data"]["friend"]["id"], str(self.friend.id))
+      seen += [message["id"] for message in response["data"]["messages"]]
+      pages += 1
+      cursor = response["data"]["next"]
+      if cursor is None:
+        break
+    self.assertEqual(seen, expected)
+    self.assertEqual(pages, 3)
+
+  def test_page_key(self):
+    """
+    Test that older clients sending the cursor as `page`, or a page number, are paginated too.
+    """
+    first = json.loads(self.list_messages(page=0).sent[0])["data"]
+    self.assertEqual(len(first["messages"]), 15)
+    second = json.loads(self.list_messages(page=first["next"]).sent[0])["data"]
+    self.assertEqual(second["messages"], json.loads(self.list_messages(cursor=first["next"]).sent[0])["data"]["messages"])
+    self.assertLess(second["messages"][0]["id"], first["messages"][-1]["id"])
+
+  def test_invalid_cursor(self):
+    """
+    Test that an invalid cursor is answered with an error to the requesting socket only.
+    """
+    consumer = self.list_messages(cursor="not-a-cursor")
+    self.assertEqual(consumer.sent, [])
+    self.assertEqual(consumer._outbox, [(None, None, {"error": "Invalid cursor."})])
+
+
+class TestConversationSummary(TestCase):
+  """
+  Test case for the conversation summary kept on connections for `friend.list`.
+  """
+  def setUp(self):
+    self.user = models.Profile.objects.create(identifier="user", otp_verified=True, has_account=True)
+    self.friends = [
+      models.Profile.objects.create(identifier=f"friend-{i}", otp_verified=True, has_account=True) for i in range(3)
+    ]
+    self.connections = [
+      models.Connection.objects.create(sender=self.user, receiver=self.friends[0], accepted=True),
+      models.Connection.objects.create(sender=self.friends[1], receiver=self.user, accepted=True),
+      models.Connection.objects.create(sender=self.friends[2], receiver=self.user, accepted=True),
+    ]
+
+  def send(self, user, connection, text):
+    BenchmarkConsumer(user).receive_message_send({"connectionId": connection.id, "message": text})
+
+  def friend_list(self):
+    consumer = BenchmarkConsumer(self.user)
+    consumer.receive_friend_list({})
+    return json.loads(consumer.sent[0])["data"]
+
+  def test_summary(self):
+    """
+    Test that sending messages updates the preview, time and unread count of the other side.
+    """
+    self.send(self.user, self.connections[0], "hi " * 50)
+    self.send(self.friends[0], self.connections[0], "hello")
+    self.send(self.friends[0], self.connections[0], "there")
+    connection = models.Connection.objects.get(id=self.connections[0].id)
+    latest = connection.messages.latest("created")
+    self.assertEqual((connection.latest_text, connection.latest_created), ("there", latest.created))
+    self.assertEqual((connection.sender_unread, connection.receiver_unread), (2, 1))
+
+    self.send(self.user, self.connections[1], "x" * 500)
+    self.assertEqual(len(models.Connection.objects.get(id=self.connections[1].id).latest_text), 100)
+
+  def test_friend_list(self):
+    """
+    Test that the friend list is one query, the latest conversation first and new connections last.
+    """
+    self.send(self.friends[1], self.connections[1], "first")
+    self.send(self.friends[0], self.connections[0], "second")
+    with self.assertNumQueries(1):
+      friends = self.friend_list()
+    self.assertEqual([friend["friend"]["id"] for friend in friends], [str(profile.id) for profile in self.friends])
+    self.assertEqual([friend["preview"] for friend in friends], ["second", "first", "New connection"])
+    self.assertEqual([friend["unread"] for friend in friends], [1, 1, 0])
+
+  def test_read(self):
+    """
+    Test that listing the messages of a conversation clears the reader's unread count only.
+    """
+    self.send(self.friends[0], self.connections[0], "hello")
+    self.send(self.user, self.connections[0], "hi")
+    BenchmarkConsumer(self.user).receive_message_list({"connectionId": self.connections[0].id})
+    connection = models.Connection.objects.get(id=self.connections[0].id)
+    self.assertEqual((connection.sender_unread, connection.receiver_unread), (0, 1))
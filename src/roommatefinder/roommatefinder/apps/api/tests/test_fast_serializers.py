@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+import uuid
+
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.serializers import extra_serializers, fast_serializers, profile_serializers
+
+
+class TestFastSerializers(TestCase):
+  """
+  Test case for the fast read-only serializers.
+
+  Their JSON should be the JSON of the DRF serializers they reproduce. The
+  DRF serializers read related rows in no particular order, so lists are
+  compared as multisets, the order of the fast serializers is checked apart.
+  """
+  def setUp(self):
+    self.profiles = []
+    for i in range(3):
+      profile = models.Profile.objects.create(
+        identifier=f"fast-{i}", name=f"Fast {i}", otp_verified=True, has_account=True,
+        interests=["hiking", "music"] if i else [], thumbnail="thumbnails/fast.jpg" if i == 1 else None,
+      )
+      self.profiles.append(profile)
+    models.Photo.objects.create(profile=self.profiles[0], image="photos/a.jpg")
+    models.Photo.objects.create(profile=self.profiles[0], image="photos/b.jpg")
+    models.RoommateQuiz.objects.create(profile=self.profiles[1])
+    # One at a time, `add` inserts the rows of one call in no particular order
+    self.profiles[2].blocked_profiles.add(self.profiles[1])
+    self.profiles[2].blocked_profiles.add(self.profiles[0])
+    self.ids = [profile.id for profile in self.profiles]
+
+  def canonical(self, rows):
+    """ Sort the lists in each row, they come in the order of the database. """
+    return [
+      {name: sorted(value, key=json.dumps) if isinstance(value, list) else value for name, value in row.items()}
+      for row in rows
+    ]
+
+  def assertSameJSON(self, fast_serializer, serializer_class, ids, **kwargs):
+    profiles = sorted(models.Profile.objects.filter(id__in=ids), key=lambda profile: ids.index(profile.id))
+    expected = json.loads(JSONRenderer().render(serializer_class(profiles, many=True, **kwargs).data))
+    data = fast_serializers.loads(fast_serializers.dumps(fast_serializer.serialize_ids(ids)))
+    self.assertEqual(self.canonical(data), self.canonical(expected))
+
+  def test_profile_serializers(self):
+    """
+    Test that the profile cards, details and profiles match the DRF serializers.
+    """
+    for fast_class, serializer_class in (
+      (fast_serializers.FastBaseProfileSerializer, profile_serializers.BaseProfileSerializer),
+      (fast_serializers.FastSwipeProfileSerializer, profile_serializers.SwipeProfileSerializer),
+      (fast_serializers.FastProfileSerializer, profile_serializers.ProfileSerializer),
+    ):
+      with self.subTest(serializer=serializer_class.__name__):
+        self.assertSameJSON(fast_class(), serializer_class, self.ids)
+        self.assertSameJSON(fast_class(), serializer_class, self.ids[::-1])
+
+  def test_absolute_urls(self):
+    """
+    Test that files are absolute urls with a request, like with the DRF serializers.
+    """
+    request = APIRequestFactory().get("/")
+    self.assertSameJSON(
+      fast_serializers.FastSwipeProfileSerializer(request=request),
+      profile_serializers.SwipeProfileSerializer,
+      self.ids,
+      context={"request": request},
+    )
+
+  def test_related_order(self):
+    """
+    Test that related rows come by primary key and many-to-many ids in the order they were added.
+    """
+    serializer = fast_serializers.FastBaseProfileSerializer()
+    photos = [str(id) for id in models.Photo.objects.order_by("pk").values_list("id", flat=True)]
+    for _ in range(3):
+      first, _, last = fast_serializers.loads(fast_serializers.dumps(serializer.serialize_ids(self.ids)))
+      self.assertEqual([photo["id"] for photo in first["photos"]], photos)
+      self.assertEqual(last["blocked_profiles"], [str(self.ids[1]), str(self.ids[0])])
+
+  def test_missing_ids(self):
+    """
+    Test that missing ids are skipped and the order of the ids is kept.
+    """
+    data = fast_serializers.FastProfileSerializer().serialize_ids([self.ids[2], uuid.uuid4(), str(self.ids[0])])
+    self.assertEqual([row["id"] for row in data], [str(self.ids[2]), str(self.ids[0])])
+    self.assertEqual(fast_serializers.FastProfileSerializer().serialize_ids([]), [])
+
+  def test_constant_queries(self):
+    """
+    Test that serializing profiles takes one query plus one per related field, for any number of profiles.
+    """
+    with self.assertNumQueries(5):
+      fast_serializers.FastSwipeProfileSerializer().serialize_ids(self.ids)
+    with self.assertNumQueries(5):
+      fast_serializers.FastSwipeProfileSerializer().serialize_ids(self.ids[:1])
+
+  def test_messages(self):
+    """
+    Test that messages match the DRF serializer for the user reading them.
+    """
+    connection = models.Connection.objects.create(sender=self.profiles[0], receiver=self.profiles[1], accepted=True)
+    for i in range(4):
+      models.Message.objects.create(connection=connection, user=self.profiles[i % 2], text=f"message {i} ✓")
+    messages = models.Message.objects.order_by("-created")
+    context = {"user": self.profiles[0]}
+    expected = JSONRenderer().render(extra_serializers.MessageSerializer(messages, many=True, context=context).data)
+    data = fast_serializers.FastMessageSerializer(context=context).serialize_queryset(messages)
+    self.assertEqual(fast_serializers.dumps(data), expected)
+    self.assertEqual(sum(row["is_me"] for row in data), 2)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from django.core import mail
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.internal import internal_profiles
+from roommatefinder.apps.api.utils.generate import generate_population, generate_profiles
+from roommatefinder.apps.api.utils.model_utils import interests_to_mask
+
+
+class TestGenerate(TestCase):
+  """
+  Test case for the generated benchmark population.
+  """
+  def test_generate_profiles(self):
+    """
+    Test that generated profiles are swipeable, with consistent masks and most with a quiz.
+    """
+    ids = generate_profiles(50, seed=1, batch_size=20)
+    self.assertEqual(len(ids), 50)
+    profiles = models.Profile.objects.filter(id__in=ids)
+    self.assertEqual(profiles.filter(has_account=True).count(), 50)
+    for profile in profiles:
+      self.assertLessEqual(len(profile.interests), 5)
+      self.assertEqual(profile.interests_mask, interests_to_mask(profile.interests))
+    self.assertGreater(models.RoommateQuiz.objects.filter(profile__in=ids).count(), 25)
+
+  def test_generate_population(self):
+    """
+    Test that a population gets photos, connections between distinct pairs and conversations.
+    """
+    result = generate_population(60, seed=2, processes=1, chunk_size=25, connections=4, messages=5, batch_size=20)
+    self.assertEqual(models.Profile.objects.count(), 60)
+    self.assertGreater(models.Photo.objects.count(), 60)
+    self.assertEqual(models.Connection.objects.count(), result["connections"])
+    self.assertEqual(models.Message.objects.count(), result["messages"])
+    self.assertGreater(result["messages"], 0)
+
+    pairs = set()
+    for sender, receiver in models.Connection.objects.values_list("sender", "receiver"):
+      self.assertNotEqual(sender, receiver)
+      self.assertNotIn(frozenset((sender, receiver)), pairs)
+      pairs.add(frozenset((sender, receiver)))
+    for message in models.Message.objects.select_related("connection"):
+      self.assertTrue(message.connection.accepted)
+      self.assertIn(message.user_id, (message.connection.sender_id, message.connection.receiver_id))
+    for connection in models.Connection.objects.filter(messages__isnull=False).distinct():
+      latest = connection.messages.order_by("-created", "-id").first()
+      self.assertEqual((connection.latest_text, connection.latest_created), (latest.text, latest.created))
+
+  def test_generate_population_seed(self):
+    """
+    Test that the same seed gives the same population.
+    """
+    first = generate_population(30, seed=3, processes=1, chunk_size=10)
+    names = list(models.Profile.objects.filter(id__in=first["profiles"]).order_by("identifier").values_list("name", flat=True))
+    models.Profile.objects.all().delete()
+    second = generate_population(30, seed=3, processes=1, chunk_size=10)
+    self.assertEqual(
+      names,
+      list(models.Profile.objects.filter(id__in=second["profiles"]).order_by("identifier").values_list("name", flat=True))
+    )
+    self.assertEqual((first["connections"], first["messages"]), (second["connections"], second["messages"]))
+
+  def test_fake_endpoint(self):
+    """
+    Test that the internal endpoint generates profiles without sending otp emails.
+    """
+    admin = models.Profile.objects.create(identifier="admin", is_staff=True, otp_verified=True)
+    request = APIRequestFactory().post("/", {"count": 7, "seed": 1}, format="json")
+    force_authenticate(request, user=admin)
+    response = internal_profiles.fake_create_profiles(request)
+    self.assertEqual(response.status_code, 201)
+    self.assertEqual(response.data["profiles"], 7)
+    self.assertEqual(models.Profile.objects.count(), 8)
+    self.assertEqual(len(mail.outbox), 0)
@@ -1,6 +1,9 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from rest_framework.test import APIRequestFactory, force_authenticate
 from roommatefinder.apps.api import models, views
+from roommatefinder.apps.api.utils import compatibility
 
 
 class TestMatchingViews(TestCase):
@@ -76,4 +79,88 @@ class TestMatchingViews(TestCase):
     view = views.matching_views.RoommateQuizViewSet.as_view({'post': 'create'})
     force_authenticate(request, user=self.superuser)
     response = view(request)
-    self.assertEqual(response.status_code, 400)
\ No newline at end of file
+    self.assertEqual(response.status_code, 400)
+
+
+class TestCompatibleProfiles(TestCase):
+  """ Test the quiz compatibility index and its endpoint """
+  def setUp(self):
+    self.factory = APIRequestFactory()
+    self.view = views.matching_views.RoommateQuizViewSet.as_view({'get': 'compatible_profiles'})
+    compatibility.quiz_index.reset()
+    self.user = self.create_profile("user", 10, 10, 10, "often")
+    self.close = self.create_profile("close", 11, 10, 10, "often")
+    self.far = self.create_profile("far", 0, 20, 0, "never")
+    self.no_account = self.create_profile("no-account", 10, 10, 10, "often", has_account=False)
+
+  def create_profile(self, identifier, social_battery, noise_level, hot_cold, guest_policy, has_account=True):
+    profile = models.Profile.objects.create(identifier=identifier, otp_verified=True, has_account=has_account)
+    models.RoommateQuiz.objects.create(
+      profile=profile,
+      social_battery=social_battery,
+      noise_level=noise_level,
+      hot_cold=hot_cold,
+      guest_policy=guest_policy
+    )
+    return profile
+
+  def get(self, user, params=None):
+    request = self.factory.get("/", params or {})
+    force_authenticate(request, user=user)
+    return self.view(request)
+
+  def test_most_compatible_first(self):
+    response = self.get(self.user)
+    self.assertEqual(response.status_code, 200)
+    identifiers = [profile["identifier"] for profile in response.data["results"]]
+    self.assertEqual(identifiers, ["close", "far"])
+    self.assertGreater(response.data["results"][0]["compatibility"], response.data["results"][1]["compatibility"])
+
+  def test_index_follows_quiz_updates(self):
+    self.get(self.user)
+    quiz = models.RoommateQuiz.objects.get(profile=self.far)
+    quiz.social_battery, quiz.noise_level, quiz.hot_cold, quiz.guest_policy = 10, 10, 10, "often"
+    quiz.save()
+    response = self.get(self.user, {"k": 1})
+    self.assertEqual([profile["identifier"] for profile in response.data["results"]], ["far"])
+    self.assertEqual(response.data["results"][0]["compatibility"], 1.0)
+
+  def test_index_follows_quiz_deletes(self):
+    self.get(self.user)
+    models.RoommateQuiz.objects.get(profile=self.close).delete()
+    self.assertNotIn(str(self.close.id), compatibility.quiz_index.positions)
+    response = self.get(self.user)
+    self.assertEqual([profile["identifier"] for profile in response.data["results"]], ["far"])
+
+  def test_index_drops_quizzes_deleted_elsewhere(self):
+    self.get(self.user)
+    # Deleted by another process, the signal of this one never fires
+    with mock.patch.object(compatibility.quiz_index, "remove"):
+      models.RoommateQuiz.objects.get(profile=self.close).delete()
+    self.assertIn(str(self.close.id), compatibility.quiz_index.positions)
+    with override_settings(QUIZ_INDEX_SYNC_SECONDS=0, QUIZ_INDEX_RECONCILE_SECONDS=0):
+      response = self.get(self.user)
+    self.assertNotIn(str(self.close.id), compatibility.quiz_index.positions)
+    self.assertEqual([profile["identifier"] for profile in response.data["results"]], ["far"])
+
+  def test_answers_compare_exactly(self):
+    answers = [f"answer {i}" for i in range(64)]
+    codes = {compatibility.answer_code(answer) for answer in answers}
+    self.assertEqual(len(codes), len(answers))
+    self.assertEqual(compatibility.answer_code(" Often "), compatibility.answer_code("often"))
+    self.assertEqual(compatibility.answer_code(""), compatibility.UNANSWERED)
+
+    index = compatibility.QuizIndex()
+    quiz = {"social_battery": 10, "noise_level": 10, "hot_cold": 10, "guest_policy": "often"}
+    index.upsert("same", compatibility.encode_quiz(quiz))
+    index.upsert("different", compatibility.encode_quiz({**quiz, "guest_policy": "never"}))
+    index.upsert("unanswered", compatibility.encode_quiz({**quiz, "guest_policy": ""}))
+    self.assertEqual(
+      index.nearest(compatibility.encode_quiz(quiz), 3),
+      [("same", 0.0), ("unanswered", 1.0), ("different", 2.0)]
+    )
+
+  def test_without_quiz(self):
+    profile = models.Profile.objects.create(identifier="no-quiz", otp_verified=True)
+    response = self.get(profile)
+    self.assertEqual(response.status_code, 400)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase, override_settings
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils import messages, metrics
+from roommatefinder.apps.api.utils.benchmarks import BenchmarkConsumer
+
+
+@override_settings(MESSAGE_WRITE_BEHIND=True, MESSAGE_BUFFER_SIZE=3, MESSAGE_BUFFER_SECONDS=60, MESSAGE_ID_BLOCK=2)
+class TestWriteBehind(TestCase):
+  """
+  Test case for the write-behind persistence of chat messages.
+  """
+  def setUp(self):
+    self.user = models.Profile.objects.create(identifier="user", otp_verified=True, has_account=True)
+    self.friend = models.Profile.objects.create(identifier="friend", otp_verified=True, has_account=True)
+    self.connection = models.Connection.objects.create(sender=self.user, receiver=self.friend, accepted=True)
+    models.Message.objects.create(connection=self.connection, user=self.user, text="before")
+    self.addCleanup(messages.message_buffer.flush)
+
+  def send(self, user, text):
+    consumer = BenchmarkConsumer(user)
+    consumer.receive_message_send({"connectionId": self.connection.id, "message": text})
+    return json.loads(consumer.sent[0])["data"]["message"]
+
+  def test_delivered_before_written(self):
+    """
+    Test that messages are delivered with their id and time, then written with them in one batch.
+    """
+    sent = [self.send(self.user, "one"), self.send(self.friend, "two")]
+    self.assertEqual(models.Message.objects.count(), 1)
+    self.assertEqual(len(messages.message_buffer), 2)
+
+    sent.append(self.send(self.user, "three"))
+    self.assertEqual(len(messages.message_buffer), 0)
+    written = models.Message.objects.filter(text__in=["one", "two", "three"]).order_by("created", "id")
+    self.assertEqual(
+      [(message["id"], message["text"], message["created"]) for message in sent],
+      [(message.id, message.text, message.created.isoformat().replace("+00:00", "Z")) for message in written],
+    )
+    self.assertEqual(len({message["id"] for message in sent}), 3)
+
+    connection = models.Connection.objects.get(id=self.connection.id)
+    self.assertEqual(connection.latest_text, "three")
+    self.assertEqual((connection.sender_unread, connection.receiver_unread), (1, 2))
+
+  def test_history_reads_pending(self):
+    """
+    Test that listing a conversation writes its buffered messages first.
+    """
+    self.send(self.user, "one")
+    consumer = BenchmarkConsumer(self.friend)
+    consumer.receive_message_list({"connectionId": self.connection.id})
+    listed = json.loads(consumer.sent[0])["data"]["messages"]
+    self.assertEqual([message["text"] for message in listed], ["one", "before"])
+    self.assertEqual(len(messages.message_buffer), 0)
+
+  def test_failed_flush(self):
+    """
+    Test that a batch the database can't take is kept, ahead of newer messages.
+    """
+    self.send(self.user, "one")
+    with mock.patch.object(models.Message.objects, "bulk_create", side_effect=OperationalError), \
+        self.assertLogs("roommatefinder.apps.api.utils.messages", level="WARNING"):
+      self.assertEqual(messages.message_buffer.flush(), 0)
+    self.send(self.user, "two")
+    self.assertEqual([message.text for message in messages.message_buffer._pending], ["one", "two"])
+    self.assertEqual(messages.message_buffer.flush(), 2)
+    self.assertEqual(models.Message.objects.count(), 3)
+
+  def test_bad_rows_are_held_back(self):
+    """
+    Test that a failed batch is split so the other messages are written, and a bad message is dropped after its attempts.
+    """
+    bulk_create = models.Message.objects.bulk_create
+    dropped = metrics.counters.get("messages.dropped")
+
+    def fail_on_bad(batch, **kwargs):
+      if any(message.text == "bad" for message in batch):
+        raise IntegrityError("bad row")
+      return bulk_create(batch, **kwargs)
+
+    with mock.patch.object(models.Message.objects, "bulk_create", side_effect=fail_on_bad), \
+        self.assertLogs("roommatefinder.apps.api.utils.messages", level="ERROR") as logs:
+      self.send(self.user, "one")
+      self.send(self.user, "bad")
+      self.send(self.friend, "three")
+      self.assertEqual(
+        list(models.Message.objects.order_by("created", "id").values_list("text", flat=True)), ["before", "one", "three"]
+      )
+      self.assertEqual([message.text for message in messages.message_buffer._pending], ["bad"])
+      for _ in range(settings.MESSAGE_FLUSH_ATTEMPTS - 1):
+        self.assertEqual(messages.message_buffer.flush(), 0)
+    self.assertEqual(len(messages.message_buffer), 0)
+    self.assertIn("'bad'", logs.output[0])
+    self.assertEqual(metrics.counters.get("messages.dropped"), dropped + 1)
+    self.assertEqual(models.Connection.objects.get(id=self.connection.id).latest_text, "three")
+
+  def test_late_write_keeps_the_latest_preview(self):
+    """
+    Test that a message written after a newer one doesn't replace the conversation's preview.
+    """
+    first = messages.message_buffer.add(self.connection, self.user, "first")
+    messages.message_buffer._pending.clear()
+    self.send(self.user, "second")
+    messages.message_buffer.flush()
+    messages.message_buffer._pending.append(first)
+    messages.message_buffer.flush()
+    connection = models.Connection.objects.get(id=self.connection.id)
+    self.assertEqual((connection.latest_text, connection.receiver_unread), ("second", 2))
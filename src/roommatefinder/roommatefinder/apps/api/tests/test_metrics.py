@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import os
+
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.internal import internal_metrics
+from roommatefinder.apps.api.utils import metrics
+
+
+class TestMetrics(TestCase):
+  """
+  Test case for the process counters and their internal endpoint.
+  """
+  def setUp(self):
+    metrics.counters.reset()
+
+  def get(self, user):
+    request = APIRequestFactory().get("/")
+    force_authenticate(request, user=user)
+    return internal_metrics.get_metrics(request)
+
+  def test_metrics(self):
+    """
+    Test that admins get the counters of the process, and other profiles are refused.
+    """
+    metrics.incr("typing.sent")
+    metrics.incr("typing.suppressed", 3)
+    admin = models.Profile.objects.create(identifier="admin", is_staff=True, is_superuser=True, otp_verified=True)
+    response = self.get(admin)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data, {"pid": os.getpid(), "counters": {"typing.sent": 1, "typing.suppressed": 3}})
+    profile = models.Profile.objects.create(identifier="profile", otp_verified=True)
+    self.assertEqual(self.get(profile).status_code, 403)
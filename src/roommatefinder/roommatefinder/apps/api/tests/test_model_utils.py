@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from rest_framework.test import APITestCase
 from rest_framework.exceptions import ValidationError
-from roommatefinder.apps.api.utils.model_utils import ChoicesField
+from roommatefinder.apps.api.utils.model_utils import ChoicesField, interests_to_mask, mask_to_interests
 from model_utils import Choices
 
 
@@ -40,4 +40,18 @@ class TestChoicesField(APITestCase):
     data = {'status': 'Invalid Choice'}
     serializer = self.serializer_class(data=data)
     with self.assertRaises(ValidationError):
-      serializer.is_valid(raise_exception=True)
\ No newline at end of file
+      serializer.is_valid(raise_exception=True)
+
+
+class TestInterestsMask(APITestCase):
+  def test_round_trip(self):
+    # Test packing interests into a mask and back
+    mask = interests_to_mask(["3", "1", "50"])
+    self.assertEqual(mask, 0b101 | 1 << 49)
+    self.assertEqual(mask_to_interests(mask), ["1", "3", "50"])
+
+  def test_unknown_and_empty(self):
+    # Test that unknown codes and empty interests give an empty mask
+    self.assertEqual(interests_to_mask(["999"]), 0)
+    self.assertEqual(interests_to_mask(None), 0)
+    self.assertEqual(mask_to_interests(0), [])
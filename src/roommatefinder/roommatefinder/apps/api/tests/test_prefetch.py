@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from roommatefinder.apps.api import models, views
+from roommatefinder.apps.api.serializers import extra_serializers, profile_serializers, swipe_serializers
+
+
+class TestPrefetchPlan(TestCase):
+  """
+  Test case for the serializers' prefetch plans.
+
+  Serializing N profiles should take the same number of queries for any N.
+  """
+  def create_profiles(self, count):
+    for i in range(count):
+      profile = models.Profile.objects.create(identifier=f"{count}-{i}", otp_verified=True, has_account=True)
+      models.Photo.objects.create(profile=profile)
+      models.RoommateQuiz.objects.create(profile=profile)
+      if i:
+        models.Connection.objects.create(sender=profile, receiver=models.Profile.objects.get(identifier=f"{count}-0"))
+
+  def count_queries(self, serializer_class, count):
+    models.Profile.objects.all().delete()
+    self.create_profiles(count)
+    with CaptureQueriesContext(connection) as queries:
+      data = serializer_class(models.Profile.objects.all(), many=True).data
+    self.assertEqual(len(data), count)
+    return len(queries)
+
+  def test_constant_queries(self):
+    """
+    Test that each profile serializer takes a constant number of queries, from a queryset or a list.
+    """
+    for serializer_class in (
+      profile_serializers.BaseProfileSerializer,
+      profile_serializers.SwipeProfileSerializer,
+      profile_serializers.ProfileSerializer,
+    ):
+      with self.subTest(serializer=serializer_class.__qualname__):
+        self.assertEqual(self.count_queries(serializer_class, 2), self.count_queries(serializer_class, 6))
+        profiles = list(models.Profile.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+          serializer_class(profiles, many=True).data
+        self.assertEqual(len(queries), len(serializer_class.prefetch_related) + len(serializer_class.select_related))
+
+  def test_swipe_relationship(self):
+    """
+    Test that swipe cards read their relationship and counts from the ranking annotations.
+    """
+    self.create_profiles(6)
+    viewer = models.Profile.objects.get(identifier="6-1")
+    models.Connection.objects.filter(sender=viewer).update(accepted=True)
+    models.Connection.objects.create(sender=viewer, receiver=models.Profile.objects.get(identifier="6-2"))
+
+    def serialize(count):
+      profiles = models.Profile.objects.filter(identifier__in=[f"6-{i}" for i in range(count)])
+      profiles = models.Profile.objects.annotate_relationship(profiles, viewer).order_by("identifier")
+      with CaptureQueriesContext(connection) as queries:
+        data = swipe_serializers.SwipeProfileSerializer(profiles, many=True).data
+      return data, len(queries)
+
+    data, queries = serialize(6)
+    self.assertEqual(queries, serialize(3)[1])
+    self.assertEqual(
+      [profile["relationship"] for profile in data],
+      ["connected", "no-connection", "pending-them", "no-connection", "no-connection", "no-connection"]
+    )
+    self.assertEqual(data[0]["received_connections_count"], 5)
+    self.assertEqual(data[2]["sent_connections_count"], 1)
+    self.assertNotIn("sent_connections", data[0])
+
+  def test_roommate_quiz(self):
+    """
+    Test that the roommate quiz is read through the prefetched relation, and is None without a quiz.
+    """
+    self.create_profiles(2)
+    models.Profile.objects.create(identifier="no-quiz", otp_verified=True)
+    data = profile_serializers.BaseProfileSerializer(models.Profile.objects.order_by("identifier"), many=True).data
+    self.assertIsNotNone(data[0]["roommate_quiz"])
+    self.assertIsNone(data[2]["roommate_quiz"])
+
+  def test_request_list(self):
+    """
+    Test that connection requests join their sender and receiver.
+    """
+    self.create_profiles(5)
+    with self.assertNumQueries(1):
+      data = extra_serializers.RequestSerializer(models.Connection.objects.all(), many=True).data
+    self.assertEqual(len(data), 4)
+
+  def test_list_view(self):
+    """
+    Test that the profile list view applies the plan.
+    """
+    admin = models.Profile.objects.create(identifier="admin", is_superuser=True, otp_verified=True)
+    view = views.profile_views.ProfileViewSet.as_view({'get': 'list'})
+
+    def list_queries():
+      request = APIRequestFactory().get("/")
+      force_authenticate(request, user=admin)
+      with CaptureQueriesContext(connection) as queries:
+        response = view(request)
+      self.assertEqual(response.status_code, 200)
+      return len(queries)
+
+    self.create_profiles(2)
+    few = list_queries()
+    self.create_profiles(5)
+    self.assertEqual(list_queries(), few)
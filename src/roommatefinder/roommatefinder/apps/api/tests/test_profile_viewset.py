@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
-from django.test import TestCase
+import itertools
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
+from django.test import TestCase, override_settings
 from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from roommatefinder.apps.api import models, views
 
 
@@ -41,6 +46,20 @@ class TestProfileModelViewSet(TestCase):
     response = view(request)
     self.assertEqual(response.status_code, 201)
     self.assertEqual(response.data['identifier'], 'u1234567')
+    # Signing up authenticates, with one token pair
+    self.assertIn('token', response.data)
+    self.assertEqual(OutstandingToken.objects.count(), 1)
+
+  def test_retrieve_has_no_tokens(self):
+    """ Test that profile payloads outside of authentication don't mint tokens """
+    request = self.factory.get('/')
+    view = views.profile_views.ProfileViewSet.as_view({'get': 'retrieve'})
+    force_authenticate(request, user=self.authed_user)
+    response = view(request, pk=self.unauthed_user.pk)
+    self.assertEqual(response.status_code, 200)
+    self.assertNotIn('token', response.data)
+    self.assertNotIn('refresh_token', response.data)
+    self.assertFalse(OutstandingToken.objects.exists())
 
   def test_create_identifier_that_already_exists(self):
     """ Test creating a profile with an identifier that already exists. """
@@ -104,4 +123,81 @@ class TestProfileModelViewSet(TestCase):
     response = view(request)
     self.assertEqual(response.status_code, 400)
 
-  
\ No newline at end of file
+  
+
+
+class TestSwipeProfiles(TestCase):
+  """ Test the swipe deck snapshots and their cursor pagination """
+  def setUp(self):
+    self.factory = APIRequestFactory()
+    self.view = views.profile_views.ProfileViewSet.as_view({'get': 'swipe_profiles'})
+    self.user = models.Profile.objects.create(
+      identifier="viewer", otp_verified=True, has_account=True, dorm_building="4"
+    )
+    for i in range(5):
+      models.Profile.objects.create(
+        identifier=f"candidate{i}", otp_verified=True, has_account=True, dorm_building="4"
+      )
+
+  def get(self, params):
+    request = self.factory.get('/api/v1/profiles/actions/swipe-profiles/', params)
+    force_authenticate(request, user=self.user)
+    return self.view(request)
+
+  def cursor(self, response):
+    return parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+
+  def test_pages_come_from_the_snapshot(self):
+    """ Test that later pages don't rank again and see no duplicates """
+    first = self.get({'page_size': 2})
+    self.assertEqual(first.status_code, 200)
+    self.assertEqual(first.data['count'], 5)
+    self.assertIsNone(first.data['previous'])
+    # A new profile after the snapshot doesn't shift the following pages
+    models.Profile.objects.create(identifier="late", otp_verified=True, has_account=True, dorm_building="4")
+
+    seen = [profile['identifier'] for profile in first.data['results']]
+    response = first
+    with mock.patch.object(models.Profile.objects, 'swipe_deck') as swipe_deck:
+      while response.data['next']:
+        response = self.get({'page_size': 2, 'cursor': self.cursor(response)})
+        self.assertEqual(response.status_code, 200)
+        seen += [profile['identifier'] for profile in response.data['results']]
+      swipe_deck.assert_not_called()
+    self.assertEqual(sorted(seen), [f"candidate{i}" for i in range(5)])
+
+  def test_invalid_cursor(self):
+    """ Test that tampered cursors and other users' cursors are rejected """
+    first = self.get({'page_size': 2})
+    self.assertEqual(self.get({'cursor': 'not-a-cursor'}).status_code, 404)
+    self.user = models.Profile.objects.get(identifier="candidate0")
+    self.assertEqual(self.get({'cursor': self.cursor(first)}).status_code, 404)
+
+  def test_cards_carry_the_relationship(self):
+    """ Test that every ranking mode serves the viewer's relationship, with one query for a cached page """
+    candidate = models.Profile.objects.get(identifier="candidate0")
+    models.Connection.objects.create(sender=self.user, receiver=candidate, accepted=False)
+    # With and without interests, the SQL ranking orders by the overlap only when there is one
+    for mode, interests in itertools.product(("python", "sql", "numpy", "lazy", "deck"), ([], ["1", "2"])):
+      self.user.interests = interests
+      self.user.save()
+      with self.subTest(mode=mode, interests=interests), override_settings(SWIPE_RANKING_MODE=mode):
+        first = self.get({'page_size': 5})
+        relationships = {profile['identifier']: profile['relationship'] for profile in first.data['results']}
+        self.assertEqual(relationships.pop("candidate0"), "pending-them")
+        self.assertEqual(set(relationships.values()), {"no-connection"})
+        self.assertEqual(
+          {profile['identifier']: profile['received_connections_count'] for profile in first.data['results']}["candidate0"], 1
+        )
+    cursor = self.cursor(self.get({'page_size': 2}))
+    self.get({'page_size': 2, 'cursor': cursor})
+    with self.assertNumQueries(1):
+      self.get({'page_size': 2, 'cursor': cursor})
+
+  def test_page_number_pagination(self):
+    """ Test that page numbers still rank and paginate every request """
+    response = self.get({'page_size': 2, 'page': 3})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data['count'], 5)
+    self.assertEqual(len(response.data['results']), 1)
+
@@ -1,6 +1,16 @@
 # -*- coding: utf-8 -*-
-from django.test import TestCase
+from unittest import mock
+
+import numpy as np
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 from roommatefinder.apps.api import models
+from roommatefinder.apps.api.pagination import DeckSnapshotPagination, StandardResultsSetPagination
+from roommatefinder.apps.api.utils import precompute, ranking
 
 
 class TestRanking(TestCase):
@@ -155,4 +165,409 @@ class TestRanking(TestCase):
     )
     # Get ranked profiles
     ranked_profiles = models.Profile.objects.rank_profiles(self.user)
-    self.assertEqual(ranked_profiles[0].identifier, "first")
\ No newline at end of file
+    self.assertEqual(ranked_profiles[0].identifier, "first")
+
+
+class TestRankingSQL(TestCase):
+  """
+  Test case for ranking profiles in the database.
+
+  This test case checks that `rank_profiles_sql` orders profiles the same way
+  as `rank_profiles` and only loads the rows of the requested page.
+  """
+  def setUp(self):
+    self.user = models.Profile.objects.create(
+      identifier="example@gmail.com", 
+      otp_verified=True,
+      has_account=True,
+      dorm_building="4",
+      interests=["1", "2", "3"],
+      major="Computer Engineering",
+      state="CA"
+    )
+    candidates = [
+      ("a", "6", ["1", "2", "3"], "Computer Engineering", "FL"),
+      ("b", "4", ["1"], "Business", "CA"),
+      ("c", "4", ["1", "2", "3"], "Business", "CA"),
+      ("d", "4", ["10", "12", "13"], "Computer Engineering", "FL"),
+      ("e", "4", ["1", "2", "3"], "Computer Engineering", "FL"),
+      ("f", "6", [], "Business", "CA"),
+    ]
+    for identifier, dorm_building, interests, major, state in candidates:
+      models.Profile.objects.create(
+        identifier=identifier,
+        otp_verified=True,
+        has_account=True,
+        dorm_building=dorm_building,
+        interests=interests,
+        major=major,
+        state=state
+      )
+
+  def test_matches_python_ranking(self):
+    """
+    Test that the SQL ranking gives the same order as the in-memory ranking.
+    """
+    python_ranking = models.Profile.objects.rank_profiles(self.user)
+    sql_ranking = models.Profile.objects.rank_profiles_sql(self.user)
+    self.assertEqual(
+      [p.identifier for p in sql_ranking],
+      [p.identifier for p in python_ranking]
+    )
+    self.assertEqual(sql_ranking[0].common_interests, 3)
+
+  def test_excludes_accepted_connections(self):
+    """
+    Test that profiles with an accepted connection to the user are excluded.
+    """
+    connected = models.Profile.objects.get(identifier="e")
+    pending = models.Profile.objects.get(identifier="c")
+    models.Connection.objects.create(sender=connected, receiver=self.user, accepted=True)
+    models.Connection.objects.create(sender=self.user, receiver=pending, accepted=False)
+    identifiers = [p.identifier for p in models.Profile.objects.rank_profiles_sql(self.user)]
+    self.assertNotIn("e", identifiers)
+    self.assertIn("c", identifiers)
+    self.assertNotIn(self.user.identifier, identifiers)
+
+  def test_page_is_one_query(self):
+    """
+    Test that a page of the ranking is fetched with a single limited query.
+    """
+    profiles = models.Profile.objects.rank_profiles_sql(self.user)
+    with self.assertNumQueries(1):
+      page = list(profiles[2:4])
+    self.assertEqual([p.identifier for p in page], ["b", "d"])
+
+  def test_viewer_without_interests(self):
+    """
+    Test that a viewer without interests is ranked and paginated in every mode.
+    """
+    self.user.interests = []
+    self.user.save()
+    python_ranking = models.Profile.objects.rank_profiles(self.user)
+    scores = {
+      str(p.id): (p.dorm_match, p.common_interests, p.major_match, p.state_promotion) for p in python_ranking
+    }
+    for mode in ("python", "sql", "numpy", "lazy", "deck"):
+      with self.subTest(mode=mode), override_settings(SWIPE_RANKING_MODE=mode):
+        ids = DeckSnapshotPagination().ranked_ids(models.Profile.objects.swipe_deck(self.user), 10)
+        # Profiles with equal scores may come in any order
+        self.assertEqual([scores[id] for id in ids], list(scores.values()))
+
+
+@override_settings(SWIPE_RANKING_MODE="deck")
+class TestRankingDeck(TestRankingSQL):
+  """
+  Test case for the precomputed swipe decks.
+
+  Runs the SQL ranking tests against `rank_profiles_deck` and checks that the
+  decks follow profile and connection changes.
+  """
+  def rank(self, profile):
+    return [p.identifier for p in models.Profile.objects.rank_profiles_deck(profile)]
+
+  def test_matches_python_ranking(self):
+    """
+    Test that the deck gives the same order as the in-memory ranking.
+    """
+    python_ranking = models.Profile.objects.rank_profiles(self.user)
+    self.assertEqual(self.rank(self.user), [p.identifier for p in python_ranking])
+
+  def test_excludes_accepted_connections(self):
+    """
+    Test that accepting a connection takes both profiles off each other's deck.
+    """
+    connected = models.Profile.objects.get(identifier="e")
+    self.assertIn("e", self.rank(self.user))
+    connection = models.Connection.objects.create(sender=connected, receiver=self.user)
+    self.assertIn("e", self.rank(self.user))
+    connection.accepted = True
+    connection.save()
+    self.assertNotIn("e", self.rank(self.user))
+    self.assertNotIn(self.user.identifier, self.rank(connected))
+
+  def test_page_is_one_query(self):
+    """
+    Test that a page of a built deck is fetched with a single limited query.
+    """
+    profiles = models.Profile.objects.rank_profiles_deck(self.user)
+    with self.assertNumQueries(1):
+      page = list(profiles[2:4])
+    self.assertEqual([p.identifier for p in page], ["b", "d"])
+
+  def test_profile_change_updates_decks(self):
+    """
+    Test that changing a ranking field rescores the profile in every deck.
+    """
+    profile = models.Profile.objects.get(identifier="f")
+    profile.dorm_building = "4"
+    profile.interests = ["1", "2", "3"]
+    profile.major = "Computer Engineering"
+    profile.state = "FL"
+    profile.save()
+    self.assertCountEqual(self.rank(self.user)[:2], ["e", "f"])
+    self.assertEqual(self.rank(profile)[0], self.user.identifier)
+
+  def test_new_and_removed_accounts(self):
+    """
+    Test that profiles join decks when they set up an account and leave when they don't have one.
+    """
+    profile = models.Profile.objects.create(identifier="g", otp_verified=True, dorm_building="4")
+    self.assertNotIn("g", self.rank(self.user))
+    profile.has_account = True
+    profile.save()
+    self.assertIn("g", self.rank(self.user))
+    profile.has_account = False
+    profile.save()
+    self.assertNotIn("g", self.rank(self.user))
+    self.assertFalse(models.DeckEntry.objects.filter(viewer=profile).exists())
+
+  def test_empty_deck_is_not_rebuilt(self):
+    """
+    Test that a built deck with no candidates isn't built again on every read.
+    """
+    for profile in models.Profile.objects.exclude(id=self.user.id):
+      profile.pause_profile = True
+      profile.save()
+    self.assertEqual(self.rank(self.user), [])
+    self.assertIsNotNone(models.Profile.objects.get(id=self.user.id).deck_built)
+    with mock.patch.object(models.DeckEntry.objects, "rebuild_deck") as rebuild_deck:
+      self.assertEqual(self.rank(self.user), [])
+    rebuild_deck.assert_not_called()
+
+  def test_change_writes_changed_scores(self):
+    """
+    Test that a ranking change only writes the deck entries whose score changed, without reading the profile again.
+    """
+    self.rank(self.user)
+    profile = models.Profile.objects.get(identifier="f")
+    profile.state = "CA" if profile.state != "CA" else "FL"
+    # Only candidates in the old or new state of the profile score differently
+    changed = set(models.Profile.objects.eligible_pool().exclude(id=profile.id).filter(
+      state__in=[profile.state, models.Profile.objects.get(id=profile.id).state]
+    ).values_list("id", flat=True))
+    with mock.patch.object(
+      models.DeckEntry.objects, "_upsert", wraps=models.DeckEntry.objects._upsert
+    ) as upsert, CaptureQueriesContext(connection) as queries:
+      profile.save()
+    written = [entry for call in upsert.call_args_list for entry in call.args[0]]
+    self.assertEqual(
+      {entry.candidate_id if entry.viewer_id == profile.id else entry.viewer_id for entry in written},
+      changed,
+    )
+    self.assertFalse([
+      query for query in queries.captured_queries
+      if query["sql"].startswith("SELECT") and '"api_profile"."id" =' in query["sql"] and "LIMIT 1" in query["sql"]
+    ])
+    self.assertEqual(self.rank(self.user), [p.identifier for p in models.Profile.objects.rank_profiles(self.user)])
+
+
+
+class TestRankingNumpy(TestRankingSQL):
+  """
+  Test case for the vectorized ranking.
+
+  Runs the SQL ranking tests against `rank_profiles_numpy` and checks the
+  popcount and top-k helpers it is built on.
+  """
+  def test_matches_python_ranking(self):
+    """
+    Test that the vectorized ranking gives the same order as the in-memory ranking.
+    """
+    python_ranking = models.Profile.objects.rank_profiles(self.user)
+    numpy_ranking = models.Profile.objects.rank_profiles_numpy(self.user)
+    self.assertEqual(len(numpy_ranking), len(python_ranking))
+    self.assertEqual(
+      [p.identifier for p in numpy_ranking[:len(numpy_ranking)]],
+      [p.identifier for p in python_ranking]
+    )
+    self.assertEqual(numpy_ranking[0].identifier, "e")
+
+  def test_excludes_accepted_connections(self):
+    """
+    Test that profiles with an accepted connection to the user are excluded.
+    """
+    connected = models.Profile.objects.get(identifier="e")
+    models.Connection.objects.create(sender=self.user, receiver=connected, accepted=True)
+    ranked = models.Profile.objects.rank_profiles_numpy(self.user)
+    self.assertNotIn("e", [p.identifier for p in ranked[:len(ranked)]])
+
+  def test_page_is_one_query(self):
+    """
+    Test that a page of the ranking builds only the profiles of the page.
+    """
+    ranked = models.Profile.objects.rank_profiles_numpy(self.user)
+    with self.assertNumQueries(1):
+      page = ranked[2:4]
+    self.assertEqual([p.identifier for p in page], ["b", "d"])
+
+  def test_popcount(self):
+    """
+    Test counting the bits of 64-bit masks.
+    """
+    masks = np.array([0, 1, 0b1011, 2**63 + 1, 2**64 - 1], dtype=np.uint64)
+    self.assertEqual(ranking.popcount(masks).tolist(), [0, 1, 3, 2, 64])
+
+  def test_top_k_matches_full_sort(self):
+    """
+    Test that top-k with many ties matches sorting everything by score, then id.
+    """
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=500)
+    ids = np.array([f"{i:04d}" for i in rng.permutation(500)])
+    expected = sorted(range(500), key=lambda i: (-scores[i], ids[i]))
+    for k in (1, 7, 100, 500, 600):
+      self.assertEqual(ranking.top_k(scores, ids, k).tolist(), expected[:k])
+
+
+class TestRankingLazy(TestRankingSQL):
+  """
+  Test case for the lazy top-k ranking.
+
+  Runs the SQL ranking tests against `rank_profiles_lazy` and checks that it
+  pages through `StandardResultsSetPagination`.
+  """
+  def test_matches_python_ranking(self):
+    """
+    Test that the lazy ranking gives the same order as the in-memory ranking.
+    """
+    python_ranking = models.Profile.objects.rank_profiles(self.user)
+    lazy_ranking = models.Profile.objects.rank_profiles_lazy(self.user)
+    self.assertEqual(len(lazy_ranking), len(python_ranking))
+    self.assertEqual(
+      [p.identifier for p in lazy_ranking[:len(lazy_ranking)]],
+      [p.identifier for p in python_ranking]
+    )
+    self.assertEqual(lazy_ranking[0].identifier, "e")
+    self.assertEqual(lazy_ranking[-1].identifier, python_ranking[-1].identifier)
+
+  def test_excludes_accepted_connections(self):
+    """
+    Test that accepted connections and excluded ids are left out.
+    """
+    connected = models.Profile.objects.get(identifier="e")
+    excluded = models.Profile.objects.get(identifier="c")
+    models.Connection.objects.create(sender=self.user, receiver=connected, accepted=True)
+    ranked = models.Profile.objects.rank_profiles_lazy(self.user, exclude=[str(excluded.id)])
+    identifiers = [p.identifier for p in ranked[:len(ranked)]]
+    self.assertNotIn("e", identifiers)
+    self.assertNotIn("c", identifiers)
+    self.assertEqual(len(identifiers), 4)
+
+  def test_page_is_one_query(self):
+    """
+    Test that a page streams the candidates once and only builds the profiles of the page.
+    """
+    ranked = models.Profile.objects.rank_profiles_lazy(self.user)
+    with self.assertNumQueries(0):
+      models.Profile.objects.rank_profiles_lazy(self.user)
+    with self.assertNumQueries(2):
+      page = ranked[2:4]
+    self.assertEqual([p.identifier for p in page], ["b", "d"])
+
+  def test_paginates(self):
+    """
+    Test that the lazy ranking plugs into the page number pagination.
+    """
+    request = Request(APIRequestFactory().get("/", {"page": 2, "page_size": 4}))
+    paginator = StandardResultsSetPagination()
+    page = paginator.paginate_queryset(models.Profile.objects.rank_profiles_lazy(self.user), request)
+    self.assertEqual(paginator.page.paginator.count, 6)
+    self.assertEqual(len(page), 2)
+
+
+@override_settings(SWIPE_RANKING_MODE="deck")
+class TestPrecomputeDecks(TestCase):
+  """
+  Test case for precomputing every deck in bulk.
+  """
+  setUp = TestRankingSQL.setUp
+
+  def test_matches_python_ranking(self):
+    """
+    Test that a precomputed deck gives the same order as the in-memory ranking.
+    """
+    result = precompute.precompute_decks(processes=1, chunk_size=2)
+    self.assertEqual(result, {"viewers": 7, "entries": 42})
+    self.assertFalse(models.Profile.objects.eligible_pool().filter(deck_built=None).exists())
+    python_ranking = models.Profile.objects.rank_profiles(self.user)
+    self.assertEqual(
+      [p.identifier for p in models.Profile.objects.rank_profiles_deck(self.user)][0],
+      python_ranking[0].identifier
+    )
+    self.assertEqual(
+      sorted(models.DeckEntry.objects.filter(viewer=self.user).values_list("score", flat=True), reverse=True),
+      sorted((p.deck_score for p in models.Profile.objects.rank_profiles_deck(self.user)), reverse=True)
+    )
+
+  def test_top_connections_and_stale_entries(self):
+    """
+    Test that decks are cut to the top candidates, skip connections and drop profiles that left the pool.
+    """
+    connected = models.Profile.objects.get(identifier="e")
+    models.Connection.objects.create(sender=connected, receiver=self.user, accepted=True)
+    paused = models.Profile.objects.get(identifier="a")
+    # Paused behind the deck signals' back, only the precompute can notice
+    models.Profile.objects.filter(id=paused.id).update(pause_profile=True)
+    self.assertTrue(models.DeckEntry.objects.filter(candidate=paused).exists())
+
+    precompute.precompute_decks(processes=1, top=2)
+    deck = [p.identifier for p in models.Profile.objects.rank_profiles_deck(self.user)]
+    self.assertEqual(deck, ["c", "b"])
+    self.assertFalse(models.DeckEntry.objects.filter(Q(viewer=paused) | Q(candidate=paused)).exists())
+
+
+class TestEligiblePool(TestCase):
+  """
+  Test case for the eligible pool and its partitions.
+  """
+  def setUp(self):
+    self.user = models.Profile.objects.create(
+      identifier="viewer", otp_verified=True, has_account=True, dorm_building="4", sex="F"
+    )
+    for identifier, dorm_building, sex, extra in [
+      ("same-dorm", "4", "F", {}),
+      ("same-dorm-m", "4", "M", {}),
+      ("other-dorm", "6", "F", {}),
+      ("paused", "4", "F", {"pause_profile": True}),
+      ("inactive", "4", "F", {"is_active": False}),
+      ("no-account", "4", "F", {"has_account": False}),
+    ]:
+      models.Profile.objects.create(
+        identifier=identifier,
+        otp_verified=True,
+        dorm_building=dorm_building,
+        sex=sex,
+        **{"has_account": True, **extra}
+      )
+
+  def test_paused_and_inactive_are_not_candidates(self):
+    """
+    Test that only active, unpaused profiles with an account are swipe candidates.
+    """
+    identifiers = {p.identifier for p in models.Profile.objects.swipe_candidates(self.user)}
+    self.assertEqual(identifiers, {"same-dorm", "same-dorm-m", "other-dorm"})
+
+  def test_partitions(self):
+    """
+    Test that partitions cover the candidates, the user's dorm first.
+    """
+    partitions = list(models.Profile.objects.iter_pool_partitions(self.user))
+    self.assertEqual([key for key, _ in partitions], [("4", "F"), ("4", "M"), ("6", "F")])
+    scanned = {p.identifier for _, candidates in partitions for p in candidates}
+    self.assertEqual(scanned, {"same-dorm", "same-dorm-m", "other-dorm"})
+
+  @override_settings(SWIPE_RANKING_MODE="deck")
+  def test_pausing_leaves_the_decks(self):
+    """
+    Test that pausing a profile takes it off every deck and unpausing puts it back.
+    """
+    deck = lambda: {p.identifier for p in models.Profile.objects.rank_profiles_deck(self.user)}
+    self.assertIn("same-dorm", deck())
+    profile = models.Profile.objects.get(identifier="same-dorm")
+    profile.pause_profile = True
+    profile.save()
+    self.assertNotIn("same-dorm", deck())
+    profile.pause_profile = False
+    profile.save()
+    self.assertIn("same-dorm", deck())
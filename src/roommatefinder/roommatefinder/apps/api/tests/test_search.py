@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils import search
+
+
+class TestSearch(TestCase):
+  """
+  Test case for the bounded, cached prefix search of the websocket `search` route.
+  """
+  def setUp(self):
+    cache.clear()
+    self.user = models.Profile.objects.create(identifier="alex@utah.edu", name="Alex", otp_verified=True)
+    self.profiles = {
+      name: models.Profile.objects.create(identifier=f"{name.lower()}@utah.edu", name=name, otp_verified=True)
+      for name in ("Alice", "Alan", "Albert", "Aldo", "Bob")
+    }
+    models.Connection.objects.create(sender=self.user, receiver=self.profiles["Alice"], accepted=False)
+    models.Connection.objects.create(sender=self.profiles["Alan"], receiver=self.user, accepted=False)
+    models.Connection.objects.create(sender=self.profiles["Albert"], receiver=self.user, accepted=True)
+
+  def test_statuses(self):
+    """
+    Test that results match names and identifiers case insensitively, with the searcher's status.
+    """
+    results = dict(search.search_profiles(self.user, "aL"))
+    self.assertEqual(results, {
+      str(self.profiles["Alice"].id): "pending-them",
+      str(self.profiles["Alan"].id): "pending-me",
+      str(self.profiles["Albert"].id): "connected",
+      str(self.profiles["Aldo"].id): "no-connection",
+    })
+    self.assertEqual(search.search_profiles(self.user, "BOB@"), [(str(self.profiles["Bob"].id), "no-connection")])
+
+  @override_settings(SEARCH_RESULT_LIMIT=2)
+  def test_limit(self):
+    """
+    Test that a search stops at the result limit, and skips the identifier scan once names filled it.
+    """
+    with self.assertNumQueries(2):
+      results = search.search_profiles(self.user, "al")
+    self.assertEqual(len(results), 2)
+
+  def test_cached(self):
+    """
+    Test that the same query is answered from the cache, per user.
+    """
+    with self.assertNumQueries(3):
+      results = search.search_profiles(self.user, "al")
+    with self.assertNumQueries(0):
+      self.assertEqual(search.search_profiles(self.user, "AL"), results)
+    with self.assertNumQueries(3):
+      search.search_profiles(self.profiles["Bob"], "al")
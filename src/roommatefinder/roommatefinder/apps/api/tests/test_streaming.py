@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from roommatefinder.apps.api import models, views
+from roommatefinder.apps.api.internal import internal_profiles
+from roommatefinder.apps.api.serializers import fast_serializers, matching_serializers, profile_serializers
+from roommatefinder.apps.api.utils import streaming
+
+
+class TestStreaming(TestCase):
+  """
+  Test case for the newline-delimited JSON streams of the admin listings.
+  """
+  def setUp(self):
+    self.factory = APIRequestFactory()
+    self.admin = models.Profile.objects.create(
+      identifier="admin", is_superuser=True, is_staff=True, otp_verified=True
+    )
+    for i in range(5):
+      profile = models.Profile.objects.create(identifier=f"stream-{i}", otp_verified=True, has_account=True)
+      models.Photo.objects.create(profile=profile)
+      models.RoommateQuiz.objects.create(profile=profile)
+
+  def get(self, view, stream=True, user=None):
+    request = self.factory.get("/", {"stream": "true"} if stream else {})
+    force_authenticate(request, user=user or self.admin)
+    return view(request)
+
+  def read_chunks(self, response):
+    async def read():
+      return [chunk async for chunk in response.streaming_content]
+    self.assertTrue(response.is_async)
+    return async_to_sync(read)()
+
+  def read_lines(self, response):
+    self.assertEqual(response["Content-Type"], "application/x-ndjson")
+    content = b"".join(self.read_chunks(response))
+    self.assertTrue(content.endswith(b"\n"))
+    return [json.loads(line) for line in content.splitlines()]
+
+  def test_profile_list(self):
+    """
+    Test that the profile list streams the same profiles as the regular listing.
+    """
+    view = views.profile_views.ProfileViewSet.as_view({"get": "list"})
+    lines = self.read_lines(self.get(view))
+    listed = self.get(view, stream=False).data
+    self.assertEqual(listed["profile_count"], 6)
+    self.assertEqual(
+      lines, json.loads(JSONRenderer().render(sorted(listed["profiles"], key=lambda profile: profile["id"])))
+    )
+    self.assertEqual(self.get(view, user=models.Profile.objects.get(identifier="stream-0")).status_code, 403)
+
+  def test_quiz_list(self):
+    """
+    Test that the quiz list streams every quiz.
+    """
+    view = views.matching_views.RoommateQuizViewSet.as_view({"get": "list"})
+    lines = self.read_lines(self.get(view))
+    expected = matching_serializers.RoommateQuizSerializer(models.RoommateQuiz.objects.order_by("profile"), many=True).data
+    self.assertEqual(lines, json.loads(JSONRenderer().render(expected)))
+
+  def test_internal_list(self):
+    """
+    Test that the internal profile list streams, and keeps its regular response otherwise.
+    """
+    lines = self.read_lines(self.get(internal_profiles.list_profiles))
+    expected = profile_serializers.ProfileSerializer(models.Profile.objects.order_by("id"), many=True).data
+    self.assertEqual(lines, json.loads(JSONRenderer().render(expected)))
+    self.assertEqual(self.get(internal_profiles.list_profiles, stream=False).data["count"], 6)
+
+  def test_chunks(self):
+    """
+    Test that rows are encoded a chunk at a time, with one query per nested field and chunk.
+    """
+    response = streaming.stream_ndjson(
+      fast_serializers.FastProfileSerializer(), models.Profile.objects.order_by("id"), chunk_size=2
+    )
+    with self.assertNumQueries(1 + 3):
+      chunks = self.read_chunks(response)
+    self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 2, 2])
+
+  async def test_async_client(self):
+    """
+    Test that an ASGI request gets the rows chunk by chunk, each chunk read when it is sent.
+    """
+    token = await sync_to_async(lambda: str(AccessToken.for_user(self.admin)))()
+    with mock.patch.object(streaming.stream_ndjson, "__defaults__", (2,)), \
+        mock.patch.object(fast_serializers.FastProfileSerializer, "serialize_rows", autospec=True,
+                          side_effect=fast_serializers.FastProfileSerializer.serialize_rows) as serialize_rows:
+      response = await self.async_client.get(
+        "/api/v1/internal/profiles/", {"stream": "true"}, headers={"Authorization": f"Bearer {token}"}
+      )
+      self.assertEqual(response.status_code, 200)
+      self.assertTrue(response.streaming)
+      self.assertTrue(response.is_async)
+      chunks = aiter(response.streaming_content)
+      first = await anext(chunks)
+      # Only the first chunk is read so far
+      self.assertEqual(first.count(b"\n"), 2)
+      self.assertEqual(serialize_rows.call_count, 1)
+      rest = [chunk async for chunk in chunks]
+    self.assertEqual([chunk.count(b"\n") for chunk in rest], [2, 2])
+    self.assertEqual(serialize_rows.call_count, 3)
+    self.assertEqual(
+      [json.loads(line)["identifier"] for line in b"".join([first, *rest]).splitlines()],
+      [profile.identifier async for profile in models.Profile.objects.order_by("id")]
+    )
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from roommatefinder.apps.api import models, views
+from roommatefinder.apps.api.utils import swipes
+
+
+class TestSwipeViewSet(TestCase):
+  """ Test recording swipes and leaving them out of the swipe deck """
+  def setUp(self):
+    cache.clear()
+    self.factory = APIRequestFactory()
+    self.view = views.swipe_views.SwipeViewSet.as_view({'post': 'create'})
+    self.user = models.Profile.objects.create(identifier="swiper", otp_verified=True, has_account=True)
+    self.first = models.Profile.objects.create(identifier="first", otp_verified=True, has_account=True)
+    self.second = models.Profile.objects.create(identifier="second", otp_verified=True, has_account=True)
+
+  def post(self, data):
+    request = self.factory.post('/api/v1/swipes/', data, format='json')
+    force_authenticate(request, user=self.user)
+    return self.view(request)
+
+  def test_single_swipe(self):
+    response = self.post({'id': str(self.first.id), 'direction': 'L'})
+    self.assertEqual(response.status_code, 202)
+    self.assertEqual(response.data['recorded'], 1)
+    swipe = models.Swipe.objects.get(swiper=self.user)
+    self.assertEqual((swipe.swiped, swipe.direction), (self.first, 'L'))
+
+  def test_batch_skips_self_and_unknown_profiles(self):
+    response = self.post([
+      {'id': str(self.first.id), 'direction': 'L'},
+      {'id': str(self.second.id), 'direction': 'R'},
+      {'id': str(self.user.id), 'direction': 'R'},
+      {'id': '00000000-0000-0000-0000-000000000000', 'direction': 'R'},
+    ])
+    self.assertEqual(response.data['recorded'], 2)
+    self.assertEqual(models.Swipe.objects.filter(swiper=self.user).count(), 2)
+
+  def test_invalid_direction(self):
+    response = self.post({'id': str(self.first.id), 'direction': 'up'})
+    self.assertEqual(response.status_code, 400)
+
+  def test_swiping_again_updates_direction(self):
+    self.post({'id': str(self.first.id), 'direction': 'L'})
+    self.post({'id': str(self.first.id), 'direction': 'R'})
+    self.assertEqual(models.Swipe.objects.get(swiper=self.user).direction, 'R')
+
+  @override_settings(SWIPE_BUFFER_SIZE=3, SWIPE_BUFFER_SECONDS=60)
+  def test_buffered_until_full(self):
+    third = models.Profile.objects.create(identifier="third", otp_verified=True, has_account=True)
+    self.post([{'id': str(self.first.id), 'direction': 'L'}, {'id': str(self.second.id), 'direction': 'L'}])
+    self.assertFalse(models.Swipe.objects.exists())
+    # Pending swipes are in the overlay other workers read
+    self.assertEqual(swipes.pending_ids(self.user.id), {str(self.first.id), str(self.second.id)})
+    self.post({'id': str(third.id), 'direction': 'R'})
+    self.assertEqual(models.Swipe.objects.count(), 3)
+    self.assertEqual(len(swipes.swipe_buffer), 0)
+
+  def test_swiped_profiles_leave_the_deck(self):
+    for mode in ("python", "sql", "numpy", "deck"):
+      with self.subTest(mode=mode), override_settings(SWIPE_RANKING_MODE=mode):
+        cache.clear()
+        self.post({'id': str(self.first.id), 'direction': 'L'})
+        ranked = models.Profile.objects.swipe_deck(self.user)
+        self.assertEqual([p.identifier for p in ranked[:10]], ["second"])
+
+  @override_settings(SWIPE_BUFFER_SIZE=100, SWIPE_BUFFER_SECONDS=60)
+  def test_flushed_when_the_deck_is_read(self):
+    self.post({'id': str(self.first.id), 'direction': 'L'})
+    self.assertFalse(models.Swipe.objects.exists())
+    cache.clear()
+    for mode in ("python", "sql", "numpy", "lazy", "deck"):
+      with self.subTest(mode=mode), override_settings(SWIPE_RANKING_MODE=mode):
+        ranked = models.Profile.objects.swipe_deck(self.user)
+        self.assertEqual([p.identifier for p in ranked[:10]], ["second"])
+        self.assertEqual(models.Swipe.objects.get(swiper=self.user).swiped, self.first)
+        self.assertEqual(len(swipes.swipe_buffer), 0)
+
+  def test_swipes_buffered_by_other_workers_leave_the_deck(self):
+    # Only in another worker's buffer, this one has nothing to flush
+    swipes.mark_pending(self.user.id, [self.second.id])
+    swipes.mark_pending(self.user.id, [self.first.id])
+    for mode in ("python", "sql", "numpy", "lazy", "deck"):
+      with self.subTest(mode=mode), override_settings(SWIPE_RANKING_MODE=mode):
+        self.assertEqual(list(models.Profile.objects.swipe_deck(self.user)[:10]), [])
+    self.assertFalse(models.Swipe.objects.exists())
+
+
+class TestSwipeBufferTimer(TransactionTestCase):
+  """ Test that buffered swipes are written by the timer, without a full buffer """
+  def setUp(self):
+    cache.clear()
+    self.user = models.Profile.objects.create(identifier="swiper", otp_verified=True, has_account=True)
+    self.first = models.Profile.objects.create(identifier="first", otp_verified=True, has_account=True)
+    self.second = models.Profile.objects.create(identifier="second", otp_verified=True, has_account=True)
+
+  @override_settings(SWIPE_BUFFER_SIZE=100, SWIPE_BUFFER_SECONDS=0.05)
+  def test_flushed_by_the_timer(self):
+    swipes.swipe_buffer.add(self.user.id, [self.first.id], "L")
+    swipes.swipe_buffer.add(self.user.id, [self.second.id], "R")
+    timer = swipes.swipe_buffer._timer
+    self.assertIsNotNone(timer)
+    timer.join(5)
+    self.assertEqual(len(swipes.swipe_buffer), 0)
+    self.assertIsNone(swipes.swipe_buffer._timer)
+    self.assertEqual(
+      dict(models.Swipe.objects.filter(swiper=self.user).values_list("swiped__identifier", "direction")),
+      {"first": "L", "second": "R"}
+    )
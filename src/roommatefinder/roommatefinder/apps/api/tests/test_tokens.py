@@ -43,4 +43,7 @@ class TestMyTokenObtainPairView(APITestCase):
     response = self.client.post(self.url, data, format='json')
     self.assertEqual(response.status_code, status.HTTP_200_OK)
     self.assertIn('access', response.data)
-    self.assertIn('refresh', response.data)
\ No newline at end of file
+    self.assertIn('refresh', response.data)
+    # The profile carries the same pair, minted once
+    self.assertEqual(response.data['token'], response.data['access'])
+    self.assertEqual(response.data['refresh_token'], response.data['refresh'])
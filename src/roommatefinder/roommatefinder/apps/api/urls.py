@@ -3,11 +3,12 @@ from django.urls import path, include
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenRefreshView
 
-from .internal import internal_profiles
+from .internal import internal_metrics, internal_profiles
 from .views import (
   profile_views, 
   matching_views, 
   photo_views, 
+  swipe_views,
   tokens
 )
 
@@ -25,6 +26,12 @@ router.register(
   basename="photo",
 )
 
+router.register(
+  r"swipes",
+  swipe_views.SwipeViewSet,
+  basename="swipe"
+)
+
 router.register(
   r"quizs",
   matching_views.RoommateQuizViewSet,
@@ -48,6 +55,11 @@ urlpatterns = [
     internal_profiles.fake_create_profiles,
     name="create_fake_profiles"
   ),
+  path(
+    "internal/metrics/",
+    internal_metrics.get_metrics,
+    name="metrics"
+  ),
 
   # authentication
   path(
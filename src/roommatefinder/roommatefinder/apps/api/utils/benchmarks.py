@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import gc
+import json
+import time
+import random
+import tracemalloc
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from roommatefinder.apps.api import consumers, models, views
+from roommatefinder.apps.api.serializers import fast_serializers, profile_serializers, swipe_serializers
+from roommatefinder.apps.api.utils import cards, search
+from roommatefinder.apps.api.utils.generate import generate_profiles
+
+
+# Profiles serialized by the serializer benchmarks, about a deck snapshot
+SERIALIZED_PROFILES = 200
+# Messages in the conversation read by the `message.list` benchmark
+CONVERSATION_LENGTH = 200
+# Items sorted by the reference workload the times are divided by
+REFERENCE_ITEMS = 50000
+
+
+class BenchmarkConsumer(consumers.APIConsumer):
+  """
+  The websocket consumer with its queued sends captured instead of going through the socket or channel layer.
+
+  Its sync handlers are called directly, in the benchmark's thread and database transaction.
+  """
+  def __init__(self, user):
+    super().__init__()
+    self.scope = {'user': user}
+    self._id = str(user.id)
+    self._outbox = []
+    self.sent = []
+
+  def queue_group(self, group, source, data):
+    # Encode like `broadcast_group` would, that's part of the handler's cost
+    self.sent.append(json.dumps({'source': source, 'data': data}))
+
+  def queue_self(self, source, data):
+    # Encode like `send_self` would
+    self.sent.append(json.dumps({'source': source, 'data': data}))
+
+
+def seed(size: int, seed: int = 0) -> dict:
+  """
+  Seed a population and the data the benchmarks read.
+
+  Parameters:
+    size (int): The number of profiles.
+    seed (int): Seed of the population, the same seed benchmarks the same rows.
+
+  Returns:
+    dict: The `viewer` profile, the `profiles` to serialize and the `connection` of the conversation.
+  """
+  ids = generate_profiles(size, seed=seed)
+  rng = random.Random(seed)
+  viewer = models.Profile.objects.get(id=ids[0])
+  friend = models.Profile.objects.get(id=ids[1])
+  conversation = models.Connection.objects.create(sender=viewer, receiver=friend, accepted=True)
+  models.Message.objects.bulk_create([
+    models.Message(connection=conversation, user=rng.choice((viewer, friend)), text=f"message {i}")
+    for i in range(CONVERSATION_LENGTH)
+  ])
+  profiles = list(models.Profile.objects.filter(id__in=ids[2:2 + SERIALIZED_PROFILES]))
+  return {'viewer': viewer, 'profiles': profiles, 'connection': conversation}
+
+
+def build_cases(viewer, profiles, conversation) -> dict:
+  """
+  Get the benchmarked code paths, by name.
+
+  Parameters:
+    viewer (Profile): The profile the requests are made as.
+    profiles (list): The profiles to serialize.
+    conversation (Connection): The conversation read by `message.list`.
+
+  Returns:
+    dict: Callables that run one code path once.
+  """
+  factory = APIRequestFactory()
+  profile_ids = [profile.id for profile in profiles]
+  swipe_profiles = views.profile_views.ProfileViewSet.as_view({'get': 'swipe_profiles'})
+
+  def swipe_profiles_request():
+    request = factory.get('/api/v1/profiles/actions/swipe-profiles/')
+    force_authenticate(request, user=viewer)
+    response = swipe_profiles(request)
+    assert response.status_code == 200, response.data
+    response.render()
+
+  def consumer_handler(handler, data):
+    def run():
+      consumer = BenchmarkConsumer(viewer)
+      getattr(consumer, handler)(data)
+      assert consumer.sent
+    return run
+
+  return {
+    'rank_profiles': lambda: models.Profile.objects.rank_profiles(viewer),
+    'rank_profiles_sql': lambda: list(models.Profile.objects.rank_profiles_sql(viewer)[:SERIALIZED_PROFILES]),
+    'rank_profiles_numpy': lambda: models.Profile.objects.rank_profiles_numpy(viewer)[:SERIALIZED_PROFILES],
+    'rank_profiles_lazy': lambda: models.Profile.objects.rank_profiles_lazy(viewer)[:SERIALIZED_PROFILES],
+    'swipe_profiles': swipe_profiles_request,
+    'profile_serializers.SwipeProfileSerializer': lambda: profile_serializers.SwipeProfileSerializer(
+      profiles, many=True
+    ).data,
+    'swipe_serializers.SwipeProfileSerializer': lambda: swipe_serializers.SwipeProfileSerializer(
+      models.Profile.objects.annotate_relationship(models.Profile.objects.filter(id__in=profile_ids), viewer),
+      many=True
+    ).data,
+    # The same output as the DRF serializers, from rows, rendered to JSON like a response would be
+    'profile_serializers.SwipeProfileSerializer+render': lambda: JSONRenderer().render(
+      profile_serializers.SwipeProfileSerializer(profiles, many=True).data
+    ),
+    'fast_serializers.FastSwipeProfileSerializer+render': lambda: fast_serializers.dumps(
+      fast_serializers.FastSwipeProfileSerializer().serialize_ids(profile_ids)
+    ),
+    'profile_serializers.ProfileSerializer+render': lambda: JSONRenderer().render(
+      profile_serializers.ProfileSerializer(profiles, many=True).data
+    ),
+    'fast_serializers.FastProfileSerializer+render': lambda: fast_serializers.dumps(
+      fast_serializers.FastProfileSerializer().serialize_ids(profile_ids)
+    ),
+    # Cached after the warm up run, the common case of a card already rendered for another viewer
+    'cards.get_cards+render': lambda: fast_serializers.dumps(cards.get_cards('swipe', profile_ids)),
+    # Cached after the warm up run, like a user typing the same prefix again
+    'consumer.receive_search': consumer_handler('receive_search', {'query': viewer.name[:1]}),
+    'search.search_profiles': lambda: (
+      cache.delete(search.search_key(viewer.id, viewer.name[:1])),
+      search.search_profiles(viewer, viewer.name[:1]),
+    ),
+    'consumer.receive_message_list': consumer_handler(
+      'receive_message_list', {'connectionId': conversation.id, 'page': 0}
+    ),
+  }
+
+
+def measure(run, repeat: int = 3) -> dict:
+  """
+  Measure one code path.
+
+  The time is the best of `repeat` runs after a warm up run. Queries and peak
+  memory are measured on separate runs so that neither slows the timed runs.
+
+  Parameters:
+    run (callable): The code path.
+    repeat (int): The number of timed runs.
+
+  Returns:
+    dict: `seconds`, `queries` and `peak_memory` (bytes allocated at the peak).
+  """
+  run()
+  timings = []
+  for _ in range(repeat):
+    started = time.perf_counter()
+    run()
+    timings.append(time.perf_counter() - started)
+
+  with CaptureQueriesContext(connection) as queries:
+    run()
+
+  gc.collect()
+  tracemalloc.start()
+  try:
+    run()
+    _, peak_memory = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+
+  return {'seconds': round(min(timings), 6), 'queries': len(queries), 'peak_memory': peak_memory}
+
+
+def reference():
+  """
+  A fixed CPU bound workload, timed in the same run as the benchmarks.
+
+  Dividing their times by its time gives ratios that compare across machines,
+  where absolute seconds don't.
+  """
+  rng = random.Random(0)
+  items = [(rng.random(), str(i)) for i in range(REFERENCE_ITEMS)]
+  json.dumps(sorted(items))
+
+
+def run_suite(size: int, repeat: int = 3, only=None, seed_value: int = 0) -> dict:
+  """
+  Seed a population of `size` profiles and measure every benchmark on it.
+
+  Every measurement also has its `relative` time, its time divided by the
+  time of `reference` measured in the same run.
+
+  Parameters:
+    size (int): The number of profiles.
+    repeat (int): The number of timed runs per benchmark.
+    only (iterable): Names of the benchmarks to run, all of them if empty.
+    seed_value (int): Seed of the population.
+
+  Returns:
+    dict: The measurements of each benchmark, by name.
+  """
+  seeded = seed(size, seed=seed_value)
+  cases = build_cases(seeded['viewer'], seeded['profiles'], seeded['connection'])
+  results = {
+    name: measure(run, repeat=repeat)
+    for name, run in cases.items()
+    if not only or name in only
+  }
+  reference_seconds = measure(reference, repeat=repeat)['seconds']
+  for measured in results.values():
+    measured['relative'] = round(measured['seconds'] / reference_seconds, 4)
+  return results
+
+
+def find_regressions(results: dict, baseline: dict, time_tolerance: float = None, memory_tolerance: float = 0.2) -> list:
+  """
+  Compare measurements against a baseline.
+
+  Query counts are deterministic and may not grow at all, peak memory may grow
+  by its tolerance, a share of the baseline value. Times depend on the machine
+  the baseline was measured on, so they are only compared when a time
+  tolerance is given, and then as `relative` times. Benchmarks or sizes missing
+  from the baseline are not compared.
+
+  Parameters:
+    results (dict): Measurements by size, then by benchmark name.
+    baseline (dict): The stored measurements, same layout.
+    time_tolerance (float): Allowed relative growth of the `relative` time, None to not compare times.
+    memory_tolerance (float): Allowed relative growth of the peak memory.
+
+  Returns:
+    list: A description of each regression.
+  """
+  regressions = []
+  for size, benchmarks in results.items():
+    for name, measured in benchmarks.items():
+      expected = baseline.get(str(size), {}).get(name)
+      if expected is None:
+        continue
+      limits = {
+        'queries': expected['queries'],
+        'peak_memory': expected['peak_memory'] * (1 + memory_tolerance),
+      }
+      if time_tolerance is not None:
+        limits['relative'] = expected['relative'] * (1 + time_tolerance)
+      for metric, limit in limits.items():
+        if measured[metric] > limit:
+          regressions.append(
+            f"{name} ({size} profiles): {metric} {measured[metric]} > {expected[metric]} baseline"
+          )
+  return regressions
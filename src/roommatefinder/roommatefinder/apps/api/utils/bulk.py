@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import io
+import itertools
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import connection, models as db_models, transaction
+from django.db.models import Q
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils.cards import invalidate_cards
+from roommatefinder.apps.api.utils.model_utils import interests_to_mask
+
+try:
+  import pyarrow
+  import pyarrow.parquet
+except ImportError: # pragma: no cover
+  pyarrow = None
+
+
+# Rows validated and written per transaction
+BATCH_SIZE = 5000
+# Row errors kept in an import report, the others are only counted
+MAX_ERRORS = 100
+
+PROFILE_COLUMNS = (
+  "identifier", "name", "age", "sex", "major", "city", "state", "description",
+  "dorm_building", "interests", "graduation_year", "has_account", "otp_verified",
+)
+QUIZ_COLUMNS = (
+  "social_battery", "clean_room", "noise_level", "guest_policy", "in_room",
+  "hot_cold", "bed_time", "wake_up_time", "sharing_policy",
+)
+
+# The exported tables, each column with the lookup it's read from
+EXPORTS = {
+  "profiles": (
+    models.Profile,
+    (("id", "id"), *((column, column) for column in PROFILE_COLUMNS), ("created", "created")),
+  ),
+  "quizzes": (
+    models.RoommateQuiz,
+    (("identifier", "profile__identifier"), *((column, column) for column in QUIZ_COLUMNS)),
+  ),
+  "connections": (
+    models.Connection,
+    (("sender", "sender__identifier"), ("receiver", "receiver__identifier"), ("accepted", "accepted"), ("created", "created")),
+  ),
+}
+
+
+def _batches(rows, size: int):
+  rows = iter(rows)
+  while batch := list(itertools.islice(rows, size)):
+    yield batch
+
+
+def read_rows(path, batch_size: int = BATCH_SIZE):
+  """
+  Stream the rows of a csv, gzipped csv or parquet file.
+
+  Parameters:
+    path (str | Path): The file, its suffix decides the format.
+    batch_size (int): The number of parquet rows decoded at a time.
+
+  Yields:
+    dict: Each row, by column name.
+  """
+  path = str(path)
+  if path.endswith(".parquet"):
+    if pyarrow is None:
+      raise ImproperlyConfigured("Reading parquet files needs pyarrow.")
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+      yield from batch.to_pylist()
+    return
+  opener = gzip.open if path.endswith(".gz") else open
+  with opener(path, "rt", newline="", encoding="utf-8") as file:
+    yield from csv.DictReader(file)
+
+
+def _row_values(model, row: dict, columns) -> dict:
+  """ Convert the non empty columns of a row to python values, missing columns keep the model defaults. """
+  values = {}
+  for column in columns:
+    value = row.get(column)
+    if value is None or value == "":
+      continue
+    field = model._meta.get_field(column)
+    if isinstance(field, db_models.BooleanField) and isinstance(value, str):
+      value = value.strip().lower() in ("t", "true", "1", "yes")
+    values[column] = field.to_python(value)
+  return values
+
+
+def _full_clean(instance, values: dict, required=()):
+  """ Validate the imported values of an instance, the columns left out keep their defaults unchecked. """
+  missing = [column for column in required if column not in values]
+  if missing:
+    raise ValidationError({column: ["This field is required."] for column in missing})
+  exclude = [field.name for field in instance._meta.fields if field.name not in values]
+  instance.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+
+
+def _error_message(error) -> str:
+  if isinstance(error, ValidationError) and hasattr(error, "message_dict"):
+    return "; ".join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+  return " ".join(getattr(error, "messages", [str(error)]))
+
+
+class ImportReport:
+  """
+  Outcome of an import, the first `MAX_ERRORS` row errors are kept.
+
+  Attributes:
+    created (int): Rows written.
+    skipped (int): Valid rows that were already in the database, or repeated in the file.
+    error_count (int): Rows that failed validation.
+    errors (list): `(row number, message)` of the first failed rows, the first data row is 1.
+    profile_ids (list): The profiles whose rows were written, see `refresh_imported`.
+    accepted (list): `(sender, receiver)` ids of the accepted connections written.
+  """
+  def __init__(self):
+    self.created = 0
+    self.skipped = 0
+    self.error_count = 0
+    self.errors = []
+    self.profile_ids = []
+    self.accepted = []
+
+  def error(self, number: int, error):
+    self.error_count += 1
+    if len(self.errors) < MAX_ERRORS:
+      self.errors.append((number, _error_message(error)))
+
+  def as_dict(self) -> dict:
+    return {
+      "created": self.created,
+      "skipped": self.skipped,
+      "error_count": self.error_count,
+      "errors": self.errors,
+      "profile_ids": self.profile_ids,
+      "accepted": self.accepted,
+    }
+
+
+def _validated(rows, build, report: ImportReport, batch_size: int):
+  """ Build and validate rows one batch at a time, yielding the valid instances of each batch. """
+  numbered = enumerate(rows, start=1)
+  for batch in _batches(numbered, batch_size):
+    instances = []
+    for number, row in batch:
+      try:
+        instances.append(build(row))
+      except (ValidationError, ValueError, TypeError) as error:
+        report.error(number, error)
+    yield instances
+
+
+def copy_rows(model, instances):
+  """
+  Write new rows with PostgreSQL `COPY`, the fastest way to load many rows.
+
+  Values are prepared like `bulk_create` prepares them, defaults and
+  `auto_now_add` dates included. Rows must not conflict with existing rows.
+
+  Parameters:
+    model (Type[Model]): The model of the rows.
+    instances (list): The unsaved instances.
+  """
+  # Auto incremented keys are left to the database
+  fields = [field for field in model._meta.concrete_fields if field is not model._meta.auto_field]
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  for instance in instances:
+    row = []
+    for field in fields:
+      value = field.get_db_prep_save(field.pre_save(instance, add=True), connection)
+      row.append("\\N" if value is None else value)
+    writer.writerow(row)
+  buffer.seek(0)
+
+  quote = connection.ops.quote_name
+  columns = ", ".join(quote(field.column) for field in fields)
+  with connection.cursor() as cursor:
+    cursor.copy_expert(
+      f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+    )
+
+
+def insert_rows(model, instances, batch_size: int = 1000):
+  """ Write new rows with `COPY` on PostgreSQL, with batched inserts on other databases. """
+  if not instances:
+    return
+  if connection.vendor == "postgresql":
+    copy_rows(model, instances)
+  else:
+    model.objects.bulk_create(instances, batch_size=batch_size)
+
+
+def build_profile(row: dict) -> models.Profile:
+  """ Build and validate an unsaved profile from an import row, without a usable password. """
+  values = _row_values(models.Profile, row, PROFILE_COLUMNS)
+  profile = models.Profile(password=make_password(None), **values)
+  _full_clean(profile, values, required=("identifier", "sex"))
+  # Neither `save` nor the signals run, the mask is set here
+  profile.interests_mask = interests_to_mask(profile.interests)
+  return profile
+
+
+def import_profiles(path, batch_size: int = BATCH_SIZE) -> dict:
+  """
+  Import profiles, skipping identifiers that already exist.
+
+  Rows are streamed, validated and written one batch per transaction, so
+  memory is bounded by the batch size and a failed import can be run again.
+  No signals are sent, so no otp emails go out during the import, and the
+  swipe decks and cards are brought up to date by `refresh_imported`.
+
+  Parameters:
+    path (str | Path): A csv, gzipped csv or parquet file with the `PROFILE_COLUMNS`.
+    batch_size (int): The number of rows per transaction.
+
+  Returns:
+    dict: The import report, see `ImportReport`.
+  """
+  report = ImportReport()
+  for profiles in _validated(read_rows(path), build_profile, report, batch_size):
+    existing = set(
+      models.Profile.objects.filter(identifier__in=[profile.identifier for profile in profiles])
+      .values_list("identifier", flat=True)
+    )
+    new = {}
+    for profile in profiles:
+      if profile.identifier not in existing:
+        new.setdefault(profile.identifier, profile)
+    with transaction.atomic():
+      insert_rows(models.Profile, list(new.values()))
+    report.created += len(new)
+    report.profile_ids += [profile.id for profile in new.values()]
+    report.skipped += len(profiles) - len(new)
+  return report.as_dict()
+
+
+def import_quizzes(path, batch_size: int = BATCH_SIZE) -> dict:
+  """
+  Import roommate quizzes by profile identifier, replacing the quizzes profiles already have.
+
+  Parameters:
+    path (str | Path): A csv, gzipped csv or parquet file with an `identifier` column and the `QUIZ_COLUMNS`.
+    batch_size (int): The number of rows per transaction.
+
+  Returns:
+    dict: The import report, see `ImportReport`.
+  """
+  report = ImportReport()
+
+  def build(row):
+    values = _row_values(models.RoommateQuiz, row, QUIZ_COLUMNS)
+    quiz = models.RoommateQuiz(**values)
+    _full_clean(quiz, values)
+    quiz.identifier = row.get("identifier")
+    return quiz
+
+  for quizzes in _validated(read_rows(path), build, report, batch_size):
+    profiles = dict(
+      models.Profile.objects.filter(identifier__in=[quiz.identifier for quiz in quizzes])
+      .values_list("identifier", "id")
+    )
+    found = {}
+    for quiz in quizzes:
+      if quiz.identifier in profiles:
+        quiz.profile_id = profiles[quiz.identifier]
+        found[quiz.profile_id] = quiz
+    with transaction.atomic():
+      models.RoommateQuiz.objects.bulk_create(
+        list(found.values()),
+        update_conflicts=True,
+        unique_fields=["profile"],
+        update_fields=[*QUIZ_COLUMNS, "modified"],
+      )
+    report.created += len(found)
+    report.skipped += len(quizzes) - len(found)
+    report.profile_ids += list(found)
+  return report.as_dict()
+
+
+def import_connections(path, batch_size: int = BATCH_SIZE) -> dict:
+  """
+  Import connections between profile identifiers, skipping pairs that are already connected.
+
+  Parameters:
+    path (str | Path): A csv, gzipped csv or parquet file with `sender`, `receiver` and `accepted` columns.
+    batch_size (int): The number of rows per transaction.
+
+  Returns:
+    dict: The import report, see `ImportReport`.
+  """
+  report = ImportReport()
+
+  def build(row):
+    sender, receiver = row.get("sender"), row.get("receiver")
+    if not sender or not receiver or sender == receiver:
+      raise ValidationError("A connection needs two different profiles.")
+    return (sender, receiver, bool(_row_values(models.Connection, row, ("accepted",)).get("accepted")))
+
+  for rows in _validated(read_rows(path), build, report, batch_size):
+    identifiers = {identifier for sender, receiver, _ in rows for identifier in (sender, receiver)}
+    profiles = dict(models.Profile.objects.filter(identifier__in=identifiers).values_list("identifier", "id"))
+    ids = list(profiles.values())
+    connected = {
+      frozenset(pair) for pair in models.Connection.objects.filter(
+        Q(sender__in=ids) | Q(receiver__in=ids)
+      ).values_list("sender", "receiver")
+    }
+    connections = []
+    for sender, receiver, accepted in rows:
+      if sender not in profiles or receiver not in profiles:
+        continue
+      pair = frozenset((profiles[sender], profiles[receiver]))
+      if pair not in connected:
+        connected.add(pair)
+        connections.append(models.Connection(
+          sender_id=profiles[sender], receiver_id=profiles[receiver], accepted=accepted
+        ))
+    with transaction.atomic():
+      insert_rows(models.Connection, connections)
+    report.created += len(connections)
+    report.skipped += len(rows) - len(connections)
+    report.accepted += [
+      (connection.sender_id, connection.receiver_id) for connection in connections if connection.accepted
+    ]
+  return report.as_dict()
+
+
+def refresh_imported(report: dict, batch_size: int = BATCH_SIZE) -> dict:
+  """
+  Do what the skipped signals would have done for the rows of an import.
+
+  The cached cards of the imported profiles and quiz owners are dropped. With
+  the precomputed decks, imported profiles in the eligible pool get their deck
+  built and join every other deck, and profiles connected by an imported
+  accepted connection leave each other's decks. The quiz index picks up
+  imported quizzes on its own, by their modification date.
+
+  Parameters:
+    report (dict): The report of an import, see `ImportReport`.
+    batch_size (int): The number of profiles or pairs handled per query.
+
+  Returns:
+    dict: The number of profiles whose `cards` were dropped, of `decks` built and of connected `pairs` removed.
+  """
+  ids = report["profile_ids"]
+  decks = 0
+  for batch in _batches(ids, batch_size):
+    invalidate_cards(*batch)
+    if settings.SWIPE_RANKING_MODE == "deck":
+      for profile in models.Profile.objects.eligible_pool().filter(id__in=batch):
+        models.DeckEntry.objects.rebuild_deck(profile)
+        decks += 1
+
+  pairs = report["accepted"] if settings.SWIPE_RANKING_MODE == "deck" else []
+  for batch in _batches(pairs, batch_size):
+    either = Q()
+    for sender, receiver in batch:
+      either |= Q(viewer=sender, candidate=receiver) | Q(viewer=receiver, candidate=sender)
+    models.DeckEntry.objects.filter(either).delete()
+  return {"cards": len(ids), "decks": decks, "pairs": len(pairs)}
+
+
+IMPORTS = {
+  "profiles": import_profiles,
+  "quizzes": import_quizzes,
+  "connections": import_connections,
+}
+
+
+def _lookup_field(model, lookup: str):
+  """ The model field a `values_list` lookup reads, following foreign keys. """
+  *relations, name = lookup.split("__")
+  for relation in relations:
+    model = model._meta.get_field(relation).related_model
+  return model._meta.get_field(name)
+
+
+def _arrow_type(field):
+  if isinstance(field, db_models.BooleanField):
+    return pyarrow.bool_()
+  if isinstance(field, db_models.IntegerField):
+    return pyarrow.int64()
+  if isinstance(field, db_models.DateTimeField):
+    return pyarrow.timestamp("us", tz="UTC")
+  return pyarrow.string()
+
+
+def _export_value(value):
+  """ Flatten a value to a csv or parquet cell, interests are comma separated like in imports. """
+  if isinstance(value, (list, tuple)):
+    return ",".join(value)
+  if value is not None and not isinstance(value, (str, int, float, bool)) and not hasattr(value, "isoformat"):
+    return str(value)
+  return value
+
+
+def export_table(kind: str, path, format: str = None, chunk_size: int = BATCH_SIZE) -> int:
+  """
+  Export a table to a columnar parquet file, or a gzipped csv without pyarrow.
+
+  Rows are streamed from the database and written one chunk (a parquet row
+  group) at a time, so memory is bounded by the chunk size.
+
+  Parameters:
+    kind (str): "profiles", "quizzes" or "connections", see `EXPORTS`.
+    path (str | Path): The file to write.
+    format (str): "parquet" or "csv", parquet when pyarrow is installed by default.
+    chunk_size (int): The number of rows read and written at a time.
+
+  Returns:
+    int: The number of rows exported.
+  """
+  model, columns = EXPORTS[kind]
+  format = format or ("parquet" if pyarrow is not None else "csv")
+  names = [name for name, _ in columns]
+  rows = model.objects.order_by("pk").values_list(*(lookup for _, lookup in columns)).iterator(chunk_size=chunk_size)
+
+  count = 0
+  if format == "parquet":
+    if pyarrow is None:
+      raise ImproperlyConfigured("Writing parquet files needs pyarrow.")
+    schema = pyarrow.schema([(name, _arrow_type(_lookup_field(model, lookup))) for name, lookup in columns])
+    with pyarrow.parquet.ParquetWriter(str(path), schema, compression="zstd") as writer:
+      for chunk in _batches(rows, chunk_size):
+        cells = [[_export_value(value) for value in column] for column in zip(*chunk)]
+        writer.write_table(pyarrow.table(dict(zip(names, cells)), schema=schema))
+        count += len(chunk)
+    return count
+
+  with gzip.open(path, "wt", newline="", encoding="utf-8") as file:
+    writer = csv.writer(file)
+    writer.writerow(names)
+    for chunk in _batches(rows, chunk_size):
+      writer.writerows([["" if value is None else _export_value(value) for value in row] for row in chunk])
+      count += len(chunk)
+  return count
+
+
+def export_data(directory, format: str = None, chunk_size: int = BATCH_SIZE) -> dict:
+  """
+  Export profiles, quizzes and the connection graph for analytics.
+
+  Each table is written to `<directory>/<table>.parquet`, or `.csv.gz` without pyarrow.
+  The files can be imported back with `IMPORTS`.
+
+  Parameters:
+    directory (str | Path): The directory to write to, created if missing.
+    format (str): "parquet" or "csv", parquet when pyarrow is installed by default.
+    chunk_size (int): The number of rows read and written at a time.
+
+  Returns:
+    dict: The path and number of rows of each table, by table.
+  """
+  directory = Path(directory)
+  directory.mkdir(parents=True, exist_ok=True)
+  format = format or ("parquet" if pyarrow is not None else "csv")
+  suffix = ".parquet" if format == "parquet" else ".csv.gz"
+  exported = {}
+  for kind in EXPORTS:
+    path = directory / f"{kind}{suffix}"
+    exported[kind] = {"path": str(path), "rows": export_table(kind, path, format=format, chunk_size=chunk_size)}
+  return exported
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.cache import cache
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.serializers import fast_serializers
+
+
+# The cached renderings of a profile, by kind
+CARD_SERIALIZERS = {
+  "swipe": fast_serializers.FastSwipeProfileSerializer,
+  "user": fast_serializers.FastUserSerializer,
+}
+
+
+def card_key(kind: str, profile_id) -> str:
+  return f"profile-card:{kind}:{profile_id}"
+
+
+def get_cards(kind: str, ids) -> list:
+  """
+  Get the rendered cards of profiles, from the cache.
+
+  Cards are stored as encoded JSON, so any cache backend can share them between
+  processes. Missing cards are serialized with one batch of queries and cached
+  for `PROFILE_CARD_TTL` seconds, or until the card invalidation signals drop them.
+  Cards are rendered without a request, their file urls are relative.
+
+  Parameters:
+    kind (str): The kind of card, a key of `CARD_SERIALIZERS`.
+    ids (iterable): The profile ids.
+
+  Returns:
+    list: The cards in the order of `ids`, skipping profiles that don't exist.
+  """
+  ids = [str(id) for id in ids]
+  keys = {id: card_key(kind, id) for id in ids}
+  blobs = cache.get_many(list(keys.values()))
+  missing = [id for id in ids if keys[id] not in blobs]
+  if missing:
+    rendered = {
+      card_key(kind, card["id"]): fast_serializers.dumps(card)
+      for card in CARD_SERIALIZERS[kind]().serialize_ids(missing)
+    }
+    cache.set_many(rendered, timeout=settings.PROFILE_CARD_TTL)
+    blobs.update(rendered)
+  return [fast_serializers.loads(blobs[keys[id]]) for id in ids if keys[id] in blobs]
+
+
+def get_card(kind: str, profile_id):
+  """ Get the rendered card of one profile, None if it doesn't exist. """
+  cards = get_cards(kind, [profile_id])
+  return cards[0] if cards else None
+
+
+def add_relationships(profile_cards: list, user_profile) -> list:
+  """
+  Add the relationship with a viewer and the connection counts to profile cards.
+
+  The cards are shared by every viewer, so these fields are read for the whole
+  page at once with one query, see `Profile.objects.annotate_relationship`.
+
+  Parameters:
+    profile_cards (list): The rendered cards, see `get_cards`.
+    user_profile (Profile): The profile of the viewer.
+
+  Returns:
+    list: New cards with `relationship`, `sent_connections_count` and `received_connections_count`.
+  """
+  if not profile_cards:
+    return []
+  profiles = models.Profile.objects.filter(id__in=[card["id"] for card in profile_cards])
+  relationships = {
+    str(profile["id"]): profile for profile in models.Profile.objects.annotate_relationship(profiles, user_profile).values(
+      "id", "relationship", "sent_connections_count", "received_connections_count"
+    )
+  }
+  return [
+    {**card, **{field: value for field, value in relationships[str(card["id"])].items() if field != "id"}}
+    for card in profile_cards if str(card["id"]) in relationships
+  ]
+
+
+def invalidate_cards(*profile_ids):
+  """ Drop every cached card of the given profiles. """
+  cache.delete_many([card_key(kind, id) for kind in CARD_SERIALIZERS for id in profile_ids])
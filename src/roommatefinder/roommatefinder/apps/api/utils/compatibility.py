@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import time
+import hashlib
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from roommatefinder.apps.api import models
+
+
+# Numeric 0-20 answers of the roommate quiz, scaled to 0-1
+QUIZ_SCALES = ("social_battery", "noise_level", "hot_cold")
+# Free text answers of the roommate quiz, each hashed to a 64 bit code
+QUIZ_ANSWERS = ("clean_room", "guest_policy", "in_room", "bed_time", "wake_up_time", "sharing_policy")
+# Code of an unanswered question
+UNANSWERED = 0
+# Largest possible squared distance, every scale apart and every answer different
+MAX_DISTANCE = len(QUIZ_SCALES) + 2 * len(QUIZ_ANSWERS)
+
+
+def answer_code(answer) -> int:
+  """
+  Hash a normalized quiz answer to a non-zero 64 bit code.
+
+  The answers are free text, so there is no vocabulary to index them by. At 64
+  bits two different answers practically never share a code, unlike a handful
+  of buckets where unrelated answers would compare as equal.
+
+  Parameters:
+    answer: The answer as stored on the quiz.
+
+  Returns:
+    int: The code of the answer, `UNANSWERED` if it is blank.
+  """
+  answer = str(answer or "").strip().lower()
+  if not answer:
+    return UNANSWERED
+  code = int.from_bytes(hashlib.blake2b(answer.encode(), digest_size=8).digest(), "little")
+  return code or 1
+
+
+def encode_quiz(quiz) -> tuple:
+  """
+  Encode a roommate quiz as a pair of fixed-length vectors.
+
+  Scales are divided by 20, answers are normalized and hashed with
+  `answer_code`. Unanswered questions get the `UNANSWERED` code.
+
+  Parameters:
+    quiz (RoommateQuiz | dict): The quiz, or a dict of its field values.
+
+  Returns:
+    tuple: A float32 vector of the `QUIZ_SCALES` and a uint64 vector of the `QUIZ_ANSWERS` codes.
+  """
+  get = quiz.get if isinstance(quiz, dict) else lambda field: getattr(quiz, field)
+  scales = np.array([min(max(get(field) or 0, 0), 20) / 20 for field in QUIZ_SCALES], dtype=np.float32)
+  answers = np.array([answer_code(get(field)) for field in QUIZ_ANSWERS], dtype=np.uint64)
+  return scales, answers
+
+
+def compatibility(distance: float) -> float:
+  """ Turn a squared distance between two quiz vectors into a 0-1 compatibility score. """
+  return round(1 - float(distance) / MAX_DISTANCE, 4)
+
+
+class QuizIndex:
+  """
+  Brute-force nearest-neighbour index over encoded roommate quizzes.
+
+  Scales and answer codes live in two contiguous matrices so a query is a
+  single vectorized distance pass and an `argpartition`, tens of thousands of
+  quizzes take a few milliseconds. The distance is the squared difference of
+  the scales, plus 2 for each question answered differently and 1 for each
+  question only one of the two answered. The index loads every quiz on first
+  use, is updated in place from the `RoommateQuiz` signals, picks up quizzes
+  saved by other processes every `QUIZ_INDEX_SYNC_SECONDS` and drops quizzes
+  they deleted every `QUIZ_INDEX_RECONCILE_SECONDS`.
+  """
+  def __init__(self):
+    self._lock = threading.RLock()
+    self.reset()
+
+  def reset(self):
+    """ Empty the index, it will be loaded again on next use. """
+    with self._lock:
+      self.ids = []
+      self.positions = {}
+      self.scales = np.zeros((0, len(QUIZ_SCALES)), dtype=np.float32)
+      self.answers = np.zeros((0, len(QUIZ_ANSWERS)), dtype=np.uint64)
+      self.loaded = False
+      self.synced_at = None
+      self._checked_at = 0
+      self._reconciled_at = 0
+
+  def __len__(self):
+    return len(self.ids)
+
+  def upsert(self, profile_id, encoded: tuple):
+    """ Add or replace the encoded quiz of a profile, see `encode_quiz`. """
+    profile_id = str(profile_id)
+    with self._lock:
+      position = self.positions.get(profile_id)
+      if position is None:
+        position = len(self.ids)
+        if position == len(self.scales):
+          # Grow the matrices geometrically so appends stay amortized O(1)
+          size = max(2 * position, 64)
+          scales = np.zeros((size, len(QUIZ_SCALES)), dtype=np.float32)
+          answers = np.zeros((size, len(QUIZ_ANSWERS)), dtype=np.uint64)
+          scales[:position], answers[:position] = self.scales[:position], self.answers[:position]
+          self.scales, self.answers = scales, answers
+        self.ids.append(profile_id)
+        self.positions[profile_id] = position
+      self.scales[position], self.answers[position] = encoded
+
+  def remove(self, profile_id):
+    """ Remove a profile's quiz, the last row is moved into its place. """
+    profile_id = str(profile_id)
+    with self._lock:
+      position = self.positions.pop(profile_id, None)
+      if position is None:
+        return
+      last = len(self.ids) - 1
+      if position != last:
+        self.ids[position] = self.ids[last]
+        self.positions[self.ids[position]] = position
+        self.scales[position] = self.scales[last]
+        self.answers[position] = self.answers[last]
+      self.ids.pop()
+
+  def nearest(self, encoded: tuple, k: int, exclude=()):
+    """
+    Find the quizzes closest to an encoded quiz.
+
+    Parameters:
+      encoded (tuple): The encoded quiz to compare against, see `encode_quiz`.
+      k (int): The number of neighbours to return.
+      exclude (iterable): Profile ids to leave out of the results.
+
+    Returns:
+      list: `(profile_id, distance)` tuples, closest first.
+    """
+    exclude = {str(id) for id in exclude}
+    with self._lock:
+      n = len(self.ids)
+      wanted = min(k + len(exclude), n)
+      if wanted <= 0:
+        return []
+      scales, answers = encoded
+      difference = self.scales[:n] - scales
+      distances = np.einsum("ij,ij->i", difference, difference)
+      different = self.answers[:n] != answers
+      one_sided = (self.answers[:n] == UNANSWERED) | (answers == UNANSWERED)
+      distances += (different * (2 - one_sided)).sum(axis=1, dtype=np.float32)
+      positions = np.argpartition(distances, wanted - 1)[:wanted]
+      positions = positions[np.argsort(distances[positions], kind="stable")]
+      results = [(self.ids[p], float(distances[p])) for p in positions]
+    return [(id, distance) for id, distance in results if id not in exclude][:k]
+
+  def sync(self, force: bool = False):
+    """
+    Load every quiz on first use, then only the quizzes modified since the last sync.
+
+    Deletes leave nothing to find by modification time, so every
+    `QUIZ_INDEX_RECONCILE_SECONDS` the indexed ids are also compared with the
+    ids in the database and the quizzes deleted by other processes are removed.
+
+    Parameters:
+      force (bool): Sync and reconcile even if the last ones are more recent than their interval.
+    """
+    with self._lock:
+      now = time.monotonic()
+      if not force and self.loaded and now - self._checked_at < settings.QUIZ_INDEX_SYNC_SECONDS:
+        return
+      started = timezone.now()
+      quizzes = models.RoommateQuiz.objects.all()
+      if self.loaded:
+        quizzes = quizzes.filter(modified__gte=self.synced_at)
+      for quiz in quizzes.values("profile_id", *QUIZ_SCALES, *QUIZ_ANSWERS).iterator(chunk_size=2000):
+        self.upsert(quiz["profile_id"], encode_quiz(quiz))
+      if self.loaded and (force or now - self._reconciled_at >= settings.QUIZ_INDEX_RECONCILE_SECONDS):
+        self.reconcile()
+      elif not self.loaded:
+        self._reconciled_at = now
+      self.loaded = True
+      self.synced_at = started
+      self._checked_at = now
+
+  def reconcile(self):
+    """
+    Remove the quizzes that are no longer in the database.
+
+    Returns:
+      int: The number of quizzes removed.
+    """
+    with self._lock:
+      existing = {
+        str(id) for id in models.RoommateQuiz.objects.values_list("profile_id", flat=True).iterator(chunk_size=10000)
+      }
+      removed = [id for id in self.ids if id not in existing]
+      for id in removed:
+        self.remove(id)
+      self._reconciled_at = time.monotonic()
+    return len(removed)
+
+
+# Process wide index, kept up to date by signals
+quiz_index = QuizIndex()
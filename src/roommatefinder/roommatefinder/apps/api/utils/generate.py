@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import random
+import multiprocessing
+
+from django import db
+from django.contrib.auth.hashers import make_password
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils.model_utils import interests_to_mask
+from roommatefinder.settings._base import POPULAR_CHOICES, DORM_CHOICES
+
+
+# POPULAR_CHOICES is ordered by how often each interest was picked in the sample
+INTEREST_CODES = [code for code, _ in POPULAR_CHOICES]
+INTEREST_WEIGHTS = [1 / (rank + 1) ** 0.8 for rank in range(len(POPULAR_CHOICES))]
+# Most freshmen land in the big halls, few still don't know their dorm
+DORM_CODES = [code for code, _ in DORM_CHOICES]
+DORM_WEIGHTS = [8, 6, 5, 12, 7, 4, 9, 6, 2, 3]
+MAJORS = (
+  ("Undecided", 20), ("Computer Science", 10), ("Business", 9), ("Nursing", 7),
+  ("Psychology", 7), ("Biology", 6), ("Mechanical Engineering", 5), ("Economics", 4),
+  ("Communication", 4), ("Political Science", 3), ("Finance", 3), ("Film", 2),
+)
+STATES = (
+  ("Utah", 60), ("California", 10), ("Idaho", 5), ("Nevada", 4), ("Colorado", 4),
+  ("Arizona", 4), ("Washington", 3), ("Texas", 3), ("Oregon", 2), ("Wyoming", 2),
+)
+# Free text answers of the roommate quiz, users mostly pick from a few common ones
+QUIZ_ANSWERS = {
+  "clean_room": ("Spotless", "Clean enough", "Organized chaos", "Messy"),
+  "guest_policy": ("Anytime", "Weekends", "Ask first", "Rarely"),
+  "in_room": ("Always", "Evenings", "Only to sleep", "Sometimes"),
+  "bed_time": ("Before 10", "10-12", "12-2", "After 2"),
+  "wake_up_time": ("Before 7", "7-9", "9-11", "After 11"),
+  "sharing_policy": ("Share everything", "Ask first", "Food only", "Nothing"),
+}
+# Generated photos point to a few sample image names, no files are written
+SAMPLE_IMAGES = 50
+# Chat messages are stitched from a few common openers and replies
+MESSAGE_PARTS = (
+  ("hey", "hi", "yo", "hello", "ok", "haha", "lol", "sure", "sounds good", "nice"),
+  ("what dorm are you in?", "are you up?", "I'm in", "same", "what time?", "see you there",
+   "do you have a fridge?", "how many guests is too many?", "I'll bring the tv", "let's room together"),
+)
+
+
+def _weighted(rng: random.Random, choices) -> str:
+  values, weights = zip(*choices)
+  return rng.choices(values, weights=weights)[0]
+
+
+def _scale(rng: random.Random) -> int:
+  """ A 0-20 quiz answer, clustered around the middle. """
+  return min(max(round(rng.gauss(10, 4)), 0), 20)
+
+
+def random_interests(rng: random.Random) -> list:
+  """ Pick 0 to 5 distinct interests, popular interests more often. """
+  count = rng.choices(range(6), weights=[1, 2, 3, 4, 5, 10])[0]
+  interests = set()
+  while len(interests) < count:
+    interests.add(rng.choices(INTEREST_CODES, weights=INTEREST_WEIGHTS)[0])
+  return sorted(interests, key=int)
+
+
+def random_profile(rng: random.Random, password: str) -> models.Profile:
+  """
+  Build an unsaved profile with a realistic dorm, major, state and interests.
+
+  Parameters:
+    rng (random.Random): The random generator, seed it for a reproducible population.
+    password (str): An already hashed password, hashing is too slow to repeat per profile.
+
+  Returns:
+    Profile: The unsaved profile.
+  """
+  interests = random_interests(rng)
+  name = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=7)).title()
+  return models.Profile(
+    identifier=f"{name.lower()}.{rng.getrandbits(48):012x}",
+    password=password,
+    name=name,
+    sex=rng.choice("MF"),
+    age=rng.choices((17, 18, 19, 20), weights=(2, 10, 3, 1))[0],
+    major=_weighted(rng, MAJORS),
+    state=_weighted(rng, STATES),
+    dorm_building=rng.choices(DORM_CODES, weights=DORM_WEIGHTS)[0],
+    interests=interests,
+    # bulk_create skips `Profile.save`, so the mask is set here
+    interests_mask=interests_to_mask(interests),
+    graduation_year=rng.choice((2027, 2028, 2029)),
+    has_account=True,
+    otp_verified=True,
+  )
+
+
+def random_quiz(rng: random.Random, profile: models.Profile) -> models.RoommateQuiz:
+  """ Build an unsaved roommate quiz for a profile. """
+  return models.RoommateQuiz(
+    profile=profile,
+    social_battery=_scale(rng),
+    noise_level=_scale(rng),
+    hot_cold=_scale(rng),
+    **{field: rng.choice(answers) for field, answers in QUIZ_ANSWERS.items()}
+  )
+
+
+def generate_profiles(count: int, seed=None, quiz_ratio: float = 0.8, batch_size: int = 1000) -> list:
+  """
+  Create a population of profiles, with a roommate quiz for most of them.
+
+  Rows are written with batched inserts, no per-profile signals are sent.
+
+  Parameters:
+    count (int): The number of profiles to create.
+    seed (int): Seed of the random generator, the same seed gives the same population.
+    quiz_ratio (float): The share of profiles that took the roommate quiz.
+    batch_size (int): The number of rows per insert.
+
+  Returns:
+    list: The ids of the created profiles.
+  """
+  rng = random.Random(seed)
+  password = make_password("123")
+  ids = []
+  for start in range(0, count, batch_size):
+    profiles = [random_profile(rng, password) for _ in range(min(batch_size, count - start))]
+    models.Profile.objects.bulk_create(profiles, batch_size=batch_size)
+    models.RoommateQuiz.objects.bulk_create(
+      [random_quiz(rng, profile) for profile in profiles if rng.random() < quiz_ratio],
+      batch_size=batch_size,
+    )
+    ids.extend(profile.id for profile in profiles)
+  return ids
+
+
+def random_photos(rng: random.Random, profile_id) -> list:
+  """ Build 0 to 4 unsaved photos of a profile, most profiles have a couple. """
+  count = rng.choices(range(5), weights=(2, 4, 5, 3, 2))[0]
+  return [
+    models.Photo(profile_id=profile_id, image=f"generated/photo-{rng.randrange(SAMPLE_IMAGES)}.jpg")
+    for _ in range(count)
+  ]
+
+
+def random_connections(rng: random.Random, position: int, ids: list, count: int, accepted_ratio: float) -> list:
+  """
+  Build unsaved connections from the profile at `position` of `ids`.
+
+  Receivers are picked less than half the population ahead (wrapping around),
+  so a pair of profiles is connected at most once, whoever sent it.
+
+  Parameters:
+    rng (random.Random): The random generator.
+    position (int): The position of the sender in `ids`.
+    ids (list): The ids of the whole population.
+    count (int): The number of connections sent.
+    accepted_ratio (float): The share of accepted connections.
+
+  Returns:
+    list: The unsaved connections.
+  """
+  ahead = (len(ids) - 1) // 2
+  offsets = rng.sample(range(1, ahead + 1), min(count, ahead))
+  return [
+    models.Connection(
+      sender_id=ids[position],
+      receiver_id=ids[(position + offset) % len(ids)],
+      accepted=rng.random() < accepted_ratio,
+    )
+    for offset in offsets
+  ]
+
+
+def random_messages(rng: random.Random, connection: models.Connection, count: int) -> list:
+  """ Build a conversation of `count` unsaved messages between the two profiles of a connection. """
+  speaker = rng.choice((connection.sender_id, connection.receiver_id))
+  messages = []
+  for _ in range(count):
+    # Replies come in bursts from the same side
+    if rng.random() < 0.6:
+      speaker = connection.receiver_id if speaker == connection.sender_id else connection.sender_id
+    messages.append(models.Message(
+      connection=connection,
+      user_id=speaker,
+      text=f"{rng.choice(MESSAGE_PARTS[0])} {rng.choice(MESSAGE_PARTS[1])}",
+    ))
+  return messages
+
+
+# Ids of the generated population, set in each worker before it connects its profiles
+_population = {}
+
+
+def _set_population(ids: list):
+  _population["ids"] = ids
+
+
+def _generate_profiles_chunk(count: int, seed: int, quiz_ratio: float, batch_size: int) -> list:
+  """ Create a chunk of profiles with their quizzes and photos, returns their ids. """
+  ids = generate_profiles(count, seed=seed, quiz_ratio=quiz_ratio, batch_size=batch_size)
+  rng = random.Random(seed + 1)
+  photos = [photo for id in ids for photo in random_photos(rng, id)]
+  models.Photo.objects.bulk_create(photos, batch_size=batch_size)
+  return ids
+
+
+def _generate_connections_chunk(positions, seed: int, connections: int, messages: int,
+                                accepted_ratio: float, batch_size: int) -> tuple:
+  """ Create the connections sent by a chunk of profiles and the conversations of the accepted ones. """
+  rng = random.Random(seed)
+  ids = _population["ids"]
+  sent = []
+  for position in positions:
+    count = min(round(rng.expovariate(2 / connections)) if connections else 0, 4 * connections)
+    sent.extend(random_connections(rng, position, ids, count, accepted_ratio))
+  models.Connection.objects.bulk_create(sent, batch_size=batch_size)
+
+  written = 0
+  conversation = []
+  for connection in sent:
+    if connection.accepted and messages:
+      conversation.extend(random_messages(rng, connection, min(int(rng.expovariate(1 / messages)), 10 * messages)))
+    if len(conversation) >= batch_size:
+      models.Message.objects.bulk_create(conversation, batch_size=batch_size)
+      written += len(conversation)
+      conversation = []
+  models.Message.objects.bulk_create(conversation, batch_size=batch_size)
+  if messages:
+    # Bulk created messages don't go through `record_messages`
+    models.Connection.objects.summarize(
+      models.Connection.objects.filter(id__in=[connection.id for connection in sent if connection.accepted])
+    )
+  return len(sent), written + len(conversation)
+
+
+def _run(processes, function, tasks, initializer=None, initargs=()) -> list:
+  """ Run tasks in process if `processes` is 1, across a pool of forked workers otherwise. """
+  if processes == 1 or len(tasks) <= 1:
+    if initializer is not None:
+      initializer(*initargs)
+    return [function(*task) for task in tasks]
+  # Forked workers must not share the parent's database connection
+  db.connections.close_all()
+  context = multiprocessing.get_context("fork")
+  with context.Pool(processes, initializer=initializer, initargs=initargs) as pool:
+    return pool.starmap(function, tasks)
+
+
+def generate_population(count: int, seed=None, processes=None, chunk_size: int = 10000, connections: int = 4,
+                        messages: int = 20, quiz_ratio: float = 0.8, accepted_ratio: float = 0.6,
+                        batch_size: int = 1000) -> dict:
+  """
+  Create a production-sized population, with quizzes, photos, connections and message histories.
+
+  Profiles are created in chunks by a pool of worker processes, then each worker
+  connects a chunk of them to the rest of the population and writes the
+  conversations of the accepted connections. Every row is written with batched
+  inserts, no signals are sent, so no otp emails and no deck or card updates.
+  Precompute the decks afterwards if `SWIPE_RANKING_MODE` is "deck".
+
+  Parameters:
+    count (int): The number of profiles to create.
+    seed (int): Seed of the random generators, the same seed gives the same population for any `processes`.
+    processes (int): The number of worker processes, every core if None, in process if 1.
+    chunk_size (int): The number of profiles created, or connected, per task.
+    connections (int): The average number of connections of a profile.
+    messages (int): The average number of messages of an accepted connection.
+    quiz_ratio (float): The share of profiles that took the roommate quiz.
+    accepted_ratio (float): The share of accepted connections.
+    batch_size (int): The number of rows per insert.
+
+  Returns:
+    dict: The ids of the created `profiles`, and the number of `connections` and `messages` created.
+  """
+  rng = random.Random(seed)
+  starts = range(0, count, chunk_size)
+  tasks = [(min(chunk_size, count - start), rng.getrandbits(32), quiz_ratio, batch_size) for start in starts]
+  ids = [id for chunk in _run(processes, _generate_profiles_chunk, tasks) for id in chunk]
+
+  tasks = [
+    (range(start, min(start + chunk_size, count)), rng.getrandbits(32), connections, messages, accepted_ratio, batch_size)
+    for start in starts
+  ]
+  written = _run(processes, _generate_connections_chunk, tasks, initializer=_set_population, initargs=(ids,))
+  return {
+    "profiles": ids,
+    "connections": sum(sent for sent, _ in written),
+    "messages": sum(conversation for _, conversation in written),
+  }
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdBlocks:
+  """
+  Primary keys reserved from the database ahead of inserts.
+
+  On PostgreSQL blocks of `MESSAGE_ID_BLOCK` ids are drawn from the table's
+  sequence with one query, so ids stay unique across processes. Other
+  databases have no sequence to draw from, ids continue after the largest id
+  of the table, which is only safe with a single writing process.
+  """
+  def __init__(self, model):
+    self.model = model
+    self._ids = []
+    self._last = 0
+
+  def next(self) -> int:
+    """ Get the next reserved id, reserving a new block when the current one is used up. """
+    if not self._ids:
+      self._ids = self.reserve(settings.MESSAGE_ID_BLOCK)
+    self._last = self._ids.pop(0)
+    return self._last
+
+  def reserve(self, count: int) -> list:
+    meta = self.model._meta
+    if connection.vendor == "postgresql":
+      with connection.cursor() as cursor:
+        cursor.execute(
+          "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+          [meta.db_table, meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+    start = max(self.model.objects.aggregate(last=Max("pk"))["last"] or 0, self._last) + 1
+    return list(range(start, start + count))
+
+
+class MessageBuffer:
+  """
+  Buffer of sent messages waiting to be written with one batched insert.
+
+  Messages get their id and creation time when they are sent, so they can be
+  delivered before they are written. They are flushed once `MESSAGE_BUFFER_SIZE`
+  are pending, or at the latest `MESSAGE_BUFFER_SECONDS` after the first
+  pending one, and on process exit.
+
+  Ids and times are assigned under one lock and batches are written one at a
+  time in the order they were sent, so messages keep their order within a
+  conversation. A batch that fails to write is split in halves until only the
+  messages that can't be written are left. Those are put back ahead of newer
+  messages and retried by the next flush, up to `MESSAGE_FLUSH_ATTEMPTS`
+  times, then logged with their text and dropped. While the database can't be
+  reached at all the batch is put back whole, without counting an attempt.
+
+  The buffer belongs to one process. A `message.list` flushes the messages
+  this process holds for the conversation, but messages another worker
+  accepted may only show up after that worker's next flush, at most
+  `MESSAGE_BUFFER_SECONDS` later. They were already delivered live through
+  the channel layer.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._flush_lock = threading.Lock()
+    self._pending = []
+    self._timer = None
+    self._ids = IdBlocks(models.Message)
+    self._latest = None
+
+  def __len__(self):
+    return len(self._pending)
+
+  def add(self, connection, user, text: str) -> models.Message:
+    """
+    Buffer a message sent in a conversation.
+
+    Parameters:
+      connection (Connection): The conversation.
+      user (Profile): The profile sending the message.
+      text (str): The message.
+
+    Returns:
+      Message: The message, with its id and creation time, not written yet.
+    """
+    with self._lock:
+      # Times never go back within a process, even if the clock does
+      created = timezone.now()
+      if self._latest is not None and created < self._latest:
+        created = self._latest
+      self._latest = created
+      message = models.Message(
+        id=self._ids.next(), connection=connection, user=user, text=text, created=created, modified=created
+      )
+      self._pending.append(message)
+      full = len(self._pending) >= settings.MESSAGE_BUFFER_SIZE
+      if not full:
+        self._start_timer()
+    if full:
+      self.flush()
+    return message
+
+  def pending_for(self, connection_id) -> bool:
+    """ Check if messages of a conversation aren't written yet. """
+    with self._lock:
+      return any(message.connection_id == connection_id for message in self._pending)
+
+  def flush(self) -> int:
+    """
+    Write every pending message with batched inserts, and the summaries of their conversations.
+
+    Returns:
+      int: The number of messages written.
+    """
+    with self._flush_lock:
+      with self._lock:
+        pending, self._pending = self._pending, []
+        if self._timer is not None:
+          self._timer.cancel()
+          self._timer = None
+      if not pending:
+        return 0
+      written, retry = self._write(pending)
+      if retry:
+        with self._lock:
+          self._pending = retry + self._pending
+          self._start_timer()
+      return written
+
+  def _write(self, batch: list) -> tuple:
+    """
+    Write a batch of messages, splitting it when it fails so the other messages still get written.
+
+    Parameters:
+      batch (list): The messages, in the order they were sent.
+
+    Returns:
+      tuple: The number of messages written and the messages to retry.
+    """
+    try:
+      with transaction.atomic():
+        models.Message.objects.bulk_create(batch, batch_size=500)
+        models.Connection.objects.record_messages(batch)
+      return len(batch), []
+    except (OperationalError, InterfaceError):
+      # Nothing can be written, splitting wouldn't help
+      logger.warning("Couldn't write %s buffered messages, retrying", len(batch), exc_info=True)
+      return 0, batch
+    except Exception as error:
+      if len(batch) > 1:
+        middle = len(batch) // 2
+        first, first_retry = self._write(batch[:middle])
+        second, second_retry = self._write(batch[middle:])
+        return first + second, first_retry + second_retry
+      failure = error
+    message = batch[0]
+    message._flush_attempts = getattr(message, "_flush_attempts", 0) + 1
+    if message._flush_attempts < settings.MESSAGE_FLUSH_ATTEMPTS:
+      return 0, [message]
+    logger.error(
+      "Dropped message %s of connection %s from %s after %s failed writes: %r",
+      message.id, message.connection_id, message.user_id, message._flush_attempts, message.text,
+      exc_info=failure,
+    )
+    metrics.incr("messages.dropped")
+    return 0, []
+
+  def _start_timer(self):
+    # Called with the lock held
+    if self._pending and self._timer is None:
+      self._timer = threading.Timer(settings.MESSAGE_BUFFER_SECONDS, self._flush_from_timer)
+      self._timer.daemon = True
+      self._timer.start()
+
+  def _flush_from_timer(self):
+    try:
+      self.flush()
+    finally:
+      # The timer thread has its own database connection
+      connection.close()
+
+
+def send_message(connection, user, text: str) -> models.Message:
+  """
+  Save a message sent in a conversation, and update the conversation's summary.
+
+  With `MESSAGE_WRITE_BEHIND` the message is buffered and written in a later
+  batch, otherwise it is written right away.
+
+  Parameters:
+    connection (Connection): The conversation.
+    user (Profile): The profile sending the message.
+    text (str): The message.
+
+  Returns:
+    Message: The message, with its id and creation time.
+  """
+  if settings.MESSAGE_WRITE_BEHIND:
+    return message_buffer.add(connection, user, text)
+  message = models.Message.objects.create(connection=connection, user=user, text=text)
+  models.Connection.objects.record_messages([message])
+  return message
+
+
+# Process wide buffer, flushed on exit
+message_buffer = MessageBuffer()
+atexit.register(message_buffer.flush)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import Counter
+
+
+class Counters:
+  """
+  Counters of the current process.
+
+  Incrementing is a dict update under a lock, cheap enough for the hottest
+  paths, so counts aren't shared between processes. Each process reports its
+  own, tagged with its pid.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._counts = Counter()
+
+  def incr(self, name: str, amount: int = 1):
+    with self._lock:
+      self._counts[name] += amount
+
+  def get(self, name: str) -> int:
+    with self._lock:
+      return self._counts[name]
+
+  def snapshot(self) -> dict:
+    """ Get the counts of the process, by name. """
+    with self._lock:
+      return {"pid": os.getpid(), "counters": dict(sorted(self._counts.items()))}
+
+  def reset(self):
+    with self._lock:
+      self._counts.clear()
+
+
+# Process wide counters
+counters = Counters()
+incr = counters.incr
@@ -1,5 +1,11 @@
 from rest_framework import serializers
 
+from roommatefinder.settings._base import POPULAR_CHOICES
+
+
+# One bit per interest code, in the order of POPULAR_CHOICES (50 codes fit in 64 bits)
+INTEREST_BITS = {code: 1 << bit for bit, (code, _) in enumerate(POPULAR_CHOICES)}
+
 
 class ChoicesField(serializers.Field):
   """ Custom Choices Field """
@@ -15,4 +21,17 @@ class ChoicesField(serializers.Field):
   def to_internal_value(self, data):
     if data in self._choices:
       return getattr(self._choices, data)
-    raise serializers.ValidationError(["choice not valid"])
\ No newline at end of file
+    raise serializers.ValidationError(["choice not valid"])
+
+
+def interests_to_mask(interests) -> int:
+  """ Pack a list of interest codes into a bitmask, unknown codes are ignored. """
+  mask = 0
+  for interest in interests or []:
+    mask |= INTEREST_BITS.get(interest, 0)
+  return mask
+
+
+def mask_to_interests(mask: int) -> list:
+  """ Unpack a bitmask into its interest codes, in the order of POPULAR_CHOICES. """
+  return [code for code, bit in INTEREST_BITS.items() if mask & bit]
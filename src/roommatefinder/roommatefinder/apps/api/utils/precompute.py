@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+from collections import defaultdict
+
+import numpy as np
+from django import db
+from django.db import transaction
+from django.utils import timezone
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.utils.ranking import ProfileColumns, top_k
+
+
+# Columns and connections of the pool, set in each worker before it scores its viewers
+_pool = {}
+
+
+def _set_pool(columns: ProfileColumns, connected: dict):
+  _pool["columns"] = columns
+  _pool["connected"] = connected
+
+
+def load_pool():
+  """
+  Load the ranking columns of the eligible pool and the accepted connections inside it.
+
+  Returns:
+    tuple: The `ProfileColumns` of the pool, and a dict of each position to the
+    positions it has an accepted connection with.
+  """
+  columns = ProfileColumns.from_queryset(models.Profile.objects.eligible_pool().order_by("id"))
+  positions = {id: position for position, id in enumerate(columns.ids)}
+  connected = defaultdict(list)
+  pairs = models.Connection.objects.filter(accepted=True).values_list("sender", "receiver")
+  for sender, receiver in pairs.iterator(chunk_size=5000):
+    sender, receiver = positions.get(str(sender)), positions.get(str(receiver))
+    if sender is not None and receiver is not None:
+      connected[sender].append(receiver)
+      connected[receiver].append(sender)
+  return columns, dict(connected)
+
+
+def write_decks(viewer_positions, top=None, batch_size: int = 1000) -> int:
+  """
+  Rank and write the decks of a chunk of viewers, replacing their old deck entries.
+
+  Each chunk is written in one transaction, so a viewer never sees a half
+  written deck.
+
+  Parameters:
+    viewer_positions (list): Positions of the viewers in the pool columns.
+    top (int): Only keep the best `top` candidates of each deck, every candidate if None.
+    batch_size (int): The number of rows written per insert.
+
+  Returns:
+    int: The number of deck entries written.
+  """
+  columns, connected = _pool["columns"], _pool["connected"]
+  entries = []
+  for position in viewer_positions:
+    scores = columns.score_position(position)
+    keep = np.ones(len(columns), dtype=bool)
+    keep[position] = False
+    keep[connected.get(position, [])] = False
+    candidates = np.flatnonzero(keep)
+    if top is not None:
+      candidates = candidates[top_k(scores[candidates], columns.ids[candidates], top)]
+    viewer_id = columns.ids[position]
+    entries.extend(
+      models.DeckEntry(viewer_id=viewer_id, candidate_id=columns.ids[candidate], score=int(scores[candidate]))
+      for candidate in candidates
+    )
+
+  viewer_ids = list(columns.ids[viewer_positions])
+  with transaction.atomic():
+    models.DeckEntry.objects.filter(viewer__in=viewer_ids).delete()
+    models.DeckEntry.objects.bulk_create(entries, batch_size=batch_size)
+    models.Profile.objects.filter(id__in=viewer_ids).update(deck_built=timezone.now())
+  return len(entries)
+
+
+def precompute_decks(processes=None, chunk_size: int = 100, top=None, batch_size: int = 1000) -> dict:
+  """
+  Precompute the ranked deck of every profile in the eligible pool.
+
+  The pool is loaded once, viewers are split into chunks and the chunks are
+  ranked and written by a pool of worker processes, each with its own
+  database connection. Deck entries of profiles that left the pool are removed.
+
+  Parameters:
+    processes (int): The number of worker processes, every core if None, in process if 1.
+    chunk_size (int): The number of viewers ranked and written per task.
+    top (int): Only keep the best `top` candidates of each deck, every candidate if None.
+    batch_size (int): The number of rows written per insert.
+
+  Returns:
+    dict: The number of `viewers` ranked and of deck `entries` written.
+  """
+  columns, connected = load_pool()
+  positions = np.arange(len(columns))
+  chunks = [positions[start:start + chunk_size] for start in range(0, len(positions), chunk_size)]
+
+  if processes == 1 or len(chunks) <= 1:
+    _set_pool(columns, connected)
+    written = sum(write_decks(chunk, top, batch_size) for chunk in chunks)
+  else:
+    # Forked workers must not share the parent's database connection
+    db.connections.close_all()
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes, initializer=_set_pool, initargs=(columns, connected)) as pool:
+      written = sum(pool.starmap(write_decks, [(chunk, top, batch_size) for chunk in chunks]))
+
+  eligible = models.Profile.objects.eligible_pool().values("id")
+  models.DeckEntry.objects.exclude(viewer__in=eligible).delete()
+  models.DeckEntry.objects.exclude(candidate__in=eligible).delete()
+  return {"viewers": len(columns), "entries": written}
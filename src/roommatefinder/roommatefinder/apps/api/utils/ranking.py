@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+import heapq
+
+import numpy as np
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+  """
+  Count the set bits of every value in an array of 64-bit masks.
+
+  Parameters:
+    values (np.ndarray): An array of uint64 masks.
+
+  Returns:
+    np.ndarray: The number of set bits of each mask.
+  """
+  values = np.ascontiguousarray(values, dtype=np.uint64)
+  if hasattr(np, "bitwise_count"):
+    return np.bitwise_count(values).astype(np.int64)
+  # numpy < 2.0, count the bits of each byte with a lookup table
+  table = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+  return table[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def _factorize(values, vocabulary: dict) -> np.ndarray:
+  """ Encode a column of values as integer codes, growing the vocabulary as needed. """
+  return np.fromiter(
+    (vocabulary.setdefault(value, len(vocabulary)) for value in values),
+    dtype=np.int32,
+    count=len(values),
+  )
+
+
+def top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> np.ndarray:
+  """
+  Get the positions of the k best scores, ordered by score descending, then id.
+
+  `argpartition` finds the k-th best score in linear time, only the candidates
+  at or above it are sorted. Ties on the k-th score are broken by id, so the
+  result is the same as fully sorting and slicing.
+
+  Parameters:
+    scores (np.ndarray): The score of each candidate.
+    ids (np.ndarray): The id of each candidate, used to break ties.
+    k (int): The number of positions to return.
+
+  Returns:
+    np.ndarray: The positions of the best candidates, best first.
+  """
+  if k <= 0 or not len(scores):
+    return np.empty(0, dtype=np.intp)
+  if k < len(scores):
+    threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    positions = np.flatnonzero(scores >= threshold)
+  else:
+    positions = np.arange(len(scores))
+  order = np.lexsort((ids[positions], -scores[positions]))
+  return positions[order][:k]
+
+
+class ProfileColumns:
+  """
+  Columnar arrays of the ranking fields of a set of profiles.
+
+  Dorm, major and state are encoded as integer codes and interests as 64-bit
+  masks, so scoring a user against every profile is a handful of vectorized
+  comparisons and a popcount, without building any ORM objects.
+
+  Attributes:
+    ids (np.ndarray): Profile ids as strings, sorts like the database sorts UUIDs.
+    dorms, majors, states (np.ndarray): Integer codes of each column.
+    masks (np.ndarray): Interest bitmasks.
+  """
+  FIELDS = ("id", "dorm_building", "major", "state", "interests_mask")
+
+  def __init__(self, rows):
+    self._vocabulary = {}
+    rows = list(rows)
+    ids, dorms, majors, states, masks = zip(*rows) if rows else ((),) * 5
+    self.ids = np.array([str(id) for id in ids], dtype=str)
+    self.dorms = _factorize(dorms, self._vocabulary)
+    self.majors = _factorize(majors, self._vocabulary)
+    self.states = _factorize(states, self._vocabulary)
+    self.masks = np.array(masks, dtype=np.uint64)
+
+  @classmethod
+  def from_queryset(cls, queryset):
+    """ Load the columns of every profile in a queryset. """
+    return cls(queryset.values_list(*cls.FIELDS))
+
+  def __len__(self):
+    return len(self.ids)
+
+  def exclude(self, ids):
+    """ Drop the profiles with the given ids from the columns. """
+    if not ids:
+      return
+    keep = ~np.isin(self.ids, [str(id) for id in ids])
+    self.ids = self.ids[keep]
+    self.dorms = self.dorms[keep]
+    self.majors = self.majors[keep]
+    self.states = self.states[keep]
+    self.masks = self.masks[keep]
+
+  def _code(self, value) -> int:
+    return self._vocabulary.get(value, -1)
+
+  def score(self, user_profile) -> np.ndarray:
+    """
+    Score every profile for a user, packed the same way as `deck_score`.
+
+    Parameters:
+      user_profile (Profile): The profile of the current user.
+
+    Returns:
+      np.ndarray: The score of each profile.
+    """
+    return self._score(
+      self._code(user_profile.dorm_building),
+      self._code(user_profile.major),
+      self._code(user_profile.state),
+      user_profile.interests_mask,
+    )
+
+  def score_position(self, position: int) -> np.ndarray:
+    """ Score every profile for the profile at a position of the columns. """
+    return self._score(
+      self.dorms[position], self.majors[position], self.states[position], self.masks[position]
+    )
+
+  def _score(self, dorm, major, state, mask) -> np.ndarray:
+    dorm_match = self.dorms == dorm
+    common_interests = popcount(self.masks & np.uint64(mask))
+    major_match = self.majors == major
+    state_promotion = self.states != state
+    return (
+      dorm_match * 10000 + common_interests * 100 + major_match * 10 + state_promotion
+    ).astype(np.int64)
+
+
+class VectorizedRanking:
+  """
+  Lazily ranked profiles, ranked with NumPy when they are sliced.
+
+  Behaves like a sequence so it can be handed straight to a paginator: the
+  length is the number of candidates and slicing `[start:stop]` only ranks the
+  top `stop` candidates and only builds ORM objects for the requested rows.
+
+  Parameters:
+    user_profile (Profile): The profile of the current user.
+    queryset (QuerySet): The candidate profiles.
+    exclude (iterable): Ids of candidates to leave out.
+  """
+  def __init__(self, user_profile, queryset, exclude=()):
+    self.queryset = queryset
+    self.columns = ProfileColumns.from_queryset(queryset)
+    self.columns.exclude(exclude)
+    self.scores = self.columns.score(user_profile)
+
+  def __len__(self):
+    return len(self.columns)
+
+  def __getitem__(self, index):
+    if isinstance(index, int):
+      if index < 0:
+        index += len(self)
+      return self[index:index + 1][0]
+    start, stop, _ = index.indices(len(self))
+    positions = top_k(self.scores, self.columns.ids, stop)[start:]
+    ids = self.columns.ids[positions]
+    profiles = self.queryset.model.objects.in_bulk(list(ids))
+    return [profiles[id] for id in map(self.queryset.model._meta.pk.to_python, ids)]
+
+
+class LazyRanking:
+  """
+  Lazily ranked profiles, streamed from the database when they are sliced.
+
+  Like `VectorizedRanking` this is a sequence a paginator can slice, but no
+  columns are loaded up front: slicing `[start:stop]` streams the candidates
+  in chunks and keeps only the best `stop` of them in a bounded heap, so memory
+  is O(stop) whatever the size of the pool. Only the requested rows become ORM
+  objects.
+
+  Parameters:
+    user_profile (Profile): The profile of the current user.
+    queryset (QuerySet): The candidate profiles.
+    chunk_size (int): The number of rows fetched from the database at a time.
+  """
+  def __init__(self, user_profile, queryset, chunk_size: int = 2000):
+    self.user_profile = user_profile
+    self.queryset = queryset
+    self.chunk_size = chunk_size
+    self._count = None
+
+  def __len__(self):
+    if self._count is None:
+      self._count = self.queryset.count()
+    return self._count
+
+  def count(self):
+    return len(self)
+
+  def score(self, row) -> int:
+    """ Score a `ProfileColumns.FIELDS` row for the user, packed the same way as `deck_score`. """
+    _, dorm_building, major, state, mask = row
+    user = self.user_profile
+    return (
+      (dorm_building == user.dorm_building) * 10000
+      + bin(mask & user.interests_mask).count("1") * 100
+      + (major == user.major) * 10
+      + (state != user.state)
+    )
+
+  def top(self, k: int) -> list:
+    """
+    Get the ids of the best `k` candidates, best first, ties broken by id.
+
+    Parameters:
+      k (int): The number of candidates to keep.
+
+    Returns:
+      list: The candidate ids.
+    """
+    if k <= 0:
+      return []
+    rows = self.queryset.values_list(*ProfileColumns.FIELDS).iterator(chunk_size=self.chunk_size)
+    # nsmallest keeps a heap of at most k entries while it consumes the stream
+    best = heapq.nsmallest(k, ((-self.score(row), str(row[0])) for row in rows))
+    return [id for _, id in best]
+
+  def __getitem__(self, index):
+    if isinstance(index, int):
+      if index < 0:
+        index += len(self)
+      return self[index:index + 1][0]
+    start, stop = index.start or 0, index.stop
+    if stop is None or start < 0 or stop < 0:
+      start, stop, _ = index.indices(len(self))
+    ids = self.top(stop)[start:]
+    model = self.queryset.model
+    profiles = model.objects.in_bulk(ids)
+    return [profiles[id] for id in map(model._meta.pk.to_python, ids) if id in profiles]
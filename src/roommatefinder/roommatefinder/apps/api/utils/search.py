@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from roommatefinder.apps.api import models
+from roommatefinder.apps.api.serializers.extra_serializers import connection_status
+
+
+def search_key(user_id, query: str) -> str:
+  # Queries are hashed, they can hold characters that aren't valid in cache keys
+  return f"search:{user_id}:{hashlib.md5(query.upper().encode()).hexdigest()}"
+
+
+def search_profiles(user, query: str) -> list:
+  """
+  Search profiles by the start of their name or identifier, case insensitively.
+
+  Names and identifiers are scanned separately on the `UPPER()` pattern
+  indexes of `Profile`, each scan stops at `SEARCH_RESULT_LIMIT` profiles, so
+  a search costs the same however many profiles match. The connection status
+  of the results is read with one query over them. Results are cached per user
+  and query for `SEARCH_CACHE_TTL` seconds, typing the same prefix again
+  doesn't query.
+
+  Parameters:
+    user (Profile): The profile searching.
+    query (str): The start of a name or identifier.
+
+  Returns:
+    list: `(id, status)` pairs of the matching profiles, name matches first, the ids as strings.
+  """
+  query = query or ""
+  key = search_key(user.id, query)
+  results = cache.get(key)
+  if results is not None:
+    return results
+
+  limit = settings.SEARCH_RESULT_LIMIT
+  # One bounded scan per index, instead of an OR that matches every profile with the prefix first
+  ids = []
+  for lookup in ("name__istartswith", "identifier__istartswith"):
+    if len(ids) >= limit:
+      break
+    matches = models.Profile.objects.filter(**{lookup: query}).exclude(id=user.id).values_list("id", flat=True)
+    ids.extend(id for id in matches[:limit] if id not in ids)
+  ids = ids[:limit]
+  # The connections between the user and the results, in one pass
+  statuses = {id: {} for id in ids}
+  connections = models.Connection.objects.filter(
+    Q(sender=user, receiver__in=ids) | Q(receiver=user, sender__in=ids)
+  ).values_list("sender_id", "receiver_id", "accepted")
+  for sender_id, receiver_id, accepted in connections:
+    if accepted:
+      statuses[receiver_id if sender_id == user.id else sender_id]["connected"] = True
+    elif sender_id == user.id:
+      statuses[receiver_id]["pending_them"] = True
+    else:
+      statuses[sender_id]["pending_me"] = True
+
+  results = [
+    (str(id), connection_status(status.get("pending_them"), status.get("pending_me"), status.get("connected")))
+    for id, status in statuses.items()
+  ]
+  cache.set(key, results, timeout=settings.SEARCH_CACHE_TTL)
+  return results
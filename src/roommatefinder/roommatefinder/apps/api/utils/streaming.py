@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from roommatefinder.apps.api.serializers import fast_serializers
+
+
+# Rows read from the database and serialized at a time while streaming
+STREAM_CHUNK_SIZE = 1000
+
+
+def wants_stream(request) -> bool:
+  """ Whether a listing was requested as a stream, with `?stream=true`. """
+  return request.query_params.get("stream", "").lower() in ("true", "1")
+
+
+def stream_ndjson(serializer, queryset, chunk_size: int = STREAM_CHUNK_SIZE) -> StreamingHttpResponse:
+  """
+  Stream a queryset as newline-delimited JSON, one serialized row per line.
+
+  The rows are read and encoded one chunk at a time while the response is sent,
+  so memory stays flat and the first rows go out before the table is read whole.
+  The response iterates asynchronously, each chunk is read in `sync_to_async`,
+  so under ASGI the event loop isn't held while the database is read. There is
+  no count, clients count the lines.
+
+  Parameters:
+    serializer (FastSerializer): The fast serializer of the rows.
+    queryset (QuerySet): The rows to stream.
+    chunk_size (int): The number of rows read and encoded at a time.
+
+  Returns:
+    StreamingHttpResponse: An `application/x-ndjson` response.
+  """
+  chunks = serializer.iter_queryset(queryset, chunk_size=chunk_size)
+
+  def next_chunk():
+    chunk = next(chunks, None)
+    return None if chunk is None else b"".join(fast_serializers.dumps(row) + b"\n" for row in chunk)
+
+  async def lines():
+    try:
+      while True:
+        chunk = await sync_to_async(next_chunk)()
+        if chunk is None:
+          break
+        yield chunk
+    finally:
+      # Closes the database cursor when the client goes away mid stream
+      await sync_to_async(chunks.close)()
+
+  return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import atexit
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from roommatefinder.apps.api import models
+
+
+# Number of the most recent batches of unwritten swipes read from a profile's overlay
+PENDING_SLOTS = 32
+
+
+def pending_key(swiper_id) -> str:
+  return f"swipes-pending:{swiper_id}"
+
+
+class SwipeBuffer:
+  """
+  Buffer of swipes waiting to be written with one batched insert.
+
+  Swipes are flushed once `SWIPE_BUFFER_SIZE` are pending, or at the latest
+  `SWIPE_BUFFER_SECONDS` after the first pending one, and the swipes of a
+  profile are flushed before its deck is read. The exit hook only catches what
+  a clean shutdown leaves behind within that window. Swiping the same profile
+  again before a flush only keeps the last direction. Swipes are also added to
+  the shared overlay of unwritten swipes, see `mark_pending`, so decks served
+  by other workers leave them out before they are written.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._pending = {}
+    self._timer = None
+
+  def __len__(self):
+    return len(self._pending)
+
+  def add(self, swiper_id, swiped_ids, direction: str):
+    """
+    Buffer the swipes of one profile, in one direction.
+
+    Parameters:
+      swiper_id (UUID | str): The profile swiping.
+      swiped_ids (iterable): The profiles swiped on.
+      direction (str): "L" or "R".
+    """
+    swiped_ids = [str(id) for id in swiped_ids]
+    with self._lock:
+      for swiped_id in swiped_ids:
+        self._pending[(str(swiper_id), swiped_id)] = direction
+      full = len(self._pending) >= settings.SWIPE_BUFFER_SIZE
+      if not full and self._pending and self._timer is None:
+        self._timer = threading.Timer(settings.SWIPE_BUFFER_SECONDS, self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer.start()
+    mark_pending(swiper_id, swiped_ids)
+    if full:
+      self.flush()
+
+  def flush(self, swiper_id=None) -> int:
+    """
+    Write pending swipes with batched inserts.
+
+    Parameters:
+      swiper_id (UUID | str): Only write the swipes of this profile, every pending swipe by default.
+
+    Returns:
+      int: The number of swipes written.
+    """
+    with self._lock:
+      if swiper_id is None:
+        pending, self._pending = self._pending, {}
+      else:
+        swiper_id = str(swiper_id)
+        pending = {key: direction for key, direction in self._pending.items() if key[0] == swiper_id}
+        for key in pending:
+          del self._pending[key]
+      if not self._pending and self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+    if not pending:
+      return 0
+    models.Swipe.objects.bulk_create(
+      [
+        models.Swipe(swiper_id=swiper, swiped_id=swiped, direction=direction)
+        for (swiper, swiped), direction in pending.items()
+      ],
+      batch_size=500,
+      update_conflicts=True,
+      unique_fields=["swiper", "swiped"],
+      update_fields=["direction", "modified"],
+    )
+    return len(pending)
+
+  def _flush_from_timer(self):
+    try:
+      self.flush()
+    finally:
+      # The timer thread has its own database connection
+      connection.close()
+
+
+def mark_pending(swiper_id, swiped_ids):
+  """
+  Add a batch of unwritten swipes to the shared overlay of a profile.
+
+  Each batch gets its own cache entry, numbered with an atomic `incr` of the
+  profile's counter, so batches buffered at the same time by different
+  workers never overwrite each other. Entries expire after `SWIPE_PENDING_TTL`,
+  long after the buffers have written them.
+
+  Parameters:
+    swiper_id (UUID | str): The profile swiping.
+    swiped_ids (iterable): The profiles swiped on.
+  """
+  key = pending_key(swiper_id)
+  try:
+    slot = cache.incr(key)
+  except ValueError:
+    cache.add(key, 0, timeout=settings.SWIPE_PENDING_TTL)
+    slot = cache.incr(key)
+  cache.set(f"{key}:{slot}", [str(id) for id in swiped_ids], timeout=settings.SWIPE_PENDING_TTL)
+  cache.touch(key, timeout=settings.SWIPE_PENDING_TTL)
+
+
+def pending_ids(swiper_id) -> set:
+  """
+  Get the ids a profile recently swiped on, that might not be written yet.
+
+  Only the last `PENDING_SLOTS` batches are read, older ones have been
+  written well before they could be pushed out.
+
+  Parameters:
+    swiper_id (UUID | str): The profile swiping.
+
+  Returns:
+    set: The swiped profile ids as strings.
+  """
+  key = pending_key(swiper_id)
+  slot = cache.get(key)
+  if not slot:
+    return set()
+  slots = cache.get_many([f"{key}:{n}" for n in range(max(slot - PENDING_SLOTS, 0) + 1, slot + 1)])
+  return {id for ids in slots.values() for id in ids}
+
+
+def record_swipes(swiper, swipes) -> int:
+  """
+  Validate and buffer the swipes of a profile.
+
+  Swipes on the swiper themself or on profiles that don't exist are dropped,
+  so a bad id can't fail the batched insert of everyone else's swipes.
+
+  Parameters:
+    swiper (Profile): The profile swiping.
+    swipes (list): Dicts with the swiped profile `id` and the `direction`.
+
+  Returns:
+    int: The number of swipes buffered.
+  """
+  ids = {str(swipe["id"]) for swipe in swipes} - {str(swiper.id)}
+  existing = {str(id) for id in models.Profile.objects.filter(id__in=ids).values_list("id", flat=True)}
+  recorded = 0
+  for direction, _ in models.Swipe.DIRECTION_CHOICES:
+    swiped_ids = [
+      str(swipe["id"]) for swipe in swipes
+      if swipe["direction"] == direction and str(swipe["id"]) in existing
+    ]
+    if swiped_ids:
+      swipe_buffer.add(swiper.id, swiped_ids, direction)
+      recorded += len(swiped_ids)
+  return recorded
+
+
+# Process wide buffer, also flushed on a clean exit
+swipe_buffer = SwipeBuffer()
+atexit.register(swipe_buffer.flush)
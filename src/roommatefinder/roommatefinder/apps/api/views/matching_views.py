@@ -2,6 +2,7 @@
 from typing import Optional
 
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -9,7 +10,9 @@ from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.request import Request
 
 from roommatefinder.apps.api import models
-from roommatefinder.apps.api.serializers import matching_serializers
+from roommatefinder.apps.api.serializers import fast_serializers, matching_serializers, profile_serializers
+from roommatefinder.apps.api.utils import streaming
+from roommatefinder.apps.api.utils.compatibility import quiz_index, encode_quiz, compatibility
 
 
 class RoommateQuizViewSet(ModelViewSet):
@@ -38,17 +41,24 @@ class RoommateQuizViewSet(ModelViewSet):
 
     Returns:
       Response: A Response object containing the profile data or an unauthorized error message.
+        With `?stream=true`, a newline-delimited JSON stream of the quizzes instead.
     """
      # Check if the user is a superuser
     if not request.user.is_superuser:
       return Response({"detail": "Unauthorized access"}, status=status.HTTP_403_FORBIDDEN)
+
+    if streaming.wants_stream(request):
+      return streaming.stream_ndjson(
+        fast_serializers.FastRoommateQuizSerializer(), self.queryset.order_by("profile")
+      )
     
     serializer = matching_serializers.RoommateQuizSerializer(self.queryset, many=True)
+    quizzes = serializer.data
     # Prepare the response data
     response_data = {
       "message": "Hello admin.",
-      "profile_count": self.queryset.count(),
-      "profiles": serializer.data
+      "profile_count": len(quizzes),
+      "profiles": quizzes
     }
     return Response(response_data, status=status.HTTP_200_OK)
 
@@ -173,4 +183,52 @@ class RoommateQuizViewSet(ModelViewSet):
     return Response(
       {"detail": f"Matching Quiz: {pk} deleted successfully."}, 
       status=status.HTTP_200_OKs
-    )
\ No newline at end of file
+    )
+
+
+  @action(detail=False, methods=["get"], url_path=r"actions/compatible-profiles", url_name="compatible-profiles")
+  def compatible_profiles(self, request: Request) -> Response:
+    """
+    Get the profiles whose roommate quiz answers are closest to the user's.
+
+    Quizzes are encoded as fixed-length vectors and looked up in an in-memory
+    nearest-neighbour index, see `utils/compatibility.py`.
+
+    Parameters:
+      request (Request): The incoming HTTP request, with an optional `k` query parameter (max 50).
+
+    Returns:
+      Response:
+        - On success: Returns the `k` most compatible profiles with their compatibility score, 200 OK status.
+        - On failure: Returns an error message with a 400 Bad Request status if the user hasn't taken the quiz.
+    """
+    try:
+      k = min(max(int(request.query_params.get("k", 10)), 1), 50)
+    except ValueError:
+      return Response({"k": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+      quiz = self.queryset.get(profile=request.user)
+    except ObjectDoesNotExist:
+      return Response(
+        {"detail": f"Profile: {request.user.id} needs to take the roommate quiz first."},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+
+    quiz_index.sync()
+    # Over-fetch, some neighbours might not have an account set up
+    neighbours = quiz_index.nearest(encode_quiz(quiz), 2 * k, exclude=[request.user.id])
+    profiles = models.Profile.objects.filter(
+      id__in=[id for id, _ in neighbours], has_account=True
+    ).in_bulk()
+
+    compatible = []
+    for id, distance in neighbours:
+      profile = profiles.get(models.Profile._meta.pk.to_python(id))
+      if profile is not None:
+        compatible.append((profile, compatibility(distance)))
+    compatible = compatible[:k]
+    # Serialize them together so the serializer's prefetch plan covers every profile
+    serialized = profile_serializers.SwipeProfileSerializer([profile for profile, _ in compatible], many=True).data
+    results = [{**data, "compatibility": score} for data, (_, score) in zip(serialized, compatible)]
+    return Response({"results": results}, status=status.HTTP_200_OK)
@@ -9,10 +9,11 @@ from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework.request import Request
 from django.contrib.auth.hashers import make_password
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 
 from roommatefinder.apps.api import models, pagination
-from roommatefinder.apps.api.serializers import profile_serializers, swipe_serializers
+from roommatefinder.apps.api.serializers import profile_serializers, swipe_serializers, fast_serializers
+from roommatefinder.apps.api.utils import cards, streaming
 
 
 class ProfileViewSet(ModelViewSet):
@@ -43,6 +44,42 @@ class ProfileViewSet(ModelViewSet):
     if self.action in ALLOW_ANY:
       return [AllowAny()]
     return [permission() for permission in self.permission_classes]
+
+
+  def get_serializer_class(self):
+    """
+    Only the responses that authenticate the user carry a token pair.
+
+    Returns:
+      Type[Serializer]: `AuthProfileSerializer` for sign up, otp verification and password creation.
+    """
+    AUTH = ["create", "verify_otp", "create_password"]
+    if self.action in AUTH:
+      return profile_serializers.AuthProfileSerializer
+    return super().get_serializer_class()
+
+
+  def get_renderers(self):
+    """
+    Render the read-only hot paths, built by the fast serializers, with the fast JSON encoder.
+
+    Returns:
+      list: A list of renderer instances based on the action.
+    """
+    FAST = ["retrieve", "swipe_profiles", "swipe_profile"]
+    if self.action in FAST:
+      return [fast_serializers.FastJSONRenderer()]
+    return super().get_renderers()
+
+
+  def get_queryset(self):
+    """
+    Get the profiles with the prefetch plan of the serializer, see `serializers/prefetch.py`.
+
+    Returns:
+      QuerySet: The profiles, with their related objects fetched in a constant number of queries.
+    """
+    return self.get_serializer_class().setup_queryset(super().get_queryset())
   
 
   def list(self, request: Request) -> Response:
@@ -54,18 +91,25 @@ class ProfileViewSet(ModelViewSet):
 
     Returns:
       Response: A Response object with user data serialized with BaseProfileSerializer.  
+        With `?stream=true`, a newline-delimited JSON stream of the profiles instead.
     """
     # Check if the user is a superuser
     if not request.user.is_superuser:
       return Response({"detail": "Unauthorized access"}, status=status.HTTP_403_FORBIDDEN)
+
+    if streaming.wants_stream(request):
+      return streaming.stream_ndjson(
+        fast_serializers.FastBaseProfileSerializer(request=request), self.queryset.order_by("id")
+      )
     
-    serializer = self.get_serializer(self.queryset, many=True)
+    serializer = self.get_serializer(self.get_queryset(), many=True)
+    profiles = serializer.data
 
     return Response(
       {
         "message": "Hello admin.",
-        "profile_count": self.queryset.count(),
-        "profiles": serializer.data,
+        "profile_count": len(profiles),
+        "profiles": profiles,
       },
       status=status.HTTP_200_OK
     )
@@ -159,7 +203,7 @@ class ProfileViewSet(ModelViewSet):
 
     try:
       # 8/2/24 : changed unnecessary query 
-      profile = self.queryset.get(id=user.id)
+      profile = self.get_queryset().get(id=user.id)
     except models.Profile.DoesNotExist:
       return Response({"detail": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
     
@@ -218,7 +262,7 @@ class ProfileViewSet(ModelViewSet):
 
     try:
       # Get profile out of the queryset
-      profile = self.queryset.get(id=user.id)
+      profile = self.get_queryset().get(id=user.id)
       # Ensure user is otp verified before creating their password.
       if not profile.otp_verified:
         return Response(
@@ -256,15 +300,17 @@ class ProfileViewSet(ModelViewSet):
         - On success: Returns the profile data serialized with a 200 OK status.
         - On failure: Returns an error message with a 400 Bad Request status if the profile does not exist.
     """
+    # Read-only, serialized from rows with the fast `BaseProfileSerializer`
     try:
-      profile = self.queryset.get(pk=pk)
-    except ObjectDoesNotExist:
+      data = fast_serializers.FastBaseProfileSerializer(request=request).serialize_ids([pk])
+    except (ValueError, ValidationError):
+      data = []
+    if not data:
       return Response(
         {"detail": f"Profile: {pk} doesn't exist."}, 
         status=status.HTTP_400_BAD_REQUEST
       )
-    serializer = self.get_serializer(profile, many=False)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(data[0], status=status.HTTP_200_OK)
   
 
   def update(self, request: Request, pk: Optional[int] = None) -> Response:
@@ -288,7 +334,7 @@ class ProfileViewSet(ModelViewSet):
     field_serializer = profile_serializers.UpdateProfileSerializer(data=request.data, many=False)
     if field_serializer.is_valid(raise_exception=True):
       try:
-        profile = self.queryset.get(pk=pk)
+        profile = self.get_queryset().get(pk=pk)
       except ObjectDoesNotExist:
         return Response({"detail": f"Profile: {pk} doesn't exist."}, status=status.HTTP_400_BAD_REQUEST)
       # Update fields if they are present in the request data
@@ -385,7 +431,9 @@ class ProfileViewSet(ModelViewSet):
     
     It filters out profiles 
     that the user has already connected with or that are excluded by the current swiping algorithm. 
-    The results are paginated for efficient handling.
+    The first request ranks the deck once and returns a `next` link with an opaque deck cursor,
+    later pages are served from a short-lived snapshot of that ranking. Requests with a `page`
+    parameter are paginated by page number instead.
 
     Parameters:
       request (Request): The HTTP request object that includes the parameters for filtering and pagination.
@@ -395,13 +443,16 @@ class ProfileViewSet(ModelViewSet):
         - On success: Returns a paginated list of profiles that the user can swipe on.
         - On failure: Returns an error message with a 400 Bad Request status if an error occurs.
     """
-    profiles = models.Profile.objects.rank_profiles(user_profile=request.user)
-    # Apply pagination
-    paginator = pagination.StandardResultsSetPagination()
-    paginated_profiles = paginator.paginate_queryset(profiles, request, view=self)
-    # Serialize the paginated profiles
-    serializer = profile_serializers.SwipeProfileSerializer(paginated_profiles, many=True)
-    return paginator.get_paginated_response(serializer.data)
+    # Apply pagination, only ranks when a new deck snapshot is needed
+    paginator = pagination.DeckSnapshotPagination()
+    # The page is assembled from the cached swipe cards of its profiles, plus their relationship with the user
+    serialized_profiles = paginator.paginate_deck(
+      lambda: models.Profile.objects.swipe_deck(user_profile=request.user),
+      request,
+      view=self,
+      load=lambda ids: cards.add_relationships(cards.get_cards("swipe", ids), request.user),
+    )
+    return paginator.get_paginated_response(serialized_profiles)
 
   
   @action(detail=True, methods=["get"], url_path=r"actions/swipe-profile", url_name="swipe-profile")
@@ -427,13 +478,14 @@ class ProfileViewSet(ModelViewSet):
         - 200 OK: The profile was found and returned successfully.
         - 404 Not Found: The profile with the given `pk` does not exist.
     """
+    # Read the cached swipe card of the profile, plus its relationship with the user
     try:
-      profile = self.queryset.get(pk=pk)
-    except ObjectDoesNotExist:
+      found = cards.add_relationships(cards.get_cards("swipe", [pk]), request.user)
+    except (ValueError, ValidationError):
+      found = []
+    if not found:
       return Response({"detail": f"Profile: {pk} doesn't exist."}, status=status.HTTP_404_NOT_FOUND)
-    # Serialize and return
-    serializer = profile_serializers.SwipeProfileSerializer(profile, many=False)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(found[0], status=status.HTTP_200_OK)
 
 
   #! @not in v 1.0.0
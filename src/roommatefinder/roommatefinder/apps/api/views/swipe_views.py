@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from rest_framework import status
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+
+from roommatefinder.apps.api.serializers import swipe_serializers
+from roommatefinder.apps.api.utils.swipes import record_swipes
+
+
+class SwipeViewSet(ViewSet):
+  """
+  ViewSet for recording swipes.
+
+  Inherits from:
+    ViewSet (rest_framework.viewsets)
+
+  Attributes:
+    permission_classes (list): List of permission classes for access control.
+  """
+  permission_classes = [IsAuthenticated]
+
+
+  def create(self, request: Request) -> Response:
+    """
+    Record one swipe, or a list of swipes, of the authenticated user.
+
+    Swipes are buffered and written in batches, profiles swiped on are left
+    out of the user's swipe deck right away. Right swipes don't send a
+    connection request, that still goes through the `request.connect` socket route.
+
+    Parameters:
+      request (Request): The incoming HTTP request, a swipe `{"id": ..., "direction": "L" | "R"}` or a list of them.
+
+    Returns:
+      Response:
+        - On success: Returns the number of swipes recorded with a 202 Accepted status.
+        - On failure: Returns the validation errors with a 400 Bad Request status.
+    """
+    many = isinstance(request.data, list)
+    serializer = swipe_serializers.CreateSwipeSerializer(data=request.data, many=many)
+    serializer.is_valid(raise_exception=True)
+    swipes = serializer.validated_data if many else [serializer.validated_data]
+    recorded = record_swipes(request.user, swipes)
+    return Response({"recorded": recorded}, status=status.HTTP_202_ACCEPTED)
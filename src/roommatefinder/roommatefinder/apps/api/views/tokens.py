@@ -29,13 +29,17 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     Returns:
       dict: The JWT token data combined with the serialized user profile data.
     """
-    # Call the parent class's validate method to get the default token data
+    # Call the parent class's validate method to mint the token pair once
     data = super().validate(attrs)
-    # Serialize the user profile data
+    # Serialize the user profile data, with the serializer's prefetch plan
+    profile_serializers.BaseProfileSerializer.prefetch([self.user])
     serializer = profile_serializers.BaseProfileSerializer(self.user).data
     # Add the serialized profile data to the token response
     for key, value in serializer.items():
       data[key] = value
+    # Same pair under the names the other auth responses use
+    data["token"] = data["access"]
+    data["refresh_token"] = data["refresh"]
 
     return data
 
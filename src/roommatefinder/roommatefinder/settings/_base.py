@@ -94,6 +94,7 @@ INSTALLED_APPS = [
   'django.contrib.sessions',
   'django.contrib.messages',
   'django.contrib.staticfiles',
+  'django.contrib.postgres',
   # third-party
   "rest_framework",
   "corsheaders",
@@ -138,6 +139,22 @@ else:
     }
   }
   
+# shared cache, on the same redis as the channel layer
+if str_to_bool(os.getenv('USE_SECRETS', 'true')):
+  CACHES = {
+    'default': {
+      'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+      'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+  }
+else:
+  CACHES = {
+    'default': {
+      'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+      'LOCATION': os.getenv("REDIS_URL"),
+    }
+  }
+
 
 # SIMPLE JWT TO CREATE JSON ACCESS TOKENS
 SIMPLE_JWT = {
@@ -168,6 +185,41 @@ SIMPLE_JWT = {
   "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 }
 
+# swipe deck ranking, "python" ranks in memory, "sql" ranks and paginates in the database,
+# "deck" reads the precomputed decks that are kept up to date when profiles change,
+# "numpy" ranks columnar arrays of the candidates with NumPy, "lazy" streams the candidates
+# through a heap that only keeps the requested top of the ranking
+SWIPE_RANKING_MODE = os.getenv("SWIPE_RANKING_MODE", "sql")
+# ranked swipe decks are snapshotted for cursor pagination, top N profiles for TTL seconds
+SWIPE_DECK_SNAPSHOT_SIZE = 200
+SWIPE_DECK_SNAPSHOT_TTL = 60 * 10
+# seconds between syncs of the quiz compatibility index with quizzes saved by other processes
+QUIZ_INDEX_SYNC_SECONDS = 30
+# seconds between checks for quizzes deleted by other processes, a scan of every quiz id
+QUIZ_INDEX_RECONCILE_SECONDS = 60 * 5
+# swipes are written in batches of up to N, at most after N seconds
+SWIPE_BUFFER_SIZE = 100
+SWIPE_BUFFER_SECONDS = 2
+# seconds a batch of swipes stays in the cached overlay of unwritten swipes, well past a flush
+SWIPE_PENDING_TTL = 60
+# with write-behind, chat messages are delivered when sent and written in batches of up to N,
+# at most after N seconds, with ids reserved from the database N at a time
+MESSAGE_WRITE_BEHIND = str_to_bool(os.getenv("MESSAGE_WRITE_BEHIND", "false"))
+MESSAGE_BUFFER_SIZE = 50
+MESSAGE_BUFFER_SECONDS = 0.5
+MESSAGE_ID_BLOCK = 100
+# a buffered message that fails to write this many times is logged and dropped, see `MessageBuffer`
+MESSAGE_FLUSH_ATTEMPTS = 3
+# typing indicators are forwarded at most once per N seconds per sender and recipient,
+# "stopped typing" is sent after N seconds without typing
+TYPING_INTERVAL_SECONDS = 2
+TYPING_EXPIRY_SECONDS = 5
+# websocket search returns at most N profiles, a user's results for a query are cached N seconds
+SEARCH_RESULT_LIMIT = 20
+SEARCH_CACHE_TTL = 30
+# seconds a rendered profile card stays cached, cards are also dropped when their profile changes
+PROFILE_CARD_TTL = 60 * 60 * 24
+
 
 MIDDLEWARE = [
   # defaults
@@ -1,4 +1,6 @@
 import os
+import tempfile
+
 from ._base import *
 
 if os.environ.get('GITHUB_WORKFLOW'):
@@ -11,4 +13,17 @@ if os.environ.get('GITHUB_WORKFLOW'):
       'HOST': '127.0.0.1',
       'PORT': '5432',
     }
-  }
\ No newline at end of file
+  }
+
+# per-process cache, no redis needed to run the tests
+CACHES = {
+  'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+  }
+}
+
+# write swipes right away, no flusher thread racing the test transactions
+SWIPE_BUFFER_SIZE = 1
+
+# uploads made by the tests go to a throwaway directory, not the source tree
+MEDIA_ROOT = tempfile.mkdtemp(prefix='roommatefinder-test-media-')